@@ -0,0 +1,227 @@
+import asyncio
+import heapq
+import itertools
+import json
+import math
+import re
+import time
+
+from backend import metrics
+from backend.config import (
+    ADMISSION_ENABLED,
+    ADMISSION_LLM_CONCURRENCY,
+    ADMISSION_LLM_MAX_CONCURRENCY,
+    ADMISSION_LLM_MIN_CONCURRENCY,
+    ADMISSION_LLM_TARGET_LATENCY_SECONDS,
+    ADMISSION_MAX_INFLIGHT,
+    ADMISSION_QUEUE_TIMEOUT_SECONDS,
+)
+
+# Admission control. Requests are sorted into route classes; each class has
+# its own concurrency limit and bounded wait queue, and every request also
+# needs a slot in one shared pool whose queue serves cheap reads before auth
+# and before LLM calls. The LLM class limit adapts: it shrinks while the
+# smoothed request latency is above target (the upstream model is slow, so
+# queueing more work only makes every request slower) and grows back by one
+# while latency is healthy and the limit is in use. Requests that cannot be
+# admitted in time are shed with 503 and a Retry-After estimate.
+
+EXEMPT_PATHS = {"/health", "/health/ready", "/metrics", "/debug/metrics"}
+JOB_EVENTS_PATTERN = re.compile(r"^/jobs/[^/]+/events$")
+LLM_PREFIXES = ("/generate-meal-plan", "/tweak-meal-plan", "/follow-up")
+AUTH_PATHS = {"/register", "/token", "/token/refresh", "/admin/users/import"}
+
+# Shared pool priorities; lower is served first
+PRIORITIES = {"read": 0, "auth": 1, "llm": 2}
+ADJUST_INTERVAL_SECONDS = 1.0
+
+
+class Shed(Exception):
+    def __init__(self, route_class, reason, retry_after):
+        super().__init__(f"{route_class} request shed: {reason}")
+        self.route_class = route_class
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def classify(path):
+    # None means the request bypasses admission control
+    if path in EXEMPT_PATHS:
+        return None
+    if path.startswith(LLM_PREFIXES):
+        return "llm"
+    if path in AUTH_PATHS:
+        return "auth"
+    if JOB_EVENTS_PATTERN.match(path):
+        # Long-lived event streams; limited, but never queued in the shared pool
+        return "events"
+    return "read"
+
+
+class Limiter:
+    # Concurrency limit with a bounded priority wait queue
+    def __init__(self, name, limit, max_queue, queue_timeout=ADMISSION_QUEUE_TIMEOUT_SECONDS):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.inflight = 0
+        self.latency = None
+        self._waiters = []
+        self._counter = itertools.count()
+
+    @property
+    def queued(self):
+        return sum(1 for _, _, waiter in self._waiters if not waiter.done())
+
+    def retry_after(self):
+        # Time for the queue ahead to drain at the current latency
+        latency = self.latency or 1.0
+        return max(1, min(60, math.ceil((self.queued + 1) * latency / max(self.limit, 1))))
+
+    async def acquire(self, priority=0):
+        if self.inflight < self.limit and not self.queued:
+            self.inflight += 1
+            return 0.0
+        if self.queued >= self.max_queue:
+            raise Shed(self.name, "queue_full", self.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), waiter))
+        self._report()
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if waiter.done():
+                # Granted just as the wait timed out
+                self._release_slot()
+            else:
+                waiter.cancel()
+            raise Shed(self.name, "queue_timeout", self.retry_after())
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._release_slot()
+            else:
+                waiter.cancel()
+            raise
+        finally:
+            self._report()
+        return time.perf_counter() - start
+
+    def _wake(self):
+        while self._waiters and self.inflight < self.limit:
+            _, _, waiter = heapq.heappop(self._waiters)
+            if not waiter.done():
+                self.inflight += 1
+                waiter.set_result(None)
+
+    def _release_slot(self):
+        self.inflight -= 1
+        self._wake()
+        self._report()
+
+    def release(self, latency=None):
+        if latency is not None:
+            self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+        self._release_slot()
+
+    def _report(self):
+        metrics.set_gauge("admission_inflight", self.inflight, pool=self.name)
+        metrics.set_gauge("admission_queue_depth", self.queued, pool=self.name)
+
+
+class AdaptiveLimiter(Limiter):
+    def __init__(self, name, limit, max_queue, min_limit, max_limit, target_latency, **kwargs):
+        super().__init__(name, limit, max_queue, **kwargs)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self._adjusted_at = time.monotonic()
+        metrics.set_gauge("admission_limit", self.limit, pool=self.name)
+
+    def release(self, latency=None):
+        saturated = self.inflight >= self.limit
+        super().release(latency)
+        now = time.monotonic()
+        if self.latency is None or now - self._adjusted_at < ADJUST_INTERVAL_SECONDS:
+            return
+        self._adjusted_at = now
+        if self.latency > self.target_latency:
+            limit = max(self.min_limit, int(self.limit * 0.8))
+        elif saturated:
+            limit = min(self.max_limit, self.limit + 1)
+        else:
+            return
+        if limit != self.limit:
+            metrics.inc("admission_limit_changes_total", pool=self.name, direction="down" if limit < self.limit else "up")
+            self.limit = limit
+            metrics.set_gauge("admission_limit", limit, pool=self.name)
+            self._wake()
+
+
+class AdmissionController:
+    def __init__(self):
+        self.shared = Limiter("shared", ADMISSION_MAX_INFLIGHT, max_queue=ADMISSION_MAX_INFLIGHT)
+        self.classes = {
+            "llm": AdaptiveLimiter(
+                "llm", ADMISSION_LLM_CONCURRENCY, max_queue=ADMISSION_LLM_CONCURRENCY * 2,
+                min_limit=ADMISSION_LLM_MIN_CONCURRENCY, max_limit=ADMISSION_LLM_MAX_CONCURRENCY,
+                target_latency=ADMISSION_LLM_TARGET_LATENCY_SECONDS,
+            ),
+            "auth": Limiter("auth", max(4, ADMISSION_MAX_INFLIGHT // 8), max_queue=ADMISSION_MAX_INFLIGHT // 2),
+            "read": Limiter("read", ADMISSION_MAX_INFLIGHT // 2, max_queue=ADMISSION_MAX_INFLIGHT),
+            "events": Limiter("events", ADMISSION_MAX_INFLIGHT, max_queue=0),
+        }
+
+    async def admit(self, route_class):
+        limiter = self.classes[route_class]
+        wait = await limiter.acquire()
+        if route_class in PRIORITIES:
+            try:
+                wait += await self.shared.acquire(PRIORITIES[route_class])
+            except BaseException:
+                limiter.release()
+                raise
+        metrics.observe("admission_queue_wait_seconds", wait, route_class=route_class)
+
+    def release(self, route_class, latency):
+        if route_class in PRIORITIES:
+            self.shared.release(latency)
+        self.classes[route_class].release(latency)
+
+
+class AdmissionMiddleware:
+    def __init__(self, app, controller=None):
+        self.app = app
+        self.controller = controller or AdmissionController()
+
+    async def __call__(self, scope, receive, send):
+        route_class = classify(scope["path"]) if scope["type"] == "http" and ADMISSION_ENABLED else None
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self.controller.admit(route_class)
+        except Shed as e:
+            metrics.inc("admission_rejections_total", route_class=e.route_class, reason=e.reason)
+            await self._reject(send, e)
+            return
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(route_class, time.perf_counter() - start)
+
+    async def _reject(self, send, shed):
+        body = json.dumps({"detail": "Server is busy, please retry later"}).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("latin-1")),
+                (b"retry-after", str(shed.retry_after).encode("latin-1")),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
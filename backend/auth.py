@@ -0,0 +1,242 @@
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from jose import JWTError, jwt
+from sqlalchemy.orm import Session
+
+from backend import metrics, models
+from backend.cache import MemoryTier
+from backend.config import (
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+    AUTH_REVOCATION_SYNC_SECONDS,
+    AUTH_TOKEN_CACHE_MAX_ENTRIES,
+    JWT_ACTIVE_KID,
+    JWT_KEYS,
+    REFRESH_TOKEN_EXPIRE_DAYS,
+    SECRET_KEY,
+)
+from backend.database import run_db, session_scope
+
+# Token issuing and verification.
+#
+# Access tokens are short-lived JWTs; refresh tokens are longer-lived JWTs
+# backed by a refresh_tokens row so they can be rotated and revoked. Tokens
+# carry a "kid" header naming the signing key; several keys can be accepted
+# at once (JWT_KEYS) while only JWT_ACTIVE_KID signs, which is how keys are
+# rotated. Tokens without a kid are checked against SECRET_KEY.
+#
+# A verified access token is cached by its SHA-256 digest, so repeat requests
+# skip signature checking. Revoked token ids are kept in an in-memory set,
+# synced from revoked_tokens, and checked on every request, cached or not.
+
+ALGORITHM = "HS256"
+LEGACY_KID = "default"
+ACCESS = "access"
+REFRESH = "refresh"
+
+logger = logging.getLogger(__name__)
+
+
+class AuthError(Exception):
+    pass
+
+
+def parse_keys(spec):
+    # "kid1:secret1,kid2:secret2"
+    keys = {}
+    for part in (spec or "").split(","):
+        if ":" in part:
+            kid, secret = part.split(":", 1)
+            keys[kid.strip()] = secret.strip()
+    return keys
+
+
+signing_keys = parse_keys(JWT_KEYS)
+if SECRET_KEY:
+    signing_keys.setdefault(LEGACY_KID, SECRET_KEY)
+active_kid = JWT_ACTIVE_KID if JWT_ACTIVE_KID in signing_keys else LEGACY_KID
+
+
+def token_digest(token):
+    return hashlib.sha256(token.encode("utf-8")).digest()
+
+
+class RevocationList:
+    # Revoked token ids (16 raw bytes each) until the tokens would have expired
+    def __init__(self):
+        self._revoked = {}
+        self._synced_at = None
+        self._lock = threading.Lock()
+
+    def __contains__(self, jti):
+        return bytes.fromhex(jti) in self._revoked
+
+    def __len__(self):
+        return len(self._revoked)
+
+    def add(self, jti, expires_at):
+        with self._lock:
+            self._revoked[bytes.fromhex(jti)] = expires_at
+
+    def sync(self, db: Session):
+        # Incremental: only rows revoked since the last sync are read
+        now = datetime.utcnow()
+        query = db.query(models.RevokedToken.jti, models.RevokedToken.expires_at).filter(
+            models.RevokedToken.expires_at > now
+        )
+        if self._synced_at is not None:
+            query = query.filter(models.RevokedToken.revoked_at >= self._synced_at)
+        rows = query.all()
+        with self._lock:
+            for jti, expires_at in rows:
+                self._revoked[bytes.fromhex(jti)] = expires_at
+            for key in [k for k, expires_at in self._revoked.items() if expires_at <= now]:
+                del self._revoked[key]
+            self._synced_at = now
+        metrics.set_gauge("auth_revoked_tokens", len(self._revoked))
+
+
+revocations = RevocationList()
+token_cache = MemoryTier(
+    max_entries=AUTH_TOKEN_CACHE_MAX_ENTRIES, ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60, name="auth_tokens"
+)
+
+
+def _encode(claims, kid=None):
+    kid = kid or active_kid
+    return jwt.encode(claims, signing_keys[kid], algorithm=ALGORITHM, headers={"kid": kid})
+
+
+def create_access_token(username: str, user_id: int = None) -> str:
+    now = datetime.utcnow()
+    claims = {
+        "sub": username,
+        "typ": ACCESS,
+        "jti": uuid.uuid4().hex,
+        "iat": now,
+        "exp": now + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
+    }
+    if user_id is not None:
+        claims["uid"] = user_id
+    return _encode(claims)
+
+
+def decode_token(token: str, expected_type: str) -> dict:
+    try:
+        kid = jwt.get_unverified_header(token).get("kid", LEGACY_KID)
+        key = signing_keys.get(kid)
+        if key is None:
+            raise AuthError("Unknown signing key")
+        claims = jwt.decode(token, key, algorithms=[ALGORITHM])
+    except JWTError as e:
+        raise AuthError(str(e)) from e
+    # Tokens from before refresh tokens existed have no typ and are access tokens
+    if claims.get("typ", ACCESS) != expected_type or not claims.get("sub"):
+        raise AuthError("Wrong token type")
+    if claims.get("jti") and claims["jti"] in revocations:
+        raise AuthError("Token revoked")
+    return claims
+
+
+def verify_access_token(token: str) -> dict:
+    digest = token_digest(token)
+    claims = token_cache.get(digest)
+    if claims is not None:
+        if claims["exp"] > time.time() and not (claims.get("jti") and claims["jti"] in revocations):
+            metrics.inc("auth_token_cache_total", result="hit")
+            return claims
+        token_cache.delete(digest)
+        raise AuthError("Token expired or revoked")
+    metrics.inc("auth_token_cache_total", result="miss")
+    claims = decode_token(token, ACCESS)
+    token_cache.set(digest, claims)
+    return claims
+
+
+def issue_tokens(db: Session, user_id: int, username: str) -> dict:
+    # Access token plus a refresh token recorded in refresh_tokens
+    now = datetime.utcnow()
+    jti = uuid.uuid4().hex
+    expires_at = now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    db.add(models.RefreshToken(jti=jti, user_id=user_id, issued_at=now, expires_at=expires_at))
+    db.commit()
+    refresh_token = _encode({"sub": username, "uid": user_id, "typ": REFRESH, "jti": jti, "iat": now, "exp": expires_at})
+    return {
+        "access_token": create_access_token(username, user_id),
+        "refresh_token": refresh_token,
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    }
+
+
+def rotate_refresh_token(db: Session, refresh_token: str) -> dict:
+    # Each refresh token works once; using it revokes it and issues a new pair
+    claims = decode_token(refresh_token, REFRESH)
+    now = datetime.utcnow()
+    rotated = (
+        db.query(models.RefreshToken)
+        .filter(
+            models.RefreshToken.jti == claims["jti"],
+            models.RefreshToken.revoked_at.is_(None),
+            models.RefreshToken.expires_at > now,
+        )
+        .update({"revoked_at": now}, synchronize_session=False)
+    )
+    if not rotated:
+        db.rollback()
+        raise AuthError("Refresh token revoked")
+    return issue_tokens(db, claims["uid"], claims["sub"])
+
+
+def revoke_access_token(db: Session, claims: dict):
+    jti = claims.get("jti")
+    if not jti:
+        return
+    expires_at = datetime.utcfromtimestamp(claims["exp"])
+    db.merge(models.RevokedToken(jti=jti, expires_at=expires_at, revoked_at=datetime.utcnow()))
+    db.commit()
+    revocations.add(jti, expires_at)
+
+
+def revoke_refresh_token(db: Session, refresh_token: str):
+    try:
+        claims = decode_token(refresh_token, REFRESH)
+    except AuthError:
+        return
+    db.query(models.RefreshToken).filter(
+        models.RefreshToken.jti == claims["jti"], models.RefreshToken.revoked_at.is_(None)
+    ).update({"revoked_at": datetime.utcnow()}, synchronize_session=False)
+    db.commit()
+
+
+class RevocationSync:
+    # Keeps this process's revocation set in step with other workers
+    def __init__(self, interval=AUTH_REVOCATION_SYNC_SECONDS):
+        self.interval = interval
+        self._task = None
+
+    async def sync(self):
+        try:
+            async with session_scope() as db:
+                await run_db(db, revocations.sync)
+        except Exception:
+            logger.exception("Error syncing revoked tokens")
+
+    async def _loop(self):
+        while True:
+            await self.sync()
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
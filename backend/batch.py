@@ -0,0 +1,182 @@
+import asyncio
+import json
+import os
+import time
+from datetime import datetime
+
+from sqlalchemy import literal_column
+from sqlalchemy.orm import Session
+
+from backend import metrics, models
+from backend.cache import complete_with_cache
+from backend.database import run_db, session_scope
+from backend.identity import invalidate_user
+from backend.llm import get_gateway
+from backend.meal_plans import save_structured_plans
+from backend.nutrition import targets_for_users
+from backend.plan_history import write_current_plans
+from backend.prompts import meal_plan_messages_for
+from backend.usage import set_call_context, write_usage
+
+# Regenerates meal plans for many users at once, e.g. after a prompt or model
+# change. Users are read from the users table in id order, one chunk at a
+# time; each chunk runs its completions concurrently through the shared LLM
+# gateway and is written back in a single transaction. Progress is saved to a
+# checkpoint file after every chunk so an interrupted run can resume.
+
+
+class BatchReport:
+    def __init__(self, last_user_id=0, succeeded=0, failed=0, skipped=0, failed_ids=None):
+        self.last_user_id = last_user_id
+        self.succeeded = succeeded
+        self.failed = failed
+        self.skipped = skipped
+        self.failed_ids = failed_ids or []
+        self.elapsed = 0.0
+
+    @property
+    def processed(self):
+        return self.succeeded + self.failed + self.skipped
+
+    def to_dict(self):
+        return {
+            "last_user_id": self.last_user_id,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "failed_ids": self.failed_ids,
+            "elapsed": round(self.elapsed, 3),
+            "updated_at": datetime.utcnow().isoformat(),
+        }
+
+
+def load_checkpoint(path) -> BatchReport:
+    if not path or not os.path.exists(path):
+        return BatchReport()
+    with open(path) as f:
+        data = json.load(f)
+    report = BatchReport(
+        data.get("last_user_id", 0),
+        data.get("succeeded", 0),
+        data.get("failed", 0),
+        data.get("skipped", 0),
+        data.get("failed_ids", []),
+    )
+    report.elapsed = data.get("elapsed", 0.0)
+    return report
+
+
+def save_checkpoint(path, report: BatchReport):
+    if not path:
+        return
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(report.to_dict(), f)
+    os.replace(tmp, path)
+
+
+def fetch_user_chunk(db: Session, after_id: int, chunk_size: int, only_missing=False):
+    # Keyset pagination: each chunk is an index range scan on the primary key
+    query = (
+        db.query(
+            models.User.id,
+            models.User.username,
+            models.User.age,
+            models.User.height,
+            models.User.weight,
+            models.User.goal,
+        )
+        .filter(models.User.id > after_id)
+    )
+    if only_missing:
+        # Users without a plan hold NO_MEAL_PLAN (""). Inlined as a literal so
+        # the planner can match the partial index on it.
+        query = query.filter(models.User.current_meal_plan == literal_column("''"))
+    return query.order_by(models.User.id).limit(chunk_size).all()
+
+
+def store_batch_results(db: Session, results):
+    # results: list of (user_id, meal_plan)
+    versions = write_current_plans(db, results, "batch")
+    save_structured_plans(db, {user_id: meal_plan for user_id, meal_plan in results if user_id in versions})
+    db.commit()
+
+
+async def _generate(user, targets, semaphore, use_cache):
+    set_call_context(user.id, "batch")
+    messages = meal_plan_messages_for(user.age, user.height, user.weight, user.goal, targets=targets)
+    async with semaphore:
+        if use_cache:
+            content, _ = await complete_with_cache(messages)
+            return content
+        return (await get_gateway().complete(messages=messages)).content
+
+
+async def run_batch(
+    chunk_size=100,
+    concurrency=8,
+    checkpoint_path=None,
+    resume=False,
+    only_missing=False,
+    use_cache=False,
+    limit=None,
+    progress=print,
+) -> BatchReport:
+    report = load_checkpoint(checkpoint_path) if resume else BatchReport()
+    semaphore = asyncio.Semaphore(concurrency)
+    start = time.perf_counter() - report.elapsed
+    processed_this_run = 0
+
+    async with session_scope() as db:
+        while limit is None or processed_this_run < limit:
+            size = chunk_size if limit is None else min(chunk_size, limit - processed_this_run)
+            users = await run_db(db, fetch_user_chunk, report.last_user_id, size, only_missing)
+            if not users:
+                break
+
+            ready = [u for u in users if u.age and u.height and u.weight]
+            report.skipped += len(users) - len(ready)
+            # Targets for the whole chunk in one vectorized pass
+            targets = targets_for_users(ready)
+            outcomes = await asyncio.gather(
+                *(_generate(user, targets[user.id], semaphore, use_cache) for user in ready),
+                return_exceptions=True,
+            )
+
+            results = []
+            for user, outcome in zip(ready, outcomes):
+                if isinstance(outcome, Exception):
+                    report.failed += 1
+                    report.failed_ids.append(user.id)
+                    progress(f"User {user.id} failed: {str(outcome)}")
+                else:
+                    results.append((user.id, outcome))
+            if results:
+                try:
+                    await run_db(db, store_batch_results, results)
+                    report.succeeded += len(results)
+                    stored = {user_id for user_id, _ in results}
+                    for user in ready:
+                        if user.id in stored:
+                            invalidate_user(user.username)
+                except Exception as e:
+                    await run_db(db, lambda s: s.rollback())
+                    report.failed += len(results)
+                    report.failed_ids.extend(user_id for user_id, _ in results)
+                    progress(f"Writing chunk ending at user {users[-1].id} failed: {str(e)}")
+
+            report.last_user_id = users[-1].id
+            processed_this_run += len(users)
+            report.elapsed = time.perf_counter() - start
+            save_checkpoint(checkpoint_path, report)
+            await write_usage()
+            metrics.inc("batch_users_total", len(users))
+            progress(
+                f"Through user {report.last_user_id}: {report.succeeded} ok, "
+                f"{report.failed} failed, {report.skipped} skipped, "
+                f"{report.processed / max(report.elapsed, 1e-9):.1f} users/s"
+            )
+
+    report.elapsed = time.perf_counter() - start
+    save_checkpoint(checkpoint_path, report)
+    return report
@@ -0,0 +1,194 @@
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from backend import metrics
+from backend.llm import get_gateway, prompt_tokens
+from backend.routing import PLAN
+from backend.usage import record_call
+from backend.singleflight import get_single_flight
+from backend.config import (
+    LLM_CACHE_ENABLED,
+    LLM_CACHE_MAX_ENTRIES,
+    LLM_CACHE_SQL,
+    LLM_CACHE_TTL_SECONDS,
+)
+
+_whitespace = re.compile(r"\s+")
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text):
+    return _whitespace.sub(" ", text).strip().casefold()
+
+
+def cache_key(model, messages):
+    # Content address: hash of the model plus every normalized message,
+    # system prompt included
+    payload = json.dumps(
+        {
+            "model": model,
+            "messages": [
+                {"role": m["role"], "content": normalize_text(m["content"])}
+                for m in messages
+            ],
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def response_cache_key(task, messages):
+    # The task and the models configured to serve it: an answer is reused
+    # whichever of those backends produced it, and a model change misses
+    return cache_key([task] + get_gateway().cache_scope(task, messages), messages)
+
+
+class MemoryTier:
+    name = "memory"
+
+    def __init__(self, max_entries=LLM_CACHE_MAX_ENTRIES, ttl=LLM_CACHE_TTL_SECONDS, name=None):
+        if name is not None:
+            self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, model=None):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                metrics.inc("cache_evictions_total", tier=self.name)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLTier:
+    name = "sql"
+
+    def __init__(self, session_factory=None, ttl=LLM_CACHE_TTL_SECONDS):
+        if session_factory is None:
+            from backend.database import SessionLocal
+            session_factory = SessionLocal
+        self.session_factory = session_factory
+        self.ttl = ttl
+
+    def get(self, key):
+        from backend.models import CachedResponse
+
+        db = self.session_factory()
+        try:
+            entry = db.get(CachedResponse, key)
+            if entry is None:
+                return None
+            if entry.created_at < datetime.utcnow() - timedelta(seconds=self.ttl):
+                db.delete(entry)
+                db.commit()
+                return None
+            return entry.content
+        finally:
+            db.close()
+
+    def set(self, key, value, model=None):
+        from backend.models import CachedResponse
+
+        db = self.session_factory()
+        try:
+            db.merge(CachedResponse(
+                key=key, model=model, content=value, created_at=datetime.utcnow()
+            ))
+            db.commit()
+        finally:
+            db.close()
+
+
+class ResponseCache:
+    # Tiers are checked in order; a hit in a slower tier is copied into the
+    # faster ones in front of it.
+    def __init__(self, tiers):
+        self.tiers = tiers
+
+    def get(self, key):
+        for i, tier in enumerate(self.tiers):
+            try:
+                value = tier.get(key)
+            except Exception as e:
+                logger.warning("Cache read error in %s tier: %s", tier.name, e)
+                continue
+            if value is not None:
+                metrics.inc("llm_cache_hits_total", tier=tier.name)
+                for faster in self.tiers[:i]:
+                    faster.set(key, value)
+                return value
+        metrics.inc("llm_cache_misses_total")
+        return None
+
+    def set(self, key, value, model=None):
+        for tier in self.tiers:
+            try:
+                tier.set(key, value, model=model)
+            except Exception as e:
+                logger.warning("Cache write error in %s tier: %s", tier.name, e)
+
+
+_cache = None
+
+
+def get_response_cache():
+    global _cache
+    if _cache is None:
+        tiers = []
+        if LLM_CACHE_ENABLED:
+            tiers.append(MemoryTier())
+            if LLM_CACHE_SQL:
+                tiers.append(SQLTier())
+        _cache = ResponseCache(tiers)
+    return _cache
+
+
+async def complete_with_cache(messages, task=PLAN):
+    # Returns (content, cached)
+    cache = get_response_cache()
+    key = response_cache_key(task, messages)
+    content = cache.get(key)
+    if content is not None:
+        record_call(get_gateway().model_for(task), prompt_tokens(messages), 0, cached=True)
+        return content, True
+
+    async def upstream():
+        completion = await get_gateway().complete(messages=messages, task=task)
+        cache.set(key, completion.content, model=completion.model)
+        return completion.content
+
+    # Identical prompts in flight at the same time share one upstream call
+    content = await get_single_flight().do(key, upstream, name="completion")
+    return content, False
@@ -0,0 +1,108 @@
+import gzip
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+
+from backend import metrics
+from backend.config import BROTLI_QUALITY, COMPRESSION_MINIMUM_SIZE, GZIP_LEVEL
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+# Compresses API responses (JSON and text) above a size threshold with
+# brotli or gzip, whichever the client prefers and we support. Only complete
+# bodies are compressed: streamed responses (server-sent events, static
+# files, which have their own gzip layer) pass through untouched. Bytes
+# before and after are counted so the savings show up in /metrics.
+
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+# Bodies this large are compressed off the event loop
+THREADPOOL_MINIMUM_SIZE = 256 * 1024
+
+
+def accepted_encodings(header):
+    encodings = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            encodings[name.strip().lower()] = quality
+    return encodings
+
+
+def choose_encoding(header):
+    encodings = accepted_encodings(header or "")
+    if brotli is not None and encodings.get("br", 0) > 0:
+        return "br"
+    if encodings.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def compress(body, encoding, gzip_level=GZIP_LEVEL, brotli_quality=BROTLI_QUALITY):
+    if encoding == "br":
+        return brotli.compress(body, quality=brotli_quality)
+    return gzip.compress(body, compresslevel=gzip_level)
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size=COMPRESSION_MINIMUM_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+
+        async def send_compressed(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or start_message is None:
+                await send(message)
+                return
+
+            start, start_message = start_message, None
+            headers = MutableHeaders(scope=start)
+            body = message.get("body", b"")
+            if (
+                message.get("more_body")
+                or len(body) < self.minimum_size
+                or "content-encoding" in headers
+                or not headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+            ):
+                await send(start)
+                await send(message)
+                return
+
+            if len(body) >= THREADPOOL_MINIMUM_SIZE:
+                compressed = await run_in_threadpool(compress, body, encoding)
+            else:
+                compressed = compress(body, encoding)
+            headers.add_vary_header("Accept-Encoding")
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            metrics.inc("http_compressed_responses_total", encoding=encoding)
+            metrics.inc("http_compression_input_bytes_total", len(body), encoding=encoding)
+            metrics.inc("http_compression_output_bytes_total", len(compressed), encoding=encoding)
+            metrics.inc("http_compression_saved_bytes_total", len(body) - len(compressed), encoding=encoding)
+            await send(start)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,39 @@
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+# Conditional GET for per-user resources. ETags are weak: they name the
+# content, and the response may be compressed in transit. Browsers revalidate
+# on every load (no-cache) and get an empty 304 when nothing changed.
+
+CACHE_CONTROL = "private, no-cache"
+
+
+def format_etag(tag):
+    return f'W/"{tag}"'
+
+
+def etag_matches(request: Request, tag) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header or not tag:
+        return False
+    if header.strip() == "*":
+        return True
+    for value in header.split(","):
+        value = value.strip()
+        if value.startswith("W/"):
+            value = value[2:]
+        if value == f'"{tag}"':
+            return True
+    return False
+
+
+def not_modified(tag) -> Response:
+    return Response(status_code=304, headers={"ETag": format_etag(tag), "Cache-Control": CACHE_CONTROL})
+
+
+def json_with_etag(content, tag) -> JSONResponse:
+    headers = {"Cache-Control": CACHE_CONTROL}
+    if tag:
+        headers["ETag"] = format_etag(tag)
+    return JSONResponse(jsonable_encoder(content), headers=headers)
@@ -1,6 +1,143 @@
+import json
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///test.db")
\ No newline at end of file
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///test.db")
+
+# Comma-separated usernames allowed to use the /admin endpoints
+ADMIN_USERNAMES = {name.strip() for name in os.getenv("ADMIN_USERNAMES", "").split(",") if name.strip()}
+USER_IMPORT_CHUNK_SIZE = int(os.getenv("USER_IMPORT_CHUNK_SIZE", "500"))
+
+# Authentication. JWT_KEYS ("kid:secret,kid:secret") lists every key tokens
+# may be signed with; JWT_ACTIVE_KID signs new ones. SECRET_KEY stays valid
+# as the key for tokens without a kid.
+SECRET_KEY = os.getenv("SECRET_KEY")
+JWT_KEYS = os.getenv("JWT_KEYS", "")
+JWT_ACTIVE_KID = os.getenv("JWT_ACTIVE_KID", "default")
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "14"))
+AUTH_TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_TOKEN_CACHE_MAX_ENTRIES", "10000"))
+AUTH_REVOCATION_SYNC_SECONDS = float(os.getenv("AUTH_REVOCATION_SYNC_SECONDS", "10"))
+
+# LLM gateway settings
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai")  # "openai" or "fake"
+LLM_MAX_INFLIGHT = int(os.getenv("LLM_MAX_INFLIGHT", "16"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "0.5"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "8"))
+
+# Model routing. LLM_BACKENDS is a JSON list of backends to route between,
+# e.g. [{"name": "openai", "plan_model": "gpt-4o", "follow_up_model": "gpt-4o-mini"},
+#       {"name": "local", "base_url": "http://localhost:11434/v1", "plan_model": "llama3.1"}]
+# Optional keys: kind ("openai" or "fake"), base_url, api_key_env, max_inflight,
+# timeout, max_retries. Empty means a single LLM_BACKEND serving LLM_PLAN_MODEL
+# and LLM_FOLLOW_UP_MODEL.
+LLM_BACKENDS = json.loads(os.getenv("LLM_BACKENDS", "") or "[]")
+LLM_PLAN_MODEL = os.getenv("LLM_PLAN_MODEL", "gpt-4o-mini")
+LLM_FOLLOW_UP_MODEL = os.getenv("LLM_FOLLOW_UP_MODEL", LLM_PLAN_MODEL)
+# Follow-ups with longer prompts than this go to the plan models
+LLM_FOLLOW_UP_MAX_PROMPT_TOKENS = int(os.getenv("LLM_FOLLOW_UP_MAX_PROMPT_TOKENS", "3000"))
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "true").lower() == "true"
+LLM_HEDGE_MIN_SECONDS = float(os.getenv("LLM_HEDGE_MIN_SECONDS", "1"))
+LLM_HEDGE_LATENCY_FACTOR = float(os.getenv("LLM_HEDGE_LATENCY_FACTOR", "2"))
+LLM_HEDGE_BUDGET = float(os.getenv("LLM_HEDGE_BUDGET", "0.1"))  # hedges per request
+LLM_ROUTER_FAILURE_THRESHOLD = int(os.getenv("LLM_ROUTER_FAILURE_THRESHOLD", "3"))
+LLM_ROUTER_COOLDOWN_SECONDS = float(os.getenv("LLM_ROUTER_COOLDOWN_SECONDS", "30"))
+LLM_ROUTER_EXPLORE_RATE = float(os.getenv("LLM_ROUTER_EXPLORE_RATE", "0.02"))
+
+# Fake completion backend (used when LLM_BACKEND=fake)
+LLM_FAKE_LATENCY_MS = float(os.getenv("LLM_FAKE_LATENCY_MS", "200"))
+LLM_FAKE_TOKENS_PER_SECOND = float(os.getenv("LLM_FAKE_TOKENS_PER_SECOND", "0"))
+LLM_FAKE_ERROR_RATE = float(os.getenv("LLM_FAKE_ERROR_RATE", "0"))
+
+# Response cache for generated meal plans
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024"))
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", "86400"))
+LLM_CACHE_SQL = os.getenv("LLM_CACHE_SQL", "false").lower() == "true"
+
+# Password hashing
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_POOL_KIND = os.getenv("PASSWORD_POOL_KIND", "thread")  # "thread" or "process"
+PASSWORD_POOL_SIZE = int(os.getenv("PASSWORD_POOL_SIZE", str(os.cpu_count() or 1)))
+PASSWORD_QUEUE_LIMIT = int(os.getenv("PASSWORD_QUEUE_LIMIT", "64"))
+
+# Authenticated-user cache
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "30"))
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+
+# Database engine and connection pool
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))  # 0 disables
+DB_ASYNC = os.getenv("DB_ASYNC", "false").lower() == "true"
+DB_AUTO_MIGRATE = os.getenv("DB_AUTO_MIGRATE", "false").lower() == "true"
+
+# Server-side follow-up conversations
+CONVERSATION_TOKEN_BUDGET = int(os.getenv("CONVERSATION_TOKEN_BUDGET", "3000"))
+CONVERSATION_MAX_MESSAGES = int(os.getenv("CONVERSATION_MAX_MESSAGES", "50"))
+CONVERSATION_SUMMARY_TRIGGER_TOKENS = int(os.getenv("CONVERSATION_SUMMARY_TRIGGER_TOKENS", "1500"))
+
+# Semantic answer cache for follow-up questions
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.9"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "10000"))
+SEMANTIC_CACHE_TTL_SECONDS = float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "86400"))
+SEMANTIC_CACHE_DIM = int(os.getenv("SEMANTIC_CACHE_DIM", "512"))
+
+# Background meal plan jobs
+JOB_WORKER_MODE = os.getenv("JOB_WORKER_MODE", "inprocess")  # "inprocess" or "external"
+JOB_WORKER_CONCURRENCY = int(os.getenv("JOB_WORKER_CONCURRENCY", "4"))
+JOB_MAX_QUEUE_DEPTH = int(os.getenv("JOB_MAX_QUEUE_DEPTH", "100"))
+JOB_POLL_INTERVAL_SECONDS = float(os.getenv("JOB_POLL_INTERVAL_SECONDS", "1"))
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "600"))
+
+# Coalescing of identical concurrent LLM requests
+LLM_COALESCE_WINDOW_SECONDS = float(os.getenv("LLM_COALESCE_WINDOW_SECONDS", "2"))
+
+# LLM usage accounting and quotas (0 disables a quota)
+LLM_USER_REQUESTS_PER_MINUTE = int(os.getenv("LLM_USER_REQUESTS_PER_MINUTE", "0"))
+LLM_USER_TOKENS_PER_DAY = int(os.getenv("LLM_USER_TOKENS_PER_DAY", "0"))
+LLM_ENDPOINT_REQUESTS_PER_MINUTE = int(os.getenv("LLM_ENDPOINT_REQUESTS_PER_MINUTE", "0"))
+LLM_ENDPOINT_TOKENS_PER_MINUTE = int(os.getenv("LLM_ENDPOINT_TOKENS_PER_MINUTE", "0"))
+USAGE_FLUSH_INTERVAL_SECONDS = float(os.getenv("USAGE_FLUSH_INTERVAL_SECONDS", "5"))
+
+# Bundled food composition data and its memory-mapped cache
+FOOD_DATA_PATH = os.getenv("FOOD_DATA_PATH", os.path.join(os.path.dirname(__file__), "data", "foods.csv"))
+FOOD_CACHE_DIR = os.getenv("FOOD_CACHE_DIR", os.path.join(os.path.dirname(__file__), "data", "cache"))
+
+# Logging and tracing
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # "json" or "text"
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.01"))
+EVENT_LOOP_LAG_INTERVAL_SECONDS = float(os.getenv("EVENT_LOOP_LAG_INTERVAL_SECONDS", "0.5"))  # 0 disables
+
+# Meal plan history retention (0 disables a limit)
+PLAN_HISTORY_MAX_VERSIONS = int(os.getenv("PLAN_HISTORY_MAX_VERSIONS", "50"))
+PLAN_HISTORY_MAX_AGE_DAYS = int(os.getenv("PLAN_HISTORY_MAX_AGE_DAYS", "365"))
+PLAN_HISTORY_COMPRESSION_LEVEL = int(os.getenv("PLAN_HISTORY_COMPRESSION_LEVEL", "6"))
+
+# Admission control and load shedding
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+ADMISSION_MAX_INFLIGHT = int(os.getenv("ADMISSION_MAX_INFLIGHT", "256"))
+ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "10"))
+ADMISSION_LLM_CONCURRENCY = int(os.getenv("ADMISSION_LLM_CONCURRENCY", "32"))
+ADMISSION_LLM_MIN_CONCURRENCY = int(os.getenv("ADMISSION_LLM_MIN_CONCURRENCY", "4"))
+ADMISSION_LLM_MAX_CONCURRENCY = int(os.getenv("ADMISSION_LLM_MAX_CONCURRENCY", "128"))
+ADMISSION_LLM_TARGET_LATENCY_SECONDS = float(os.getenv("ADMISSION_LLM_TARGET_LATENCY_SECONDS", "20"))
+
+# Compression of API responses and conditional GETs
+COMPRESSION_MINIMUM_SIZE = int(os.getenv("COMPRESSION_MINIMUM_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+
+# Production static file serving
+SERVE_FRONTEND = os.getenv("SERVE_FRONTEND", "false").lower() == "true"
+FRONTEND_DIR = os.getenv("FRONTEND_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "frontend"))
+STATIC_MAX_AGE_SECONDS = int(os.getenv("STATIC_MAX_AGE_SECONDS", "3600"))
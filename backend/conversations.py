@@ -0,0 +1,217 @@
+import logging
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from backend import metrics, models
+from backend.config import (
+    CONVERSATION_MAX_MESSAGES,
+    CONVERSATION_SUMMARY_TRIGGER_TOKENS,
+    CONVERSATION_TOKEN_BUDGET,
+)
+from backend.database import run_db, session_scope
+from backend.llm import estimate_tokens, get_gateway
+from backend.routing import FOLLOW_UP
+
+# Follow-up conversations are stored server-side. Each turn the client sends
+# only the conversation id and the new message; the model context is rebuilt
+# from the newest stored messages that fit the token budget, plus a rolling
+# summary of everything older.
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_SYSTEM_PROMPT = "You summarize conversations between a dietitian and a client. Keep goals, constraints, preferences and any agreed changes to the meal plan. Be concise."
+
+
+class ConversationNotFound(Exception):
+    pass
+
+
+class ContextWindow:
+    def __init__(self, messages, tokens, summarize_through=None):
+        self.messages = messages
+        self.tokens = tokens
+        # Set when messages fell out of the window and should be folded
+        # into the rolling summary
+        self.summarize_through = summarize_through
+
+
+def get_or_create_conversation(
+    db: Session, user_id: int, conversation_id: Optional[int]
+) -> models.Conversation:
+    if conversation_id is not None:
+        conversation = db.get(models.Conversation, conversation_id)
+        if conversation is None or conversation.user_id != user_id:
+            raise ConversationNotFound(conversation_id)
+        return conversation
+
+    now = datetime.utcnow()
+    conversation = models.Conversation(
+        user_id=user_id, created_at=now, updated_at=now, summarized_through=0
+    )
+    db.add(conversation)
+    db.flush()
+
+    # Seed new chats with the current meal plan so the model can refer to it
+    meal_plan = (
+        db.query(models.User.current_meal_plan)
+        .filter(models.User.id == user_id)
+        .scalar()
+    )
+    if meal_plan:
+        add_message(db, conversation, "assistant", meal_plan)
+    return conversation
+
+
+def add_message(db: Session, conversation: models.Conversation, role: str, content: str):
+    now = datetime.utcnow()
+    db.add(models.ConversationMessage(
+        conversation_id=conversation.id,
+        role=role,
+        content=content,
+        token_count=estimate_tokens(content),
+        created_at=now,
+    ))
+    conversation.updated_at = now
+    db.flush()
+
+
+def start_turn(
+    db: Session,
+    user_id: int,
+    conversation_id: Optional[int],
+    message: str,
+    system_prompt: str,
+):
+    conversation = get_or_create_conversation(db, user_id, conversation_id)
+    add_message(db, conversation, "user", message)
+    context = build_context(db, conversation, system_prompt)
+    conversation_id = conversation.id
+    db.commit()
+    return conversation_id, context
+
+
+def record_reply(db: Session, conversation_id: int, content: str):
+    conversation = db.get(models.Conversation, conversation_id)
+    add_message(db, conversation, "assistant", content)
+    db.commit()
+
+
+def build_context(
+    db: Session,
+    conversation: models.Conversation,
+    system_prompt: str,
+    budget: int = CONVERSATION_TOKEN_BUDGET,
+) -> ContextWindow:
+    # Only the newest unsummarized messages are read, so the cost of a turn
+    # does not grow with the length of the chat
+    recent = (
+        db.query(models.ConversationMessage)
+        .filter(
+            models.ConversationMessage.conversation_id == conversation.id,
+            models.ConversationMessage.id > (conversation.summarized_through or 0),
+        )
+        .order_by(models.ConversationMessage.id.desc())
+        .limit(CONVERSATION_MAX_MESSAGES)
+        .all()
+    )
+
+    header = [{"role": "system", "content": system_prompt}]
+    if conversation.summary:
+        header.append({
+            "role": "system",
+            "content": f"Summary of the earlier conversation: {conversation.summary}",
+        })
+    tokens = sum(estimate_tokens(m["content"]) for m in header)
+
+    window = []
+    for i, message in enumerate(recent):
+        # The newest message is always sent, even if it alone exceeds the budget
+        if i > 0 and tokens + message.token_count > budget:
+            break
+        window.append(message)
+        tokens += message.token_count
+
+    excluded = recent[len(window):]
+    summarize_through = None
+    if excluded:
+        excluded_tokens = sum(m.token_count for m in excluded)
+        if (
+            excluded_tokens >= CONVERSATION_SUMMARY_TRIGGER_TOKENS
+            or len(recent) == CONVERSATION_MAX_MESSAGES
+        ):
+            summarize_through = excluded[0].id
+
+    messages = header + [
+        {"role": m.role, "content": m.content} for m in reversed(window)
+    ]
+    return ContextWindow(messages, tokens, summarize_through)
+
+
+def _load_for_summary(db: Session, conversation_id: int, through_id: int):
+    conversation = db.get(models.Conversation, conversation_id)
+    if conversation is None or (conversation.summarized_through or 0) >= through_id:
+        return None, []
+    messages = (
+        db.query(models.ConversationMessage)
+        .filter(
+            models.ConversationMessage.conversation_id == conversation_id,
+            models.ConversationMessage.id > (conversation.summarized_through or 0),
+            models.ConversationMessage.id <= through_id,
+        )
+        .order_by(models.ConversationMessage.id)
+        .all()
+    )
+    return conversation.summary, [(m.role, m.content) for m in messages]
+
+
+def _save_summary(db: Session, conversation_id: int, summary: str, through_id: int):
+    conversation = db.get(models.Conversation, conversation_id)
+    # Another turn may have summarized further in the meantime
+    if conversation is None or (conversation.summarized_through or 0) >= through_id:
+        return
+    conversation.summary = summary
+    conversation.summarized_through = through_id
+    db.commit()
+
+
+_summarizing = set()
+
+
+async def summarize_conversation(conversation_id: int, through_id: int):
+    # Runs as a background task after the reply has been sent
+    if conversation_id in _summarizing:
+        return
+    _summarizing.add(conversation_id)
+    try:
+        async with session_scope() as db:
+            summary, messages = await run_db(db, _load_for_summary, conversation_id, through_id)
+            if not messages:
+                return
+
+            transcript = "\n".join(f"{role}: {content}" for role, content in messages)
+            if summary:
+                transcript = f"Earlier summary: {summary}\n\n{transcript}"
+            result = await get_gateway().complete(messages=[
+                {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+                {"role": "user", "content": transcript},
+            ], task=FOLLOW_UP)
+            await run_db(db, _save_summary, conversation_id, result.content, through_id)
+            metrics.inc("conversation_summaries_total")
+    except Exception as e:
+        logger.warning("Error summarizing conversation %s: %s", conversation_id, e)
+    finally:
+        _summarizing.discard(conversation_id)
+
+
+def observe_turn(context: ContextWindow, request_bytes: int):
+    metrics.observe(
+        "follow_up_context_tokens", context.tokens,
+        buckets=(250, 500, 1000, 2000, 4000, 8000, 16000),
+    )
+    metrics.observe(
+        "follow_up_request_bytes", request_bytes,
+        buckets=(256, 1024, 4096, 16384, 65536, 262144),
+    )
+
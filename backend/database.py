@@ -1,6 +1,200 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from backend.config import DATABASE_URL
+import threading
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from starlette.concurrency import run_in_threadpool
+from backend import metrics
+from backend.tracing import add_span, span
+from backend.config import (
+    DATABASE_URL,
+    DB_ASYNC,
+    DB_MAX_OVERFLOW,
+    DB_POOL_PRE_PING,
+    DB_POOL_RECYCLE,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+    DB_STATEMENT_TIMEOUT_MS,
+)
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
\ No newline at end of file
+# Pools that record how long each checkout waited for a free connection
+class TimedPoolMixin:
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics.observe("db_pool_checkout_wait_seconds", time.perf_counter() - start)
+
+class TimedQueuePool(TimedPoolMixin, QueuePool):
+    pass
+
+class TimedAsyncAdaptedQueuePool(TimedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def async_url(url):
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.drivername, url.drivername))
+
+def engine_options(url, use_async=False):
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite":
+        # Sessions may be used from the threadpool, so the connection must
+        # not be pinned to the thread that opened it
+        return {"connect_args": {"check_same_thread": False}}
+
+    options = {
+        "poolclass": TimedAsyncAdaptedQueuePool if use_async else TimedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+    if DB_STATEMENT_TIMEOUT_MS and url.get_backend_name() == "postgresql":
+        if use_async:
+            options["connect_args"] = {
+                "server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}
+            }
+        else:
+            options["connect_args"] = {
+                "options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+            }
+    return options
+
+def track_pool_usage(sync_engine):
+    pool = sync_engine.pool
+    if not isinstance(pool, QueuePool):
+        return
+    capacity = pool.size() + max(pool._max_overflow, 0)
+
+    def report(checked_out):
+        metrics.set_gauge("db_pool_checked_out", checked_out)
+        metrics.set_gauge("db_pool_utilization", checked_out / capacity if capacity else 0.0)
+
+    # checkin fires before the pool releases the connection
+    event.listen(sync_engine, "checkout", lambda *args: report(pool.checkedout()))
+    event.listen(sync_engine, "checkin", lambda *args: report(pool.checkedout() - 1))
+
+# Engines are created on first use rather than at import, so importing the
+# app (or a CLI that never touches the database) costs no driver setup, and
+# each gunicorn worker builds its own pool after forking.
+_engine = None
+_async_engine = None
+_engine_lock = threading.Lock()
+
+class LazySessionmaker(sessionmaker):
+    def __call__(self, **local_kw):
+        if self.kw.get("bind") is None:
+            get_engine()
+        return super().__call__(**local_kw)
+
+SessionLocal = LazySessionmaker(autocommit=False, autoflush=False)
+
+# Optional async driver path (DB_ASYNC=true): requests get an AsyncSession
+# backed by asyncpg/aiosqlite instead of a sync Session
+AsyncSessionLocal = None
+if DB_ASYNC:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    class LazyAsyncSessionmaker(async_sessionmaker):
+        def __call__(self, **local_kw):
+            if self.kw.get("bind") is None:
+                get_async_engine()
+            return super().__call__(**local_kw)
+
+    AsyncSessionLocal = LazyAsyncSessionmaker(autoflush=False, expire_on_commit=False)
+
+def get_engine():
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+                track_pool_usage(engine)
+                event.listen(engine, "before_cursor_execute", count_query)
+                SessionLocal.configure(bind=engine)
+                _engine = engine
+    return _engine
+
+def get_async_engine():
+    global _async_engine
+    if _async_engine is None:
+        with _engine_lock:
+            if _async_engine is None:
+                engine = create_async_engine(
+                    async_url(DATABASE_URL), **engine_options(DATABASE_URL, use_async=True)
+                )
+                track_pool_usage(engine.sync_engine)
+                event.listen(engine.sync_engine, "before_cursor_execute", count_query)
+                AsyncSessionLocal.configure(bind=engine)
+                _async_engine = engine
+    return _async_engine
+
+def __getattr__(name):
+    # Keeps `from backend.database import engine` working
+    if name == "engine":
+        return get_engine()
+    if name == "async_engine":
+        return get_async_engine() if DB_ASYNC else None
+    raise AttributeError(name)
+
+@asynccontextmanager
+async def session_scope():
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as db:
+            yield db
+    else:
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            await run_in_threadpool(db.close)
+
+# Database dependency
+async def get_db():
+    async with session_scope() as db:
+        yield db
+
+async def run_db(db, fn, *args):
+    # Runs sync ORM code without blocking the event loop: through the async
+    # driver when the session is an AsyncSession, otherwise on the threadpool
+    with span(f"db.{getattr(fn, '__name__', 'query')}"):
+        if AsyncSessionLocal is not None:
+            return await db.run_sync(fn, *args)
+        return await run_in_threadpool(fn, db, *args)
+
+# Per-request query counting. The middleware installs a fresh counter for
+# each request; the holder is mutable so increments made from threadpool
+# dependencies are visible to the request that owns it.
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+query_counter: ContextVar = ContextVar("query_counter", default=None)
+
+def count_query(conn, cursor, statement, parameters, context, executemany):
+    counter = query_counter.get()
+    if counter is not None:
+        counter.count += 1
+
+# Commit timing for traced requests; covers the flush and the COMMIT itself
+def mark_commit_start(session):
+    session.info["commit_started"] = time.perf_counter()
+
+def record_commit(session):
+    started = session.info.pop("commit_started", None)
+    if started is not None:
+        add_span("db.commit", time.perf_counter() - started)
+
+event.listen(Session, "before_commit", mark_commit_start)
+event.listen(Session, "after_commit", record_commit)
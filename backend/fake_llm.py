@@ -0,0 +1,169 @@
+import asyncio
+import random
+import time
+import uuid
+
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+from backend.config import (
+    LLM_FAKE_ERROR_RATE,
+    LLM_FAKE_LATENCY_MS,
+    LLM_FAKE_TOKENS_PER_SECOND,
+)
+from backend.llm import estimate_tokens
+
+# Local stand-in for the OpenAI chat completions API. It mimics the parts of
+# AsyncOpenAI the gateway uses so the app can be load-tested with no network.
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+MEALS = [
+    ("Breakfast", "Oatmeal with berries", 350, 12, 60, 7),
+    ("Lunch", "Grilled chicken salad", 500, 40, 30, 20),
+    ("Snack", "Greek yogurt with almonds", 250, 18, 15, 12),
+    ("Dinner", "Salmon with quinoa and broccoli", 600, 42, 50, 22),
+]
+
+
+def fake_meal_plan(days=7):
+    lines = ["# Meal Plan", "", "Daily calories: 1700 kcal", ""]
+    for day in DAYS[:days]:
+        lines.append(f"## {day}")
+        for meal, item, kcal, protein, carbs, fat in MEALS:
+            lines.append(f"### {meal}")
+            lines.append(
+                f"- {item}: {kcal} kcal, {protein}g protein, {carbs}g carbs, {fat}g fat"
+            )
+        lines.append("")
+    return "\n".join(lines)
+
+
+def fake_reply(messages):
+    last = messages[-1]["content"] if messages else ""
+    if "meal plan" in last.lower():
+        return fake_meal_plan()
+    return f"Here is some guidance on your question: {last[:200]}"
+
+
+class FakeCompletions:
+    def __init__(self, latency_ms=None, tokens_per_second=None, error_rate=None):
+        self.latency_ms = LLM_FAKE_LATENCY_MS if latency_ms is None else latency_ms
+        self.tokens_per_second = (
+            LLM_FAKE_TOKENS_PER_SECOND if tokens_per_second is None else tokens_per_second
+        )
+        self.error_rate = LLM_FAKE_ERROR_RATE if error_rate is None else error_rate
+        self.calls = 0
+
+    async def create(self, model, messages, stream=False, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency_ms / 1000)
+        if self.error_rate and random.random() < self.error_rate:
+            raise ConnectionError("Fake upstream error")
+
+        content = fake_reply(messages)
+        if stream:
+            return self._stream(model, content)
+
+        completion_tokens = estimate_tokens(content)
+        if self.tokens_per_second:
+            await asyncio.sleep(completion_tokens / self.tokens_per_second)
+
+        prompt_tokens = sum(estimate_tokens(m["content"]) for m in messages)
+        return ChatCompletion.model_validate({
+            "id": f"fake-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": content},
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        })
+
+    async def _stream(self, model, content):
+        completion_id = f"fake-{uuid.uuid4().hex}"
+        created = int(time.time())
+        # Emit roughly one token (four characters) per chunk
+        for i in range(0, len(content), 4):
+            if self.tokens_per_second:
+                await asyncio.sleep(1 / self.tokens_per_second)
+            yield ChatCompletionChunk.model_validate({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "finish_reason": None,
+                    "delta": {"content": content[i:i + 4]},
+                }],
+            })
+
+
+class _FakeChat:
+    def __init__(self, completions):
+        self.completions = completions
+
+
+class FakeAsyncOpenAI:
+    def __init__(self, **kwargs):
+        self.chat = _FakeChat(FakeCompletions(**kwargs))
+
+    async def close(self):
+        pass
+
+
+
+def create_app(latency_ms=None, tokens_per_second=None, error_rate=None):
+    # OpenAI-compatible HTTP server around FakeCompletions. Pointing the real
+    # client at it (OPENAI_BASE_URL) exercises the HTTP path end to end.
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse, StreamingResponse
+
+    app = FastAPI()
+    completions = FakeCompletions(latency_ms, tokens_per_second, error_rate)
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stream = bool(body.get("stream"))
+        try:
+            result = await completions.create(body.get("model", "fake"), body.get("messages", []), stream=stream)
+        except ConnectionError as e:
+            return JSONResponse({"error": {"message": str(e), "type": "server_error"}}, status_code=500)
+        if not stream:
+            return JSONResponse(result.model_dump(exclude_none=True))
+
+        async def events():
+            async for chunk in result:
+                yield f"data: {chunk.model_dump_json(exclude_none=True)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def main():
+    import argparse
+
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run a fake OpenAI-compatible completion server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=None)
+    parser.add_argument("--tokens-per-second", type=float, default=None)
+    parser.add_argument("--error-rate", type=float, default=None)
+    args = parser.parse_args()
+    app = create_app(args.latency_ms, args.tokens_per_second, args.error_rate)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+import bisect
+import csv
+import difflib
+import logging
+import os
+import re
+import threading
+from typing import List, Optional
+
+import numpy as np
+
+from backend.config import FOOD_CACHE_DIR, FOOD_DATA_PATH
+
+# Food composition data (per 100 g) loaded from the bundled CSV. The CSV is
+# compiled once into .npy files sorted by name; later starts memory-map those
+# files instead of parsing text. Names are searched by prefix with a binary
+# search, or fuzzily with difflib; each nutrient column has a precomputed
+# sort order so range queries are two binary searches.
+
+NUTRIENTS = ("calories", "protein", "carbs", "fat", "fiber")
+NAME_DTYPE = "U48"
+
+_quantity = re.compile(r"(\d+(?:\.\d+)?)\s*(g|grams?|oz|ounces?)\b", re.I)
+_non_word = re.compile(r"[^a-z ]+")
+GRAMS_PER_OUNCE = 28.3495
+
+logger = logging.getLogger(__name__)
+
+
+class FoodDatabase:
+    def __init__(self, names, values, orders):
+        self.names = names      # sorted array of lowercase names
+        self.values = values    # float32 matrix, one column per nutrient
+        self.orders = orders    # per nutrient: row indices sorted by that value
+        self._name_list = [str(name) for name in names]
+
+    def __len__(self):
+        return len(self.names)
+
+    def row(self, index):
+        food = {"name": self._name_list[index]}
+        for i, nutrient in enumerate(NUTRIENTS):
+            food[nutrient] = round(float(self.values[index, i]), 1)
+        return food
+
+    def get(self, name) -> Optional[dict]:
+        name = name.strip().lower()
+        index = bisect.bisect_left(self._name_list, name)
+        if index < len(self._name_list) and self._name_list[index] == name:
+            return self.row(index)
+        return None
+
+    def prefix_search(self, prefix, limit=10) -> List[dict]:
+        prefix = prefix.strip().lower()
+        start = bisect.bisect_left(self._name_list, prefix)
+        results = []
+        for index in range(start, min(start + limit, len(self._name_list))):
+            if not self._name_list[index].startswith(prefix):
+                break
+            results.append(self.row(index))
+        return results
+
+    def fuzzy_search(self, query, limit=10, cutoff=0.6) -> List[dict]:
+        matches = difflib.get_close_matches(
+            query.strip().lower(), self._name_list, n=limit, cutoff=cutoff
+        )
+        return [self.get(match) for match in matches]
+
+    def search(self, query, limit=10) -> List[dict]:
+        # Prefix matches first, then fuzzy matches to fill up the limit
+        results = self.prefix_search(query, limit)
+        if len(results) < limit:
+            seen = {food["name"] for food in results}
+            for food in self.fuzzy_search(query, limit):
+                if food["name"] not in seen:
+                    results.append(food)
+        return results[:limit]
+
+    def range_query(self, nutrient, minimum=None, maximum=None, limit=50) -> List[dict]:
+        column = NUTRIENTS.index(nutrient)
+        order = self.orders[column]
+        values = self.values[order, column]
+        lo = 0 if minimum is None else int(np.searchsorted(values, minimum, side="left"))
+        hi = len(values) if maximum is None else int(np.searchsorted(values, maximum, side="right"))
+        return [self.row(int(index)) for index in order[lo:hi][:limit]]
+
+    def match(self, text) -> Optional[dict]:
+        # Longest food name contained in free text, e.g. a meal plan item line
+        words = " " + _non_word.sub(" ", text.lower()) + " "
+        best = None
+        for name in self._name_list:
+            if " " + name + " " in words and (best is None or len(name) > len(best)):
+                best = name
+        return self.get(best) if best else None
+
+    def item_macros(self, text) -> Optional[dict]:
+        # Exact macros for an item line with a weight, e.g. "150g chicken breast"
+        quantity = _quantity.search(text)
+        if not quantity:
+            return None
+        # The food usually follows its weight ("150g chicken breast")
+        food = self.match(text[quantity.end():]) or self.match(text)
+        if food is None:
+            return None
+        grams = float(quantity.group(1))
+        if quantity.group(2).lower().startswith(("oz", "ounce")):
+            grams *= GRAMS_PER_OUNCE
+        scale = grams / 100.0
+        return {
+            "food": food["name"],
+            "grams": round(grams, 1),
+            "calories": round(food["calories"] * scale, 1),
+            "protein": round(food["protein"] * scale, 1),
+            "carbs": round(food["carbs"] * scale, 1),
+            "fat": round(food["fat"] * scale, 1),
+        }
+
+
+def _read_csv(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = sorted(csv.DictReader(f), key=lambda row: row["name"].strip().lower())
+    names = np.array([row["name"].strip().lower() for row in rows], dtype=NAME_DTYPE)
+    values = np.array(
+        [[float(row[nutrient] or 0) for nutrient in NUTRIENTS] for row in rows],
+        dtype=np.float32,
+    ).reshape(len(rows), len(NUTRIENTS))
+    orders = np.argsort(values, axis=0, kind="stable").T.copy()
+    return names, values, orders
+
+
+def _cache_paths(cache_dir):
+    return {part: os.path.join(cache_dir, f"foods_{part}.npy") for part in ("names", "values", "orders")}
+
+
+def build_cache(data_path=FOOD_DATA_PATH, cache_dir=FOOD_CACHE_DIR):
+    names, values, orders = _read_csv(data_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    paths = _cache_paths(cache_dir)
+    for part, array in (("names", names), ("values", values), ("orders", orders)):
+        # Write then rename so other workers never map a half-written file
+        tmp = paths[part] + f".{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp, paths[part])
+
+
+def load_food_database(data_path=FOOD_DATA_PATH, cache_dir=FOOD_CACHE_DIR) -> FoodDatabase:
+    paths = _cache_paths(cache_dir)
+    try:
+        stale = any(
+            not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(data_path)
+            for path in paths.values()
+        )
+        if stale:
+            build_cache(data_path, cache_dir)
+        return FoodDatabase(*(np.load(paths[part], mmap_mode="r") for part in ("names", "values", "orders")))
+    except OSError as e:
+        # Read-only deploys can still use the data, just without the cache
+        logger.warning("Food cache unavailable, reading %s: %s", data_path, e)
+        return FoodDatabase(*_read_csv(data_path))
+
+
+_foods = None
+_foods_lock = threading.Lock()
+
+
+def get_food_database() -> FoodDatabase:
+    global _foods
+    if _foods is None:
+        with _foods_lock:
+            if _foods is None:
+                _foods = load_food_database()
+    return _foods
@@ -0,0 +1,26 @@
+import os
+
+# Production server settings, used by `python driver.py --production` or
+# `gunicorn backend.main:app -c backend/gunicorn_conf.py`. Every value can be
+# overridden through the environment.
+
+bind = os.getenv("BIND", f"0.0.0.0:{os.getenv('PORT', '8000')}")
+worker_class = "uvicorn.workers.UvicornWorker"
+# Async workers: one per core is enough, the event loop handles concurrency
+workers = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+
+# Recycle workers after a bounded number of requests; the jitter keeps them
+# from all restarting at the same moment
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "2000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "200"))
+
+# Long LLM calls must not trip the worker heartbeat timeout
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+# In-flight requests get this long to finish on reload (SIGHUP) or shutdown
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+
+# Each worker builds its own DB engine and LLM client after forking
+preload_app = False
+accesslog = None
+loglevel = os.getenv("LOG_LEVEL", "info").lower()
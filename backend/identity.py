@@ -0,0 +1,143 @@
+from typing import Optional
+
+from pydantic import BaseModel, ConfigDict
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, defer, object_session
+
+from backend import models
+from backend.cache import MemoryTier
+from backend.config import USER_CACHE_MAX_ENTRIES, USER_CACHE_TTL_SECONDS
+from backend.meal_plans import apply_section_tweak, save_structured_plan
+from backend.plan_history import decompress_plan, load_version_row, write_current_plan
+
+# Short-lived cache of authenticated users keyed on the token subject, so
+# protected endpoints can skip the users lookup on repeat requests. Entries
+# are snapshots, not ORM rows, and never include the meal plan text.
+
+
+class CurrentUser(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    username: str
+    email: str
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    age: Optional[int] = None
+    height: Optional[float] = None
+    weight: Optional[float] = None
+    goal: Optional[str] = None
+
+
+identity_cache = MemoryTier(
+    max_entries=USER_CACHE_MAX_ENTRIES, ttl=USER_CACHE_TTL_SECONDS, name="identity"
+)
+
+
+def load_identity(db: Session, username: str) -> Optional[CurrentUser]:
+    row = (
+        db.query(models.User)
+        .options(defer(models.User.current_meal_plan))
+        .filter(models.User.username == username)
+        .first()
+    )
+    if row is None:
+        return None
+    user = CurrentUser.model_validate(row)
+    identity_cache.set(username, user)
+    return user
+
+
+def invalidate_user(username: str):
+    identity_cache.delete(username)
+
+
+# Any ORM change to a user row (profile or password update, rename,
+# deletion) drops its cache entry once the transaction commits, whichever
+# code path made it. Bulk UPDATE/DELETE statements bypass these hooks and
+# call invalidate_user themselves. Other processes keep their copy until
+# the TTL runs out.
+def _mark_user_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is None:
+        return
+    usernames = session.info.setdefault("changed_usernames", set())
+    usernames.add(target.username)
+    usernames.update(inspect(target).attrs.username.history.deleted or ())
+
+
+def _invalidate_changed_users(session):
+    for username in session.info.pop("changed_usernames", ()):
+        invalidate_user(username)
+
+
+def _forget_changed_users(session, previous_transaction):
+    session.info.pop("changed_usernames", None)
+
+
+event.listen(models.User, "after_update", _mark_user_changed)
+event.listen(models.User, "after_delete", _mark_user_changed)
+event.listen(Session, "after_commit", _invalidate_changed_users)
+event.listen(Session, "after_soft_rollback", _forget_changed_users)
+
+
+def load_meal_plan(db: Session, user_id: int) -> Optional[str]:
+    return (
+        db.query(models.User.current_meal_plan)
+        .filter(models.User.id == user_id)
+        .scalar()
+    )
+
+
+def load_meal_plan_etag(db: Session, user_id: int) -> Optional[str]:
+    # Enough to answer a conditional GET without reading the plan text
+    return (
+        db.query(models.User.meal_plan_etag)
+        .filter(models.User.id == user_id)
+        .scalar()
+    )
+
+
+def load_meal_plan_with_etag(db: Session, user_id: int):
+    row = (
+        db.query(models.User.current_meal_plan, models.User.meal_plan_etag)
+        .filter(models.User.id == user_id)
+        .first()
+    )
+    return (row[0], row[1]) if row is not None else (None, None)
+
+
+def store_meal_plan(db: Session, user_id: int, username: str, meal_plan: str, source: str = "update"):
+    write_current_plan(db, user_id, meal_plan, source)
+    save_structured_plan(db, user_id, meal_plan)
+    db.commit()
+    invalidate_user(username)
+
+
+def store_section_tweak(
+    db: Session,
+    user_id: int,
+    username: str,
+    day: str,
+    meal: Optional[str],
+    new_section: str,
+    request_text: str,
+) -> str:
+    # Only the targeted section's rows, and that span of the plan text, are
+    # rewritten
+    previous, meal_plan = apply_section_tweak(db, user_id, day, meal, new_section, request_text)
+    write_current_plan(db, user_id, meal_plan, "tweak", previous=previous)
+    db.commit()
+    invalidate_user(username)
+    return meal_plan
+
+
+def rollback_meal_plan(db: Session, user_id: int, username: str, version: int):
+    # Restores an earlier version as a new one; the stored bytes are reused
+    row = load_version_row(db, user_id, version)
+    meal_plan = decompress_plan(row.content)
+    new_version = write_current_plan(db, user_id, meal_plan, "rollback", content=row.content, restored_from=version)
+    save_structured_plan(db, user_id, meal_plan)
+    db.commit()
+    invalidate_user(username)
+    return meal_plan, new_version
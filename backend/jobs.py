@@ -0,0 +1,253 @@
+import asyncio
+import hashlib
+import json
+import logging
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from backend import metrics, models
+from backend.cache import cache_key, complete_with_cache
+from backend.config import (
+    JOB_MAX_QUEUE_DEPTH,
+    JOB_POLL_INTERVAL_SECONDS,
+    JOB_STALE_SECONDS,
+    JOB_WORKER_CONCURRENCY,
+)
+from backend.database import run_db, session_scope
+from backend.identity import store_meal_plan
+from backend.llm import get_gateway
+from backend.routing import PLAN
+from backend.usage import UsageRecorder, set_call_context
+
+# Opt-in background mode for meal plan generation. Jobs are rows in the
+# meal_plan_jobs table, so no external broker is needed: workers (in the API
+# process or a separate one started from driver.py) claim queued rows with a
+# conditional UPDATE, run the completion and write the plan to the user.
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+IN_FLIGHT = (QUEUED, RUNNING)
+TERMINAL_STATES = (SUCCEEDED, FAILED)
+
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+def job_dedupe_key(user_id, kind, messages):
+    return hashlib.sha256(
+        f"{user_id}:{kind}:{cache_key(PLAN, messages)}".encode("utf-8")
+    ).hexdigest()
+
+
+def submit_job(db: Session, user_id: int, username: str, kind: str, messages, use_cache=True):
+    # Identical in-flight submissions share one job
+    dedupe_key = job_dedupe_key(user_id, kind, messages)
+    existing = (
+        db.query(models.MealPlanJob)
+        .filter(
+            models.MealPlanJob.dedupe_key == dedupe_key,
+            models.MealPlanJob.status.in_(IN_FLIGHT),
+        )
+        .first()
+    )
+    if existing is not None:
+        metrics.inc("jobs_deduplicated_total", kind=kind)
+        return existing.id, existing.status, True
+
+    depth = db.query(models.MealPlanJob).filter(models.MealPlanJob.status == QUEUED).count()
+    metrics.set_gauge("job_queue_depth", depth)
+    if depth >= JOB_MAX_QUEUE_DEPTH:
+        metrics.inc("jobs_rejected_total", kind=kind)
+        raise JobQueueFull()
+
+    job = models.MealPlanJob(
+        id=uuid.uuid4().hex,
+        user_id=user_id,
+        kind=kind,
+        status=QUEUED,
+        dedupe_key=dedupe_key,
+        payload=json.dumps({"messages": messages, "username": username, "cache": use_cache}),
+        created_at=datetime.utcnow(),
+    )
+    db.add(job)
+    db.commit()
+    metrics.inc("jobs_submitted_total", kind=kind)
+    return job.id, QUEUED, False
+
+
+def job_status(db: Session, job_id: str, user_id: int):
+    job = db.get(models.MealPlanJob, job_id)
+    if job is None or job.user_id != user_id:
+        return None
+    status = {"job_id": job.id, "kind": job.kind, "status": job.status}
+    if job.status == SUCCEEDED:
+        status["mealPlan"] = job.result
+        status["cached"] = bool(job.cached)
+    elif job.status == FAILED:
+        status["error"] = job.error
+    return status
+
+
+def _claim_next(db: Session):
+    stale = datetime.utcnow() - timedelta(seconds=JOB_STALE_SECONDS)
+    candidates = (
+        db.query(models.MealPlanJob.id)
+        .filter(or_(
+            models.MealPlanJob.status == QUEUED,
+            # Jobs left running by a worker that died are picked up again
+            (models.MealPlanJob.status == RUNNING) & (models.MealPlanJob.started_at < stale),
+        ))
+        .order_by(models.MealPlanJob.created_at)
+        .limit(5)
+        .all()
+    )
+    for (job_id,) in candidates:
+        now = datetime.utcnow()
+        claimed = (
+            db.query(models.MealPlanJob)
+            .filter(
+                models.MealPlanJob.id == job_id,
+                or_(
+                    models.MealPlanJob.status == QUEUED,
+                    (models.MealPlanJob.status == RUNNING) & (models.MealPlanJob.started_at < stale),
+                ),
+            )
+            .update({"status": RUNNING, "started_at": now}, synchronize_session=False)
+        )
+        db.commit()
+        if claimed:
+            job = db.get(models.MealPlanJob, job_id)
+            return {
+                "id": job.id,
+                "user_id": job.user_id,
+                "kind": job.kind,
+                "payload": json.loads(job.payload),
+                "queue_wait": (now - job.created_at).total_seconds(),
+            }
+    return None
+
+
+def _finish(db: Session, job_id: str, status: str, result=None, cached=False, error=None):
+    db.query(models.MealPlanJob).filter(models.MealPlanJob.id == job_id).update(
+        {
+            "status": status,
+            "result": result,
+            "cached": cached,
+            "error": error,
+            "finished_at": datetime.utcnow(),
+        },
+        synchronize_session=False,
+    )
+    db.commit()
+
+
+def _fail(db: Session, job_id: str, error: str):
+    # The failure may have left the session mid-transaction
+    db.rollback()
+    _finish(db, job_id, FAILED, error=error)
+
+
+async def execute_job(job):
+    payload = job["payload"]
+    set_call_context(job["user_id"], f"jobs/{job['kind']}")
+    metrics.observe("job_queue_wait_seconds", job["queue_wait"], kind=job["kind"])
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    async with session_scope() as db:
+        try:
+            messages = payload["messages"]
+            if payload.get("cache"):
+                meal_plan, cached = await complete_with_cache(messages)
+            else:
+                meal_plan = (await get_gateway().complete(messages=messages)).content
+                cached = False
+            await run_db(db, store_meal_plan, job["user_id"], payload["username"], meal_plan, job["kind"])
+            await run_db(db, _finish, job["id"], SUCCEEDED, meal_plan, cached)
+            metrics.inc("jobs_completed_total", kind=job["kind"], status=SUCCEEDED)
+        except Exception as e:
+            logger.warning("Job failed: %s", e, extra={"data": {"job_id": job["id"], "kind": job["kind"]}})
+            await run_db(db, _fail, job["id"], str(e))
+            metrics.inc("jobs_completed_total", kind=job["kind"], status=FAILED)
+        finally:
+            metrics.observe("job_run_seconds", loop.time() - start, kind=job["kind"])
+
+
+_wakeup = None
+
+
+def notify_workers():
+    # Wakes in-process workers immediately instead of waiting for the next
+    # poll. Must be called from the event loop thread.
+    if _wakeup is not None:
+        _wakeup.set()
+
+
+class JobWorker:
+    def __init__(self, concurrency=JOB_WORKER_CONCURRENCY, poll_interval=JOB_POLL_INTERVAL_SECONDS):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self._tasks = []
+
+    async def _loop(self):
+        while True:
+            _wakeup.clear()
+            try:
+                async with session_scope() as db:
+                    job = await run_db(db, _claim_next)
+            except Exception as e:
+                logger.exception("Job worker error")
+                job = None
+
+            if job is not None:
+                try:
+                    await execute_job(job)
+                except Exception:
+                    # The job stays running and is requeued once stale; the
+                    # worker carries on
+                    logger.exception("Job worker error", extra={"data": {"job_id": job["id"]}})
+                continue
+
+            try:
+                await asyncio.wait_for(_wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        global _wakeup
+        _wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._loop()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+async def run_worker():
+    worker = JobWorker()
+    worker.start()
+    recorder = UsageRecorder()
+    recorder.start()
+    logger.info("Job worker started", extra={"data": {"concurrency": worker.concurrency}})
+    try:
+        await asyncio.gather(*worker._tasks)
+    finally:
+        await worker.stop()
+        await recorder.stop()
+
+
+if __name__ == "__main__":
+    from backend.logging_config import configure_logging
+
+    configure_logging()
+    asyncio.run(run_worker())
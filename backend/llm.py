@@ -0,0 +1,224 @@
+import asyncio
+import random
+import time
+
+from openai import (
+    APIConnectionError,
+    APITimeoutError,
+    AsyncOpenAI,
+    InternalServerError,
+    RateLimitError,
+)
+
+from backend.config import (
+    LLM_BACKEND,
+    LLM_BACKOFF_BASE_SECONDS,
+    LLM_BACKOFF_MAX_SECONDS,
+    LLM_MAX_INFLIGHT,
+    LLM_MAX_RETRIES,
+    LLM_PLAN_MODEL,
+    LLM_TIMEOUT_SECONDS,
+)
+from backend.tracing import span
+from backend.usage import quotas, record_call
+
+DEFAULT_MODEL = LLM_PLAN_MODEL
+
+# Errors worth retrying: transient network, rate limiting and upstream 5xx
+RETRYABLE_ERRORS = (
+    APIConnectionError,
+    APITimeoutError,
+    RateLimitError,
+    InternalServerError,
+    ConnectionError,
+    asyncio.TimeoutError,
+)
+
+
+def estimate_tokens(text):
+    # Rough approximation used for budgeting: one token per four characters
+    return max(1, len(text) // 4) if text else 0
+
+
+def prompt_tokens(messages):
+    return sum(estimate_tokens(m["content"]) for m in messages)
+
+
+class LLMError(Exception):
+    pass
+
+
+class LLMResult:
+    def __init__(self, content, model, usage=None, latency=0.0, retries=0):
+        self.content = content
+        self.model = model
+        self.usage = usage
+        self.latency = latency
+        self.retries = retries
+
+
+def build_client(kind=LLM_BACKEND, base_url=None, api_key=None, timeout=LLM_TIMEOUT_SECONDS, **fake_options):
+    if kind == "fake":
+        from backend.fake_llm import FakeAsyncOpenAI
+        return FakeAsyncOpenAI(**fake_options)
+    # Retries are handled by the gateway so backoff and the in-flight limit
+    # stay under our control. Local OpenAI-compatible servers usually ignore
+    # the key, but the client insists on one.
+    if base_url and api_key is None:
+        api_key = "unused"
+    return AsyncOpenAI(base_url=base_url, api_key=api_key, timeout=timeout, max_retries=0)
+
+
+class LLMGateway:
+    def __init__(
+        self,
+        client=None,
+        client_options=None,
+        max_inflight=LLM_MAX_INFLIGHT,
+        timeout=LLM_TIMEOUT_SECONDS,
+        max_retries=LLM_MAX_RETRIES,
+        backoff_base=LLM_BACKOFF_BASE_SECONDS,
+        backoff_max=LLM_BACKOFF_MAX_SECONDS,
+    ):
+        self._client = client
+        self.client_options = client_options or {}
+        self.max_inflight = max_inflight
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._semaphore = asyncio.Semaphore(max_inflight)
+        self.inflight = 0
+
+    @property
+    def client(self):
+        # One long-lived client so HTTP connections are pooled across requests
+        if self._client is None:
+            self._client = build_client(**self.client_options)
+        return self._client
+
+    def backoff(self, attempt):
+        # Full jitter: sleep somewhere in [0, min(max, base * 2^attempt)]
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def _create_with_retry(self, timeout, **kwargs):
+        attempt = 0
+        while True:
+            try:
+                response = await asyncio.wait_for(
+                    self.client.chat.completions.create(**kwargs), timeout
+                )
+                return response, attempt
+            except RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries:
+                    raise LLMError(
+                        f"LLM request failed after {attempt + 1} attempts: {e}"
+                    ) from e
+                await asyncio.sleep(self.backoff(attempt))
+                attempt += 1
+
+    async def complete(self, messages, model=DEFAULT_MODEL, timeout=None, **kwargs):
+        timeout = self.timeout if timeout is None else timeout
+        quotas.check()
+        async with self._semaphore:
+            self.inflight += 1
+            start = time.perf_counter()
+            retries = 0
+            status = "error"
+            usage = result = None
+            try:
+                with span("llm.complete"):
+                    completion, retries = await self._create_with_retry(
+                        timeout, model=model, messages=messages, **kwargs
+                    )
+                result = LLMResult(
+                    content=completion.choices[0].message.content,
+                    model=completion.model or model,
+                    usage=completion.usage,
+                    latency=time.perf_counter() - start,
+                    retries=retries,
+                )
+                usage = completion.usage
+                status = "ok"
+                return result
+            except LLMError:
+                retries = self.max_retries
+                raise
+            except asyncio.CancelledError:
+                status = "cancelled"
+                raise
+            finally:
+                self.inflight -= 1
+                # Every call is recorded, including timeouts, cancellations
+                # and unexpected errors, so quotas see what failed calls cost
+                record_call(
+                    result.model if result else model,
+                    usage.prompt_tokens if usage else prompt_tokens(messages),
+                    usage.completion_tokens if usage else estimate_tokens(result.content if result else ""),
+                    time.perf_counter() - start,
+                    retries,
+                    status=status,
+                )
+
+    async def stream(self, messages, model=DEFAULT_MODEL, timeout=None, **kwargs):
+        # Yields content deltas as they arrive. Retries only apply to opening
+        # the stream; once tokens have been sent a failure is surfaced as-is.
+        # The timeout bounds the gap between chunks, not the whole stream.
+        timeout = self.timeout if timeout is None else timeout
+        quotas.check()
+        async with self._semaphore:
+            self.inflight += 1
+            start = time.perf_counter()
+            retries = 0
+            completion_tokens = 0
+            status = "error"
+            try:
+                with span("llm.stream_open"):
+                    response, retries = await self._create_with_retry(
+                        timeout, model=model, messages=messages, stream=True, **kwargs
+                    )
+                chunks = response.__aiter__()
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), timeout)
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError as e:
+                        raise LLMError("LLM stream stalled") from e
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        completion_tokens += estimate_tokens(chunk.choices[0].delta.content)
+                        yield chunk.choices[0].delta.content
+                status = "ok"
+            except asyncio.CancelledError:
+                status = "cancelled"
+                raise
+            finally:
+                self.inflight -= 1
+                # Streamed responses carry no usage block; counts are estimates
+                record_call(model, prompt_tokens(messages), completion_tokens,
+                            time.perf_counter() - start, retries, status=status)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+
+_gateway = None
+
+
+def get_gateway():
+    # The model router, which offers the gateway's complete/stream over
+    # every configured backend
+    global _gateway
+    if _gateway is None:
+        from backend.routing import ModelRouter
+        _gateway = ModelRouter.from_config()
+    return _gateway
+
+
+async def close_gateway():
+    global _gateway
+    if _gateway is not None:
+        await _gateway.close()
+        _gateway = None
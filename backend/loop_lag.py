@@ -0,0 +1,35 @@
+import asyncio
+
+from backend import metrics
+from backend.config import EVENT_LOOP_LAG_INTERVAL_SECONDS
+
+# Samples how late the event loop wakes up from a timed sleep. Lag means
+# something is blocking the loop (sync I/O, CPU work) and every in-flight
+# request on this worker is stalled for that long.
+
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+
+class LoopLagMonitor:
+    def __init__(self, interval=EVENT_LOOP_LAG_INTERVAL_SECONDS):
+        self.interval = interval
+        self._task = None
+
+    async def _loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - start - self.interval)
+            metrics.observe("event_loop_lag_seconds", lag, buckets=LAG_BUCKETS)
+            metrics.set_gauge("event_loop_lag_last_seconds", lag)
+
+    def start(self):
+        if self.interval > 0:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
@@ -1,51 +1,186 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, File, HTTPException, Query, Request, BackgroundTasks, UploadFile
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, Field
 from typing import List, Optional
-from openai import OpenAI
+import io
 import os
+import asyncio
+import logging
+import time
+import uuid
 from dotenv import load_dotenv
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from jose import JWTError, jwt
-from datetime import datetime, timedelta
+from datetime import datetime
+from sqlalchemy import text
 from sqlalchemy.orm import Session
 from typing import Optional
-from backend.database import SessionLocal, engine
-from backend import models
+from backend.database import get_db, run_db, session_scope, QueryCounter, query_counter
+from backend import models, metrics
+from backend.llm import get_gateway, close_gateway, prompt_tokens
+from backend.routing import FOLLOW_UP, PLAN
+from backend.cache import cache_key, complete_with_cache, get_response_cache
+from backend.singleflight import get_single_flight
+from backend.streaming import sse_event, stream_completion
+from backend.jobs import JobQueueFull, JobWorker, TERMINAL_STATES, job_status, notify_workers, submit_job
+from backend.config import ADMIN_USERNAMES, DB_AUTO_MIGRATE, JOB_POLL_INTERVAL_SECONDS, JOB_WORKER_MODE, SERVE_FRONTEND
+from backend.identity import (
+    CurrentUser, identity_cache, load_identity, load_meal_plan, load_meal_plan_etag,
+    load_meal_plan_with_etag, rollback_meal_plan, store_meal_plan, store_section_tweak
+)
+from backend.plan_history import PlanVersionNotFound, list_versions, load_version
+from backend.foods import NUTRIENTS, get_food_database
+from backend.nutrition import DEFAULT_ACTIVITY, nutrition_targets
+from backend.prompts import (
+    FOLLOW_UP_SYSTEM_PROMPT, TWEAK_SYSTEM_PROMPT, meal_plan_messages_for
+)
+from backend.meal_plans import (
+    InvalidSectionReply, SectionNotFound, find_section, load_structured_plan, render_day, render_meal,
+    render_meal_plan
+)
+from backend.conversations import (
+    ConversationNotFound, observe_turn, record_reply, start_turn, summarize_conversation
+)
+from backend.passwords import PasswordPoolSaturated, get_password_hasher, shutdown_password_hasher
+from backend.auth import (
+    AuthError, RevocationSync, issue_tokens, revoke_access_token, revoke_refresh_token,
+    rotate_refresh_token, verify_access_token
+)
+from backend.admission import AdmissionMiddleware
+from backend.compression import CompressionMiddleware
+from backend.conditional import etag_matches, json_with_etag, not_modified
+from backend.loop_lag import LoopLagMonitor
+from backend.semantic_cache import get_semantic_cache
+from backend.users import DuplicateUser, create_user, detect_format, import_users, read_rows
+from backend.usage import QuotaExceeded, UsageRecorder, set_call_context, usage_summary
+from backend.logging_config import configure_logging
+from backend.tracing import should_sample, span, start_request
 from fastapi.middleware.httpsredirect import HTTPSRedirectMiddleware
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
 
 # Load environment variables
 load_dotenv()
 openai_key = os.getenv("OPENAI_KEY")
 
+configure_logging()
+logger = logging.getLogger(__name__)
+
 # Initialize FastAPI app
 app = FastAPI(title="Nutrition.io API")
 
-# Create database tables
-models.Base.metadata.create_all(bind=engine)
+# The schema is managed by backend/migrations.py, run once before the
+# workers start. DB_AUTO_MIGRATE=true applies pending migrations on startup
+# for local runs that bypass driver.py.
+@app.on_event("startup")
+async def auto_migrate():
+    if DB_AUTO_MIGRATE:
+        from backend.migrations import migrate
+
+        await run_in_threadpool(migrate)
+
+@app.on_event("shutdown")
+async def shutdown_llm_gateway():
+    await close_gateway()
+
+@app.on_event("shutdown")
+async def shutdown_password_pool():
+    shutdown_password_hasher()
+
+# Background meal plan jobs run in this process unless a separate worker
+# process was started (JOB_WORKER_MODE=external)
+@app.on_event("startup")
+async def start_job_worker():
+    if JOB_WORKER_MODE == "inprocess":
+        app.state.job_worker = JobWorker()
+        app.state.job_worker.start()
+
+@app.on_event("shutdown")
+async def stop_job_worker():
+    worker = getattr(app.state, "job_worker", None)
+    if worker is not None:
+        await worker.stop()
+
+# LLM usage rows are buffered in memory and written in batches
+@app.on_event("startup")
+async def start_usage_recorder():
+    app.state.usage_recorder = UsageRecorder()
+    app.state.usage_recorder.start()
+
+@app.on_event("shutdown")
+async def stop_usage_recorder():
+    recorder = getattr(app.state, "usage_recorder", None)
+    if recorder is not None:
+        await recorder.stop()
+
+# Revoked tokens are synced from the database so logouts handled by other
+# workers take effect here too
+@app.on_event("startup")
+async def start_revocation_sync():
+    app.state.revocation_sync = RevocationSync()
+    app.state.revocation_sync.start()
+
+@app.on_event("shutdown")
+async def stop_revocation_sync():
+    sync = getattr(app.state, "revocation_sync", None)
+    if sync is not None:
+        await sync.stop()
+
+# Event loop lag is exported as event_loop_lag_seconds
+@app.on_event("startup")
+async def start_loop_lag_monitor():
+    app.state.loop_lag_monitor = LoopLagMonitor()
+    app.state.loop_lag_monitor.start()
+
+@app.on_event("shutdown")
+async def stop_loop_lag_monitor():
+    monitor = getattr(app.state, "loop_lag_monitor", None)
+    if monitor is not None:
+        await monitor.stop()
+
+@app.exception_handler(QuotaExceeded)
+async def quota_exceeded_handler(request: Request, exc: QuotaExceeded):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": f"Rate limit exceeded: {exc.scope} quota"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
 
-# JWT settings
-SECRET_KEY = os.getenv("SECRET_KEY")  # Change this!
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
+@app.exception_handler(JobQueueFull)
+async def job_queue_full_handler(request: Request, exc: JobQueueFull):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Too many meal plans are queued, please retry shortly"},
+        headers={"Retry-After": "5"}
+    )
 
-def create_access_token(data: dict):
-    to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+@app.exception_handler(PasswordPoolSaturated)
+async def password_pool_saturated_handler(request: Request, exc: PasswordPoolSaturated):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Server is busy, please retry shortly"},
+        headers={"Retry-After": "1"}
+    )
 
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+@app.exception_handler(SectionNotFound)
+async def section_not_found_handler(request: Request, exc: SectionNotFound):
+    return JSONResponse(status_code=404, content={"detail": f"Meal plan section not found: {exc}"})
 
-# Database dependency
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+@app.exception_handler(InvalidSectionReply)
+async def invalid_section_reply_handler(request: Request, exc: InvalidSectionReply):
+    return JSONResponse(status_code=422, content={"detail": f"Could not update the section: {exc}"})
+
+@app.exception_handler(PlanVersionNotFound)
+async def plan_version_not_found_handler(request: Request, exc: PlanVersionNotFound):
+    return JSONResponse(status_code=404, content={"detail": f"Meal plan version not found: {exc}"})
+
+@app.exception_handler(ConversationNotFound)
+async def conversation_not_found_handler(request: Request, exc: ConversationNotFound):
+    return JSONResponse(status_code=404, content={"detail": "Conversation not found"})
+
+# JWT settings
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 # Configure CORS
 ALLOWED_ORIGINS = [
@@ -58,6 +193,10 @@ if os.getenv("ENVIRONMENT") == "development":
         "http://127.0.0.1:8080",
     ])
 
+# Bounds concurrent work per route class and sheds excess load with 503.
+# Added before CORS so rejections still carry CORS headers.
+app.add_middleware(AdmissionMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Allow all origins (adjust later for production)
@@ -66,6 +205,49 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
+# Large JSON and text responses are sent brotli or gzip compressed
+app.add_middleware(CompressionMiddleware)
+
+# Count DB queries per request so endpoint query cost stays visible
+@app.middleware("http")
+async def count_db_queries(request: Request, call_next):
+    counter = QueryCounter()
+    token = query_counter.set(counter)
+    try:
+        response = await call_next(request)
+    finally:
+        query_counter.reset(token)
+    response.headers["X-DB-Query-Count"] = str(counter.count)
+    # Label by route template so ids in the path don't create new series
+    route = request.scope.get("route")
+    metrics.observe(
+        "db_queries_per_request", counter.count,
+        buckets=(0, 1, 2, 3, 5, 10, 25),
+        path=route.path if route is not None else request.url.path
+    )
+    return response
+
+# Request ids and sampled tracing. Registered after the query counter so it
+# wraps it and the request log line covers the whole request.
+@app.middleware("http")
+async def request_context(request: Request, call_next):
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    trace = start_request(request_id, should_sample())
+    start = time.perf_counter()
+    response = await call_next(request)
+    response.headers["X-Request-ID"] = request_id
+    # Sampled requests and server errors get a log line with the stage timings
+    if trace is not None or response.status_code >= 500:
+        route = request.scope.get("route")
+        logger.info("request", extra={"data": {
+            "method": request.method,
+            "path": route.path if route is not None else request.url.path,
+            "status": response.status_code,
+            "ms": round((time.perf_counter() - start) * 1000, 3),
+            "spans": trace.as_list() if trace is not None else None,
+        }})
+    return response
+
 # Force HTTPS
 # app.add_middleware(HTTPSRedirectMiddleware)
 
@@ -91,49 +273,86 @@ class NutritionRequest(BaseModel):
     planType: str
     currentDiet: Optional[str] = None
 
-class Message(BaseModel):
-    role: str = Field(..., pattern="^(user|assistant|system)$")
-    content: str
+class RollbackRequest(BaseModel):
+    version: int = Field(..., gt=0)
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+class LogoutRequest(BaseModel):
+    refresh_token: Optional[str] = None
+
+class NutritionTargetsRequest(BaseModel):
+    age: int = Field(..., gt=0, lt=150)
+    height: float = Field(..., gt=0)
+    weight: float = Field(..., gt=0)
+    goal: str = ""
+    sex: Optional[str] = None
+    activity: str = DEFAULT_ACTIVITY
 
 class FollowUpRequest(BaseModel):
-    conversation: List[Message]
+    # Omit conversation_id to start a new conversation
+    conversation_id: Optional[int] = None
+    message: str = Field(..., min_length=1)
 
 class TweakRequest(BaseModel):
     username: str
     currentDiet: str
-
-# OpenAI client configuration
-def get_openai_client():
-    try:
-        return OpenAI()
-    except Exception as e:
-        print(f"Error initializing OpenAI client: {str(e)}")
-        raise HTTPException(
-            status_code=500,
-            detail="Failed to initialize AI service"
-        )
-
-# Helper function to create meal plan prompt
-def create_meal_plan_prompt(data: NutritionRequest) -> str:
-    return f"""
-    Generate a personalized meal plan based on the following details:
-    Username: {data.username}
-    Age: {data.age}
-    Height: {data.height} in
-    Weight: {data.weight} lbs
-    Goal: {data.goal}
-    {f"Current Diet: {data.currentDiet}" if data.planType == "tweaks" and data.currentDiet else ""}
+    # Optionally limit the change to one day, or one meal within that day
+    day: Optional[str] = None
+    meal: Optional[str] = None
+
+# The prompt depends only on the profile (not the username) so identical
+# profiles share cache entries
+def meal_plan_messages(data: NutritionRequest) -> List[dict]:
+    current_diet = data.currentDiet if data.planType == "tweaks" else None
+    return meal_plan_messages_for(data.age, data.height, data.weight, data.goal, current_diet)
+
+def tweak_messages(request: TweakRequest, current_meal_plan: Optional[str]) -> List[dict]:
+    prompt = f"""
+    Current user's meal plan needs adjustments. Details:
+    Username: {request.username}
+    Requested Changes: {request.currentDiet}
     
-    Please provide a detailed meal plan that includes:
-    1. Daily caloric requirements
-    2. Macro nutrient breakdown
-    3. Meal timing recommendations
-    4. Specific meal suggestions for each day
-    5. Portion sizes and alternatives
+    Current Meal Plan:
+    {current_meal_plan}
+    
+    Please provide an updated meal plan incorporating the requested changes while maintaining nutritional balance.
     """
+    return [
+        {"role": "system", "content": TWEAK_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+def section_tweak_messages(request: TweakRequest, section: str) -> List[dict]:
+    prompt = f"""
+    One section of the user's meal plan needs adjustments. Details:
+    Username: {request.username}
+    Requested Changes: {request.currentDiet}
+    
+    Current Section:
+    {section}
+    
+    Please provide only the updated section, starting with its heading and in the same markdown format, incorporating the requested changes while maintaining nutritional balance.
+    """
+    return [
+        {"role": "system", "content": TWEAK_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+async def start_follow_up(request: FollowUpRequest, http_request: Request, current_user: CurrentUser, db):
+    # Stores the new message and assembles the model context from the
+    # server-side history
+    conversation_id, context = await run_db(
+        db, start_turn, current_user.id, request.conversation_id,
+        request.message, FOLLOW_UP_SYSTEM_PROMPT
+    )
+    observe_turn(context, int(http_request.headers.get("content-length") or 0))
+    return conversation_id, context
 
 # Move this function up, before any endpoints
 async def get_current_user(
+    request: Request,
     token: str = Depends(oauth2_scheme), 
     db: Session = Depends(get_db)
 ):
@@ -143,104 +362,188 @@ async def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-    except JWTError:
+        with span("auth.decode"):
+            username = verify_access_token(token)["sub"]
+    except AuthError:
         raise credentials_exception
     
-    user = db.query(models.User).filter(models.User.username == username).first()
+    # Served from the identity cache when possible; the meal plan column is
+    # never loaded here
+    user = identity_cache.get(username)
+    if user is None:
+        user = await run_db(db, load_identity, username)
     if user is None:
         raise credentials_exception
+    # LLM calls made for this request are attributed to the user and route
+    set_call_context(user.id, request.scope["route"].path)
     return user
 
 # Then all your endpoints that use get_current_user should come after this function
 @app.post("/generate-meal-plan")
 async def generate_meal_plan(
     data: NutritionRequest,
-    current_user: models.User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     try:
-        client = get_openai_client()
-        print("Received request data:", data)
-        
-        completion = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a professional dietitian. Provide evidence-based nutrition advice and detailed meal plans that are practical and sustainable."
-                },
-                {
-                    "role": "user",
-                    "content": create_meal_plan_prompt(data)
-                }
-            ]
+        messages = meal_plan_messages(data)
+
+        async def generate():
+            meal_plan, cached = await complete_with_cache(messages)
+            # Save the meal plan to the user's record
+            await run_db(db, store_meal_plan, current_user.id, current_user.username, meal_plan, "generate")
+            return meal_plan, cached
+
+        # Duplicate submissions (double-clicks, several tabs) share one
+        # completion and one write
+        meal_plan, cached = await get_single_flight().do(
+            ("generate-meal-plan", current_user.id, cache_key(PLAN, messages)),
+            generate,
+            name="generate-meal-plan"
         )
 
-        meal_plan = completion.choices[0].message.content
-        
-        # Save the meal plan to the user's record
-        current_user.current_meal_plan = meal_plan
-        db.commit()
-
         result = {
             "mealPlan": meal_plan,
+            "cached": cached,
             "status": "success"
         }
-        print("Generated response:", result)
+        logger.info("Meal plan generated", extra={"data": {"chars": len(meal_plan), "cached": cached}})
         return result
 
+    except QuotaExceeded:
+        raise
     except Exception as e:
-        print(f"Detailed error in generate_meal_plan: {str(e)}")
+        logger.exception("Error generating meal plan")
         raise HTTPException(
             status_code=500, 
             detail=f"Failed to generate meal plan: {str(e)}"
         )
 
 @app.post("/follow-up")
-async def follow_up(request: FollowUpRequest):
+async def follow_up(
+    request: FollowUpRequest,
+    http_request: Request,
+    background_tasks: BackgroundTasks,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    conversation_id, context = await start_follow_up(request, http_request, current_user, db)
     try:
-        client = get_openai_client()
-        
-        # Ensure system message is first
-        messages = [
-            {
-                "role": "system",
-                "content": "You are a professional dietitian providing follow-up support. Reference previous discussions and meal plans when appropriate."
-            }
-        ]
-        
-        # Add conversation history
-        messages.extend([
-            {"role": msg.role, "content": msg.content}
-            for msg in request.conversation
-        ])
-        
-        completion = client.chat.completions.create(
-            model="gpt-4o-mini",  # Changed to correct model name
-            messages=messages,
-        )
+        # Near-duplicate questions in an identical context reuse an answer
+        semantic_cache = get_semantic_cache()
+        lookup = semantic_cache.for_messages(current_user.id, current_user.goal, context.messages) if semantic_cache else None
+        content = lookup.get() if lookup is not None else None
+        cached = content is not None
+        if not cached:
+            completion = await get_gateway().complete(messages=context.messages, task=FOLLOW_UP)
+            content = completion.content
+            if lookup is not None:
+                lookup.set(None, content, latency=completion.latency)
+        await run_db(db, record_reply, conversation_id, content)
+
+        if context.summarize_through is not None:
+            background_tasks.add_task(
+                summarize_conversation, conversation_id, context.summarize_through
+            )
         
         return {
-            "response": completion.choices[0].message.content,
+            "conversation_id": conversation_id,
+            "response": content,
+            "context_tokens": context.tokens,
+            "cached": cached,
             "status": "success"
         }
     
+    except QuotaExceeded:
+        raise
     except Exception as e:
-        print(f"Error in follow-up: {str(e)}")
+        logger.exception("Error in follow-up")
         raise HTTPException(
             status_code=500,
             detail="Failed to process follow-up request"
         )
 
+# Streaming variants: tokens are forwarded as server-sent events
+@app.post("/generate-meal-plan/stream")
+async def generate_meal_plan_stream(
+    data: NutritionRequest,
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    async def save_meal_plan(meal_plan: str):
+        # The request's session is gone by the time the stream ends
+        async with session_scope() as db:
+            await run_db(db, store_meal_plan, current_user.id, current_user.username, meal_plan, "generate")
+
+    return stream_completion(
+        meal_plan_messages(data),
+        "generate-meal-plan",
+        on_complete=save_meal_plan,
+        cache=get_response_cache()
+    )
+
+@app.post("/follow-up/stream")
+async def follow_up_stream(
+    request: FollowUpRequest,
+    http_request: Request,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    conversation_id, context = await start_follow_up(request, http_request, current_user, db)
+
+    async def save_reply(content: str):
+        async with session_scope() as stream_db:
+            await run_db(stream_db, record_reply, conversation_id, content)
+
+    semantic_cache = get_semantic_cache()
+    response = stream_completion(
+        context.messages, "follow-up", on_complete=save_reply,
+        cache=semantic_cache.for_messages(current_user.id, current_user.goal, context.messages) if semantic_cache else None,
+        task=FOLLOW_UP
+    )
+    response.headers["X-Conversation-Id"] = str(conversation_id)
+    if context.summarize_through is not None:
+        response.background = BackgroundTask(
+            summarize_conversation, conversation_id, context.summarize_through
+        )
+    return response
+
+@app.post("/nutrition-targets")
+async def get_nutrition_targets(request: NutritionTargetsRequest):
+    return nutrition_targets(
+        request.age, request.height, request.weight, request.goal,
+        sex=request.sex, activity=request.activity
+    )
+
+@app.get("/foods/search")
+async def search_foods(q: str = Query(..., min_length=1), limit: int = Query(10, ge=1, le=50)):
+    return {"results": get_food_database().search(q, limit)}
+
+@app.get("/foods/range")
+async def foods_in_range(
+    nutrient: str,
+    min: Optional[float] = None,
+    max: Optional[float] = None,
+    limit: int = Query(50, ge=1, le=500)
+):
+    if nutrient not in NUTRIENTS:
+        raise HTTPException(status_code=400, detail=f"Unknown nutrient, expected one of: {', '.join(NUTRIENTS)}")
+    return {"results": get_food_database().range_query(nutrient, min, max, limit)}
+
 # Health check endpoint
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
 
+# Readiness: the process is up and the database answers
+@app.get("/health/ready")
+async def readiness_check(db: Session = Depends(get_db)):
+    try:
+        await run_db(db, lambda s: s.execute(text("SELECT 1")))
+    except Exception as e:
+        logger.warning("Readiness check failed: %s", e)
+        raise HTTPException(status_code=503, detail="Database unavailable")
+    return {"status": "ready"}
+
 
 # OPTIONS handler
 @app.options("/register")
@@ -250,16 +553,9 @@ async def register_options():
 # New user registration endpoint
 @app.post("/register")
 async def register_user(data: UserCreate, db: Session = Depends(get_db)):
-    # Check if username exists
-    if db.query(models.User).filter(models.User.username == data.username).first():
-        raise HTTPException(status_code=400, detail="Username already registered")
-    
-    # Check if email exists
-    if db.query(models.User).filter(models.User.email == data.email).first():
-        raise HTTPException(status_code=400, detail="Email already registered")
-    
-    # Create new user
-    hashed_password = models.User.get_password_hash(data.password)
+    # A single INSERT; the unique indexes on username and email reject
+    # duplicates, including concurrent ones
+    hashed_password = await get_password_hasher().hash(data.password)
     db_user = models.User(
         username=data.username,
         email=data.email,
@@ -271,51 +567,76 @@ async def register_user(data: UserCreate, db: Session = Depends(get_db)):
         height=data.height,
         weight=data.weight,
         goal=data.goal,
-        current_meal_plan=""
+        current_meal_plan=models.NO_MEAL_PLAN
     )
-    
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+
+    try:
+        await run_db(db, create_user, db_user)
+    except DuplicateUser as e:
+        raise HTTPException(status_code=400, detail=f"{e.field.capitalize()} already registered")
     return {"message": "User registered successfully"}
 
 # Token generation endpoint
 @app.post("/token")
 async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     try:
-        user = db.query(models.User).filter(models.User.username == form_data.username).first()
+        user = await run_db(db, lambda s: s.query(models.User).filter(models.User.username == form_data.username).first())
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Incorrect username or password"
             )
         
-        if not user.verify_password(form_data.password):
+        if not await get_password_hasher().verify(form_data.password, user.hashed_password):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Incorrect username or password"
             )
         
-        access_token = create_access_token(data={"sub": user.username})
-        return {"access_token": access_token, "token_type": "bearer"}
+        return await run_db(db, issue_tokens, user.id, user.username)
     
-    except Exception as e:
-        print(f"Login error: {str(e)}")  # Add debug print
+    except HTTPException:
+        raise
+    except Exception:
+        logger.exception("Login error")
         raise
 
+# Exchanges a refresh token for a new token pair without a password check
+@app.post("/token/refresh")
+async def refresh_token(request: RefreshRequest, db: Session = Depends(get_db)):
+    try:
+        return await run_db(db, rotate_refresh_token, request.refresh_token)
+    except AuthError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid refresh token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+@app.post("/logout")
+async def logout(
+    request: LogoutRequest,
+    token: str = Depends(oauth2_scheme),
+    current_user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    await run_db(db, revoke_access_token, verify_access_token(token))
+    if request.refresh_token:
+        await run_db(db, revoke_refresh_token, request.refresh_token)
+    return {"status": "success"}
+
 # Update meal plan endpoint
 @app.post("/update-meal-plan")
 async def update_meal_plan(
     meal_plan: str,
-    current_user: models.User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    current_user.current_meal_plan = meal_plan
-    db.commit()
+    await run_db(db, store_meal_plan, current_user.id, current_user.username, meal_plan)
     return {"message": "Meal plan updated successfully"}
 
 @app.get("/user/me")
-async def get_current_user_data(current_user: models.User = Depends(get_current_user)):
+async def get_current_user_data(current_user: CurrentUser = Depends(get_current_user)):
     return {
         "username": current_user.username,
         "email": current_user.email,
@@ -327,9 +648,28 @@ async def get_current_user_data(current_user: models.User = Depends(get_current_
         "goal": current_user.goal
     }
 
+async def require_admin(current_user: CurrentUser = Depends(get_current_user)):
+    if current_user.username not in ADMIN_USERNAMES:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return current_user
+
+# Bulk user import from a CSV or JSONL upload. Rows that clash with existing
+# users are skipped and counted; invalid rows are reported by line.
+@app.post("/admin/users/import")
+async def import_users_file(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, pattern="^(csv|jsonl)$"),
+    admin: CurrentUser = Depends(require_admin)
+):
+    stream = io.TextIOWrapper(file.file, encoding="utf-8", newline="")
+    rows = read_rows(stream, format or detect_format(file.filename))
+    report = await import_users(rows, get_password_hasher())
+    logger.info("Users imported", extra={"data": report.to_dict()})
+    return report.to_dict()
+
 @app.get("/debug/user/{username}")
 async def debug_user(username: str, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.username == username).first()
+    user = await run_db(db, lambda s: s.query(models.User).filter(models.User.username == username).first())
     if user:
         return {
             "exists": True,
@@ -338,59 +678,222 @@ async def debug_user(username: str, db: Session = Depends(get_db)):
         }
     return {"exists": False}
 
+@app.get("/debug/metrics")
+async def debug_metrics():
+    return metrics.snapshot()
+
+# Prometheus scrape endpoint
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+@app.get("/user/usage")
+async def get_usage(
+    days: int = Query(1, ge=1, le=90),
+    current_user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    return {"days": days, "endpoints": await run_db(db, usage_summary, current_user.id, days)}
+
+# Meal plan reads honour If-None-Match: an unchanged plan costs one small
+# query and an empty 304
 @app.get("/user/meal-plan")
-async def get_user_meal_plan(current_user: models.User = Depends(get_current_user)):
-    return {
-        "meal_plan": current_user.current_meal_plan
-    }
+async def get_user_meal_plan(
+    request: Request,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if request.headers.get("if-none-match"):
+        etag = await run_db(db, load_meal_plan_etag, current_user.id)
+        if etag_matches(request, etag):
+            metrics.inc("http_not_modified_total", path="/user/meal-plan")
+            return not_modified(etag)
+    meal_plan, etag = await run_db(db, load_meal_plan_with_etag, current_user.id)
+    return json_with_etag({"meal_plan": meal_plan}, etag)
+
+@app.get("/user/meal-plan/structured")
+async def get_structured_meal_plan(
+    request: Request,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    # The structured rows are always written together with the text, so
+    # they share its hash
+    etag = await run_db(db, load_meal_plan_etag, current_user.id)
+    structured_etag = f"{etag}-structured" if etag else None
+    if etag_matches(request, structured_etag):
+        metrics.inc("http_not_modified_total", path="/user/meal-plan/structured")
+        return not_modified(structured_etag)
+    plan = await run_db(db, load_structured_plan, current_user.id)
+    if plan is None:
+        raise HTTPException(status_code=404, detail="No structured meal plan")
+    return json_with_etag(plan, structured_etag)
+
+# Plan history: every stored plan is kept as a compressed version
+@app.get("/user/meal-plan/history")
+async def get_meal_plan_history(
+    limit: int = Query(20, ge=1, le=100),
+    before: Optional[int] = Query(None, gt=0),
+    current_user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    return await run_db(db, list_versions, current_user.id, limit, before)
+
+@app.get("/user/meal-plan/history/{version}")
+async def get_meal_plan_version(
+    version: int,
+    request: Request,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    # Versions never change, so a cached copy is always valid
+    plan = await run_db(db, load_version, current_user.id, version)
+    if etag_matches(request, plan["etag"]):
+        return not_modified(plan["etag"])
+    return json_with_etag(plan, plan["etag"])
+
+# Restores an earlier version without calling the model
+@app.post("/user/meal-plan/rollback")
+async def rollback_user_meal_plan(
+    request: RollbackRequest,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    meal_plan, version = await run_db(
+        db, rollback_meal_plan, current_user.id, current_user.username, request.version
+    )
+    metrics.inc("plan_rollbacks_total")
+    return {"mealPlan": meal_plan, "version": version, "restored_from": request.version, "status": "success"}
 
 @app.post("/tweak-meal-plan")
 async def tweak_meal_plan(
     request: TweakRequest,
-    current_user: models.User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
+    # Targeted tweaks send only the chosen day or meal to the model and
+    # rewrite only that section
+    section = None
+    if request.day:
+        plan = await run_db(db, load_structured_plan, current_user.id)
+        if plan is None:
+            raise SectionNotFound(request.day)
+        day, meal = find_section(plan, request.day, request.meal)
+        section = render_meal(meal) if meal is not None else render_day(day)
+        baseline_tokens = prompt_tokens(tweak_messages(request, render_meal_plan(plan)))
+        messages = section_tweak_messages(request, section)
+    else:
+        current_meal_plan = await run_db(db, load_meal_plan, current_user.id)
+        messages = tweak_messages(request, current_meal_plan)
+        baseline_tokens = prompt_tokens(messages)
+    tokens_sent = prompt_tokens(messages)
+    metrics.observe("tweak_prompt_tokens", tokens_sent, buckets=(250, 500, 1000, 2000, 4000, 8000))
+    metrics.observe("tweak_prompt_baseline_tokens", baseline_tokens, buckets=(250, 500, 1000, 2000, 4000, 8000))
+
     try:
-        client = get_openai_client()
-        
-        prompt = f"""
-        Current user's meal plan needs adjustments. Details:
-        Username: {request.username}
-        Requested Changes: {request.currentDiet}
-        
-        Current Meal Plan:
-        {current_user.current_meal_plan}
-        
-        Please provide an updated meal plan incorporating the requested changes while maintaining nutritional balance.
-        """
-        
-        completion = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a professional dietitian. Modify the existing meal plan based on user feedback while ensuring it remains nutritionally sound."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ]
+        async def tweak():
+            completion = await get_gateway().complete(messages=messages)
+            # Update the user's meal plan in the database
+            if section is not None:
+                return await run_db(
+                    db, store_section_tweak, current_user.id, current_user.username,
+                    request.day, request.meal, completion.content, request.currentDiet
+                )
+            await run_db(db, store_meal_plan, current_user.id, current_user.username, completion.content, "tweak")
+            return completion.content
+
+        new_meal_plan = await get_single_flight().do(
+            ("tweak-meal-plan", current_user.id, cache_key(PLAN, messages)),
+            tweak,
+            name="tweak-meal-plan"
         )
 
-        new_meal_plan = completion.choices[0].message.content
-        
-        # Update the user's meal plan in the database
-        current_user.current_meal_plan = new_meal_plan
-        db.commit()
-
         return {
             "mealPlan": new_meal_plan,
+            "tokens_sent": tokens_sent,
+            "baseline_tokens": baseline_tokens,
             "status": "success"
         }
 
+    except (QuotaExceeded, InvalidSectionReply):
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Failed to update meal plan: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+# Opt-in background job mode: submissions return a job id right away and the
+# client polls /jobs/{job_id} or subscribes to /jobs/{job_id}/events
+@app.post("/jobs/generate-meal-plan", status_code=202)
+async def submit_meal_plan_job(
+    data: NutritionRequest,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    job_id, job_state, deduplicated = await run_db(
+        db, submit_job, current_user.id, current_user.username,
+        "generate", meal_plan_messages(data)
+    )
+    notify_workers()
+    return {"job_id": job_id, "status": job_state, "deduplicated": deduplicated}
+
+@app.post("/jobs/tweak-meal-plan", status_code=202)
+async def submit_tweak_job(
+    request: TweakRequest,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if request.day:
+        raise HTTPException(status_code=400, detail="Targeted tweaks are not supported in job mode")
+    current_meal_plan = await run_db(db, load_meal_plan, current_user.id)
+    job_id, job_state, deduplicated = await run_db(
+        db, submit_job, current_user.id, current_user.username,
+        "tweak", tweak_messages(request, current_meal_plan), False
+    )
+    notify_workers()
+    return {"job_id": job_id, "status": job_state, "deduplicated": deduplicated}
+
+@app.get("/jobs/{job_id}")
+async def get_job(
+    job_id: str,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    job = await run_db(db, job_status, job_id, current_user.id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(
+    job_id: str,
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    async def events():
+        last_state = None
+        while True:
+            async with session_scope() as db:
+                job = await run_db(db, job_status, job_id, current_user.id)
+            if job is None:
+                yield sse_event({"detail": "Job not found"}, event="error")
+                return
+            if job["status"] != last_state:
+                last_state = job["status"]
+                yield sse_event(job, event="status")
+            if last_state in TERMINAL_STATES:
+                return
+            await asyncio.sleep(JOB_POLL_INTERVAL_SECONDS)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Production mode serves the frontend from this app. Mounted last so every
+# API route takes precedence over the catch-all static path.
+if SERVE_FRONTEND:
+    from backend.static import frontend_app
+
+    app.mount("/", frontend_app(), name="frontend")
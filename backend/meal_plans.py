@@ -0,0 +1,401 @@
+import hashlib
+import re
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import bindparam, delete, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from backend import models
+from backend.foods import get_food_database
+
+# Parses model-written markdown meal plans into days -> meals -> items and
+# renders them back. Every source line is kept, so render(parse(text)) gives
+# back the original text; macros are pulled out of item lines when present.
+
+DAY_PATTERN = re.compile(
+    r"\b(monday|tuesday|wednesday|thursday|friday|saturday|sunday|day\s+\d+)\b", re.I
+)
+MEAL_PATTERN = re.compile(
+    r"\b(breakfast|brunch|lunch|dinner|supper|snacks?|pre-workout|post-workout)\b", re.I
+)
+HEADING_PATTERN = re.compile(r"^\s*(#{1,6}\s+.+|\*\*[^*]+\*\*:?)\s*$")
+MACRO_PATTERNS = {
+    "calories": re.compile(r"(\d+(?:\.\d+)?)\s*(?:kcal|calories|cals?)\b", re.I),
+    "protein": re.compile(r"(\d+(?:\.\d+)?)\s*g\s*(?:of\s+)?protein", re.I),
+    "carbs": re.compile(r"(\d+(?:\.\d+)?)\s*g\s*(?:of\s+)?carb(?:ohydrate)?s?", re.I),
+    "fat": re.compile(r"(\d+(?:\.\d+)?)\s*g\s*(?:of\s+)?fats?", re.I),
+}
+
+
+class SectionNotFound(Exception):
+    pass
+
+
+class InvalidSectionReply(Exception):
+    # The model's reply to a section tweak does not contain that section
+    pass
+
+
+def meal_plan_etag(text):
+    if not text:
+        return None
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def parse_item(line):
+    item = {"text": line}
+    for macro, pattern in MACRO_PATTERNS.items():
+        match = pattern.search(line)
+        item[macro] = float(match.group(1)) if match else None
+    if item["calories"] is None:
+        # No macros in the text: compute them from the weight and food data
+        computed = get_food_database().item_macros(line)
+        if computed is not None:
+            for macro in MACRO_PATTERNS:
+                item[macro] = computed[macro]
+    return item
+
+
+def parse_meal_plan(text):
+    plan = {"preamble": [], "days": []}
+    day = meal = None
+    for line in (text or "").split("\n"):
+        heading = HEADING_PATTERN.match(line)
+        day_match = DAY_PATTERN.search(line) if heading else None
+        meal_match = MEAL_PATTERN.search(line) if heading else None
+        if day_match:
+            day = {"name": day_match.group(1).title(), "heading": line, "notes": [], "meals": []}
+            plan["days"].append(day)
+            meal = None
+        elif meal_match and day is not None:
+            meal = {"name": meal_match.group(1).title(), "heading": line, "items": []}
+            day["meals"].append(meal)
+        elif meal is not None:
+            meal["items"].append(parse_item(line))
+        elif day is not None:
+            day["notes"].append(line)
+        else:
+            plan["preamble"].append(line)
+    return plan
+
+
+def render_meal(meal):
+    return "\n".join([meal["heading"]] + [item["text"] for item in meal["items"]])
+
+
+def render_day(day):
+    return "\n".join(
+        [day["heading"]] + day["notes"] + [render_meal(meal) for meal in day["meals"]]
+    )
+
+
+def render_meal_plan(plan):
+    return "\n".join(plan["preamble"] + [render_day(day) for day in plan["days"]])
+
+
+def _heading_level(line):
+    # Markdown headings by depth; bold-line headings sit below all of them
+    stripped = line.strip()
+    return len(stripped) - len(stripped.lstrip("#")) or 7
+
+
+def _name(pattern, line):
+    match = pattern.search(line) if HEADING_PATTERN.match(line) else None
+    return match.group(1).title() if match else None
+
+
+def _block(lines, start, stop):
+    # Lines after lines[start] up to the first one stop() accepts
+    block = []
+    for line in lines[start + 1:]:
+        if stop(line):
+            break
+        block.append(line)
+    return block
+
+
+def _find_heading(lines, pattern, name):
+    return next((i for i, line in enumerate(lines) if _name(pattern, line) == name), None)
+
+
+def parse_day_section(text, heading):
+    # Pulls the block under the requested day's heading out of a tweak reply;
+    # anything before it and any following day or top-level section is
+    # dropped. The original heading is kept.
+    name = _name(DAY_PATTERN, heading)
+    lines = (text or "").split("\n")
+    start = _find_heading(lines, DAY_PATTERN, name)
+    if start is None:
+        raise InvalidSectionReply(f"reply has no {name} section")
+    level = _heading_level(lines[start])
+    block = _block(lines, start, lambda line: HEADING_PATTERN.match(line) and (
+        _name(DAY_PATTERN, line) is not None
+        or (_name(MEAL_PATTERN, line) is None and _heading_level(line) <= level)
+    ))
+    if not any(line.strip() for line in block):
+        raise InvalidSectionReply(f"reply has an empty {name} section")
+    day = parse_meal_plan("\n".join([heading] + block))["days"][0]
+    day["name"] = name
+    return day
+
+
+def parse_meal_section(text, heading, day_name=None):
+    # Pulls the items under the requested meal's heading out of a tweak
+    # reply. When the reply repeats day headings, only the requested day is
+    # searched; other meals and sections are dropped.
+    name = _name(MEAL_PATTERN, heading)
+    lines = (text or "").split("\n")
+    if day_name is not None and any(_name(DAY_PATTERN, line) for line in lines):
+        day_start = _find_heading(lines, DAY_PATTERN, day_name.title())
+        if day_start is None:
+            raise InvalidSectionReply(f"reply has no {day_name} section")
+        lines = _block(lines, day_start, lambda line: _name(DAY_PATTERN, line) is not None)
+    start = _find_heading(lines, MEAL_PATTERN, name)
+    if start is None:
+        raise InvalidSectionReply(f"reply has no {name} section")
+    block = _block(lines, start, lambda line: HEADING_PATTERN.match(line))
+    if not any(line.strip() for line in block):
+        raise InvalidSectionReply(f"reply has an empty {name} section")
+    return {"name": name, "heading": heading, "items": [parse_item(line) for line in block]}
+
+
+# Persistence. Rows are written a level at a time: one multi-row INSERT
+# per table whatever the number of days, meals or users. The ids for the
+# next level come back through RETURNING, matched up by (parent, position)
+# since the order of returned rows is not guaranteed.
+
+def _insert_returning_ids(db: Session, model, parent, rows):
+    if not rows:
+        return []
+    table = model.__table__
+    returned = db.execute(
+        insert(table).returning(table.c.id, table.c[parent], table.c.position), rows
+    ).all()
+    ids = {(parent_id, position): row_id for row_id, parent_id, position in returned}
+    return [ids[(row[parent], row["position"])] for row in rows]
+
+
+def _insert_meals(db: Session, meals):
+    # meals: list of (day_id, position, meal)
+    ids = _insert_returning_ids(db, models.MealPlanMeal, "day_id", [
+        {"day_id": day_id, "position": position, "name": meal["name"], "heading": meal["heading"]}
+        for day_id, position, meal in meals
+    ])
+    items = [
+        {
+            "meal_id": meal_id,
+            "position": i,
+            "text": item["text"],
+            "calories": item["calories"],
+            "protein": item["protein"],
+            "carbs": item["carbs"],
+            "fat": item["fat"],
+        }
+        for meal_id, (_, _, meal) in zip(ids, meals)
+        for i, item in enumerate(meal["items"])
+    ]
+    if items:
+        db.execute(insert(models.MealPlanItem.__table__), items)
+
+
+def _insert_days(db: Session, days):
+    # days: list of (plan_id, position, day)
+    ids = _insert_returning_ids(db, models.MealPlanDay, "plan_id", [
+        {
+            "plan_id": plan_id,
+            "position": position,
+            "name": day["name"],
+            "heading": day["heading"],
+            "notes": "\n".join(day["notes"]),
+        }
+        for plan_id, position, day in days
+    ])
+    _insert_meals(db, [
+        (day_id, i, meal)
+        for day_id, (_, _, day) in zip(ids, days)
+        for i, meal in enumerate(day["meals"])
+    ])
+
+
+def _delete_meals(db: Session, meal_ids):
+    # meal_ids may be a list or a subquery
+    items, meals = models.MealPlanItem.__table__, models.MealPlanMeal.__table__
+    db.execute(delete(items).where(items.c.meal_id.in_(meal_ids)))
+    db.execute(delete(meals).where(meals.c.id.in_(meal_ids)))
+
+
+def _delete_days(db: Session, day_ids):
+    meals, days = models.MealPlanMeal.__table__, models.MealPlanDay.__table__
+    _delete_meals(db, select(meals.c.id).where(meals.c.day_id.in_(day_ids)))
+    db.execute(delete(days).where(days.c.id.in_(day_ids)))
+
+
+def save_structured_plans(db: Session, texts):
+    # Replaces the structured plans of many users at once; texts maps
+    # user_id to the full plan text. Does not commit.
+    if not texts:
+        return
+    plans = {user_id: parse_meal_plan(text) for user_id, text in texts.items()}
+    preambles = {user_id: "\n".join(plan["preamble"]) for user_id, plan in plans.items()}
+    plans_table, days = models.MealPlan.__table__, models.MealPlanDay.__table__
+    now = datetime.utcnow()
+    plan_ids = dict(db.execute(
+        select(plans_table.c.user_id, plans_table.c.id).where(plans_table.c.user_id.in_(list(plans)))
+    ).all())
+    if plan_ids:
+        _delete_days(db, select(days.c.id).where(days.c.plan_id.in_(list(plan_ids.values()))))
+        db.execute(
+            update(plans_table)
+            .where(plans_table.c.id == bindparam("plan_id"))
+            .values(
+                version=func.coalesce(plans_table.c.version, 0) + 1,
+                preamble=bindparam("plan_preamble"),
+                updated_at=now,
+            ),
+            [{"plan_id": plan_id, "plan_preamble": preambles[user_id]} for user_id, plan_id in plan_ids.items()],
+        )
+    new_users = [user_id for user_id in plans if user_id not in plan_ids]
+    if new_users:
+        plan_ids.update(db.execute(
+            insert(plans_table).returning(plans_table.c.user_id, plans_table.c.id),
+            [
+                {"user_id": user_id, "version": 1, "preamble": preambles[user_id], "updated_at": now}
+                for user_id in new_users
+            ],
+        ).all())
+    _insert_days(db, [
+        (plan_ids[user_id], i, day)
+        for user_id, plan in plans.items()
+        for i, day in enumerate(plan["days"])
+    ])
+
+
+def save_structured_plan(db: Session, user_id: int, text: str):
+    # Replaces the user's structured plan with a parse of the full text.
+    # Does not commit.
+    save_structured_plans(db, {user_id: text})
+
+
+def load_structured_plan(db: Session, user_id: int) -> Optional[dict]:
+    row = db.query(models.MealPlan).filter(models.MealPlan.user_id == user_id).first()
+    if row is None:
+        return None
+    days = (
+        db.query(models.MealPlanDay)
+        .filter(models.MealPlanDay.plan_id == row.id)
+        .order_by(models.MealPlanDay.position)
+        .all()
+    )
+    meals = (
+        db.query(models.MealPlanMeal)
+        .filter(models.MealPlanMeal.day_id.in_([d.id for d in days]))
+        .order_by(models.MealPlanMeal.position)
+        .all()
+    ) if days else []
+    items = (
+        db.query(models.MealPlanItem)
+        .filter(models.MealPlanItem.meal_id.in_([m.id for m in meals]))
+        .order_by(models.MealPlanItem.position)
+        .all()
+    ) if meals else []
+
+    items_by_meal = {}
+    for item in items:
+        items_by_meal.setdefault(item.meal_id, []).append({
+            "text": item.text,
+            "calories": item.calories,
+            "protein": item.protein,
+            "carbs": item.carbs,
+            "fat": item.fat,
+        })
+    meals_by_day = {}
+    for meal in meals:
+        meals_by_day.setdefault(meal.day_id, []).append({
+            "id": meal.id,
+            "name": meal.name,
+            "heading": meal.heading,
+            "items": items_by_meal.get(meal.id, []),
+        })
+    return {
+        "id": row.id,
+        "version": row.version,
+        "preamble": row.preamble.split("\n") if row.preamble else [],
+        "days": [
+            {
+                "id": day.id,
+                "name": day.name,
+                "heading": day.heading,
+                "notes": day.notes.split("\n") if day.notes else [],
+                "meals": meals_by_day.get(day.id, []),
+            }
+            for day in days
+        ],
+    }
+
+
+def find_section(plan: dict, day_name: str, meal_name: Optional[str] = None):
+    # Returns (day, meal); meal is None when the whole day is targeted
+    day = next(
+        (d for d in plan["days"] if d["name"].lower() == day_name.strip().lower()), None
+    )
+    if day is None:
+        raise SectionNotFound(day_name)
+    if not meal_name:
+        return day, None
+    meal = next(
+        (m for m in day["meals"] if m["name"].lower() == meal_name.strip().lower()), None
+    )
+    if meal is None:
+        raise SectionNotFound(f"{day_name} / {meal_name}")
+    return day, meal
+
+
+def apply_section_tweak(
+    db: Session,
+    user_id: int,
+    day_name: str,
+    meal_name: Optional[str],
+    new_text: str,
+    request_text: str,
+) -> tuple:
+    # Rewrites only the targeted day or meal rows, records the delta and
+    # returns the full plan text before and after. Does not commit.
+    plan = load_structured_plan(db, user_id)
+    if plan is None:
+        raise SectionNotFound(day_name)
+    day, meal = find_section(plan, day_name, meal_name)
+    previous = render_meal_plan(plan)
+
+    if meal is not None:
+        before = render_meal(meal)
+        replacement = parse_meal_section(new_text, meal["heading"], day["name"])
+        position = day["meals"].index(meal)
+        _delete_meals(db, [meal["id"]])
+        _insert_meals(db, [(day["id"], position, replacement)])
+        day["meals"][position] = replacement
+        after = render_meal(replacement)
+        section = f"{day['name']} / {meal['name']}"
+    else:
+        before = render_day(day)
+        replacement = parse_day_section(new_text, day["heading"])
+        position = plan["days"].index(day)
+        _delete_days(db, [day["id"]])
+        _insert_days(db, [(plan["id"], position, replacement)])
+        plan["days"][position] = replacement
+        after = render_day(replacement)
+        section = day["name"]
+
+    row = db.get(models.MealPlan, plan["id"])
+    row.version = (row.version or 0) + 1
+    row.updated_at = datetime.utcnow()
+    db.add(models.MealPlanRevision(
+        plan_id=row.id,
+        version=row.version,
+        section=section,
+        request=request_text,
+        before=before,
+        after=after,
+        created_at=row.updated_at,
+    ))
+    return previous, render_meal_plan(plan)
@@ -0,0 +1,216 @@
+import argparse
+import logging
+import time
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, bindparam, inspect, select, text, update
+
+from backend import models
+from backend.meal_plans import meal_plan_etag
+from backend.plan_history import compress_plan
+from backend.database import get_engine
+
+# Versioned schema migrations. They run once per deploy, before the web
+# workers start (driver.py, the Procfile release phase or
+# `python -m backend.migrations upgrade`), never when the app is imported.
+# Applied versions are recorded in schema_migrations.
+#
+# Migration 1 creates the full current schema on an empty database, so every
+# later migration must be safe on a schema that already has its change:
+# check with the inspector before adding or dropping anything.
+
+logger = logging.getLogger(__name__)
+
+migration_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations",
+    migration_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String),
+    Column("applied_at", DateTime),
+)
+
+# Arbitrary key for the Postgres advisory lock that serializes migrators
+ADVISORY_LOCK_KEY = 727001
+
+
+def has_index(conn, table, name):
+    return any(index["name"] == name for index in inspect(conn).get_indexes(table))
+
+
+def create_index_if_missing(conn, table, name):
+    # Creates the model's index of that name
+    if not has_index(conn, table, name):
+        index = next(i for i in models.Base.metadata.tables[table].indexes if i.name == name)
+        index.create(conn)
+
+
+def has_column(conn, table, name):
+    return any(column["name"] == name for column in inspect(conn).get_columns(table))
+
+
+def drop_index_if_exists(conn, table, name):
+    if has_index(conn, table, name):
+        conn.execute(text(f"DROP INDEX {name}"))
+
+
+def baseline(conn):
+    # Everything the app used to create at import time
+    models.Base.metadata.create_all(conn, checkfirst=True)
+
+
+def users_access_indexes(conn):
+    # Login and registration already use the unique username/email indexes.
+    # Batch regeneration scans users without a plan in id order; those hold
+    # NO_MEAL_PLAN (""), so rows left NULL by older code are normalized first
+    # to fall under the partial index.
+    users = models.User.__table__
+    conn.execute(
+        update(users).where(users.c.current_meal_plan.is_(None)).values(current_meal_plan=models.NO_MEAL_PLAN)
+    )
+    create_index_if_missing(conn, "users", "ix_users_without_meal_plan")
+    # Duplicate of the primary key index
+    drop_index_if_exists(conn, "users", "ix_users_id")
+
+
+def auth_tokens(conn):
+    models.RefreshToken.__table__.create(conn, checkfirst=True)
+    models.RevokedToken.__table__.create(conn, checkfirst=True)
+
+
+def meal_plan_etags(conn, chunk_size=500):
+    if not has_column(conn, "users", "meal_plan_etag"):
+        conn.execute(text("ALTER TABLE users ADD COLUMN meal_plan_etag VARCHAR(32)"))
+    # Backfill existing plans, one keyset chunk at a time
+    users = models.User.__table__
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            select(users.c.id, users.c.current_meal_plan)
+            .where(users.c.id > last_id, users.c.meal_plan_etag.is_(None), users.c.current_meal_plan != "")
+            .order_by(users.c.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            break
+        conn.execute(
+            update(users).where(users.c.id == bindparam("user_id")).values(meal_plan_etag=bindparam("etag")),
+            [{"user_id": user_id, "etag": meal_plan_etag(plan)} for user_id, plan in rows],
+        )
+        last_id = rows[-1][0]
+
+
+def meal_plan_history(conn, chunk_size=500):
+    if not has_column(conn, "users", "current_plan_version"):
+        conn.execute(text("ALTER TABLE users ADD COLUMN current_plan_version INTEGER"))
+    models.MealPlanVersion.__table__.create(conn, checkfirst=True)
+    # Existing plans become version 1
+    users = models.User.__table__
+    versions = models.MealPlanVersion.__table__
+    now = datetime.utcnow()
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            select(users.c.id, users.c.current_meal_plan, users.c.meal_plan_etag)
+            .where(users.c.id > last_id, users.c.current_plan_version.is_(None), users.c.current_meal_plan != "")
+            .order_by(users.c.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            break
+        conn.execute(versions.insert(), [
+            {
+                "user_id": user_id, "version": 1, "source": "import", "etag": etag,
+                "size": len(plan.encode("utf-8")), "content": compress_plan(plan), "created_at": now,
+            }
+            for user_id, plan, etag in rows
+        ])
+        conn.execute(
+            update(users).where(users.c.id == bindparam("user_id")).values(current_plan_version=1),
+            [{"user_id": user_id} for user_id, _, _ in rows],
+        )
+        last_id = rows[-1][0]
+
+
+MIGRATIONS = [
+    (1, "baseline schema", baseline),
+    (2, "users access indexes", users_access_indexes),
+    (3, "refresh and revoked tokens", auth_tokens),
+    (4, "meal plan etags", meal_plan_etags),
+    (5, "meal plan history", meal_plan_history),
+]
+
+
+def applied_versions(conn):
+    migration_metadata.create_all(conn, checkfirst=True)
+    return set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+
+def pending_migrations(engine=None):
+    engine = engine or get_engine()
+    with engine.connect() as conn:
+        if not inspect(conn).has_table("schema_migrations"):
+            return [(version, name) for version, name, _ in MIGRATIONS]
+        applied = set(conn.execute(select(schema_migrations.c.version)).scalars())
+    return [(version, name) for version, name, _ in MIGRATIONS if version not in applied]
+
+
+def migrate(engine=None):
+    # Returns the versions applied by this call
+    engine = engine or get_engine()
+    applied_now = []
+    with engine.connect() as conn:
+        postgres = conn.dialect.name == "postgresql"
+        if postgres:
+            # Several hosts may run the release step at once
+            conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": ADVISORY_LOCK_KEY})
+            conn.commit()
+        try:
+            with conn.begin():
+                applied = applied_versions(conn)
+            for version, name, upgrade in MIGRATIONS:
+                if version in applied:
+                    continue
+                start = time.perf_counter()
+                with conn.begin():
+                    upgrade(conn)
+                    conn.execute(schema_migrations.insert().values(
+                        version=version, name=name, applied_at=datetime.utcnow()
+                    ))
+                applied_now.append(version)
+                logger.info(
+                    "Applied migration %s (%s)", version, name,
+                    extra={"data": {"ms": round((time.perf_counter() - start) * 1000, 3)}},
+                )
+        finally:
+            if postgres:
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": ADVISORY_LOCK_KEY})
+                conn.commit()
+    return applied_now
+
+
+def drop_schema(engine=None):
+    engine = engine or get_engine()
+    models.Base.metadata.drop_all(bind=engine)
+    migration_metadata.drop_all(bind=engine)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Database schema migrations.")
+    parser.add_argument("command", choices=["upgrade", "status"], nargs="?", default="upgrade")
+    args = parser.parse_args()
+
+    if args.command == "status":
+        pending = pending_migrations()
+        for version, name in pending:
+            print(f"pending: {version} {name}")
+        if not pending:
+            print("Database schema is up to date")
+        return
+
+    applied = migrate()
+    print(f"Applied migrations: {applied}" if applied else "Database schema is up to date")
+
+
+if __name__ == "__main__":
+    main()
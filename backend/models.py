@@ -1,14 +1,38 @@
-from sqlalchemy import Column, Integer, String, Float, Text, Date
+from sqlalchemy import Column, Integer, String, Float, Text, Date, DateTime, Boolean, ForeignKey, Index, LargeBinary, UniqueConstraint, text
 from sqlalchemy.ext.declarative import declarative_base
+import logging
+
 from passlib.context import CryptContext
+from backend.config import BCRYPT_ROUNDS
 
 Base = declarative_base()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+logger = logging.getLogger(__name__)
+
+def verify_password_hash(plain_password, hashed_password):
+    try:
+        return pwd_context.verify(plain_password, hashed_password)
+    except Exception as e:
+        logger.warning("Password verification error: %s", e)
+        return False
+
+# users.current_meal_plan for a user who has no plan yet. Never NULL, so the
+# API always returns a string.
+NO_MEAL_PLAN = ""
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        # Batch regeneration of users without a plan (driver.py --only-missing)
+        Index(
+            "ix_users_without_meal_plan", "id",
+            postgresql_where=text("current_meal_plan = ''"),
+            sqlite_where=text("current_meal_plan = ''"),
+        ),
+    )
     
-    id = Column(Integer, primary_key=True, index=True)
+    # The primary key is already indexed; no separate ix_users_id
+    id = Column(Integer, primary_key=True)
     username = Column(String, unique=True, index=True)
     email = Column(String, unique=True, index=True)
     hashed_password = Column(String)
@@ -19,17 +43,177 @@ class User(Base):
     height = Column(Float)
     weight = Column(Float)
     goal = Column(String)
-    current_meal_plan = Column(Text)
+    current_meal_plan = Column(Text, default=NO_MEAL_PLAN)
+    # Content hash of current_meal_plan, used as its ETag
+    meal_plan_etag = Column(String(32), nullable=True)
+    # Newest row in meal_plan_versions for this user
+    current_plan_version = Column(Integer, nullable=True)
     
     @staticmethod
     def get_password_hash(password):
         return pwd_context.hash(password)
     
     def verify_password(self, plain_password):
-        try:
-            result = pwd_context.verify(plain_password, self.hashed_password)
-            print(f"Password verification result: {result}")
-            return result
-        except Exception as e:
-            print(f"Password verification error: {str(e)}")
-            return False
\ No newline at end of file
+        return verify_password_hash(plain_password, self.hashed_password)
+
+class CachedResponse(Base):
+    __tablename__ = "llm_response_cache"
+
+    key = Column(String(64), primary_key=True)
+    model = Column(String)
+    content = Column(Text)
+    created_at = Column(DateTime, index=True)
+
+class Conversation(Base):
+    __tablename__ = "conversations"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    created_at = Column(DateTime)
+    updated_at = Column(DateTime)
+    # Rolling summary of every message with id <= summarized_through
+    summary = Column(Text)
+    summarized_through = Column(Integer, default=0)
+
+class ConversationMessage(Base):
+    __tablename__ = "conversation_messages"
+    __table_args__ = (
+        Index("ix_conversation_messages_conversation_id_id", "conversation_id", "id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    conversation_id = Column(Integer, ForeignKey("conversations.id"))
+    role = Column(String)
+    content = Column(Text)
+    token_count = Column(Integer)
+    created_at = Column(DateTime)
+
+class MealPlanJob(Base):
+    __tablename__ = "meal_plan_jobs"
+    __table_args__ = (
+        Index("ix_meal_plan_jobs_status_created_at", "status", "created_at"),
+    )
+
+    id = Column(String(32), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    kind = Column(String)
+    # queued -> running -> succeeded | failed
+    status = Column(String)
+    dedupe_key = Column(String(64), index=True)
+    payload = Column(Text)
+    result = Column(Text)
+    cached = Column(Boolean, default=False)
+    error = Column(Text)
+    created_at = Column(DateTime)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+# Structured copy of a user's current meal plan: days -> meals -> items.
+# users.current_meal_plan stays the rendered markdown.
+class MealPlan(Base):
+    __tablename__ = "meal_plans"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), unique=True, index=True)
+    version = Column(Integer, default=1)
+    preamble = Column(Text)
+    updated_at = Column(DateTime)
+
+class MealPlanDay(Base):
+    __tablename__ = "meal_plan_days"
+
+    id = Column(Integer, primary_key=True)
+    plan_id = Column(Integer, ForeignKey("meal_plans.id"), index=True)
+    position = Column(Integer)
+    name = Column(String)
+    heading = Column(Text)
+    notes = Column(Text)
+
+class MealPlanMeal(Base):
+    __tablename__ = "meal_plan_meals"
+
+    id = Column(Integer, primary_key=True)
+    day_id = Column(Integer, ForeignKey("meal_plan_days.id"), index=True)
+    position = Column(Integer)
+    name = Column(String)
+    heading = Column(Text)
+
+class MealPlanItem(Base):
+    __tablename__ = "meal_plan_items"
+
+    id = Column(Integer, primary_key=True)
+    meal_id = Column(Integer, ForeignKey("meal_plan_meals.id"), index=True)
+    position = Column(Integer)
+    text = Column(Text)
+    calories = Column(Float)
+    protein = Column(Float)
+    carbs = Column(Float)
+    fat = Column(Float)
+
+# One row per targeted tweak: the section that changed, before and after
+class MealPlanRevision(Base):
+    __tablename__ = "meal_plan_revisions"
+
+    id = Column(Integer, primary_key=True)
+    plan_id = Column(Integer, ForeignKey("meal_plans.id"), index=True)
+    version = Column(Integer)
+    section = Column(String)
+    request = Column(Text)
+    before = Column(Text)
+    after = Column(Text)
+    created_at = Column(DateTime)
+
+# Append-only, compressed history of users.current_meal_plan (backend.plan_history)
+class MealPlanVersion(Base):
+    __tablename__ = "meal_plan_versions"
+    __table_args__ = (
+        UniqueConstraint("user_id", "version", name="uq_meal_plan_versions_user_id_version"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    version = Column(Integer, nullable=False)
+    source = Column(String(16))
+    etag = Column(String(32))
+    # Uncompressed size in bytes
+    size = Column(Integer)
+    content = Column(LargeBinary)
+    restored_from = Column(Integer, nullable=True)
+    created_at = Column(DateTime)
+
+# One row per LLM call (or cache hit), written in batches by backend.usage
+class LLMUsage(Base):
+    __tablename__ = "llm_usage"
+    __table_args__ = (
+        Index("ix_llm_usage_user_id_created_at", "user_id", "created_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    created_at = Column(DateTime, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    endpoint = Column(String)
+    model = Column(String)
+    prompt_tokens = Column(Integer)
+    completion_tokens = Column(Integer)
+    latency = Column(Float)
+    retries = Column(Integer)
+    cached = Column(Boolean)
+    status = Column(String)
+
+# Refresh tokens are single use: rotating one sets revoked_at
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+
+    jti = Column(String(32), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    issued_at = Column(DateTime)
+    expires_at = Column(DateTime)
+    revoked_at = Column(DateTime, nullable=True)
+
+# Revoked access tokens, kept until they would have expired anyway
+class RevokedToken(Base):
+    __tablename__ = "revoked_tokens"
+
+    jti = Column(String(32), primary_key=True)
+    expires_at = Column(DateTime, index=True)
+    revoked_at = Column(DateTime, index=True)
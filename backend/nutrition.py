@@ -0,0 +1,132 @@
+from typing import Optional
+
+import numpy as np
+
+# Daily calorie and macro targets computed locally instead of by the model.
+# Everything works on arrays so a whole user table is one vectorized pass;
+# the scalar helpers wrap the array path for single requests.
+#
+# BMR: Mifflin-St Jeor. The app does not ask for sex, so unknown sex uses the
+# midpoint of the male (+5) and female (-161) constants.
+# TDEE: BMR times an activity factor.
+# Targets: TDEE adjusted by goal, protein by body weight, fat as a share of
+# calories and carbs from whatever is left.
+
+LB_TO_KG = 0.45359237
+IN_TO_CM = 2.54
+KCAL_PER_G = {"protein": 4.0, "carbs": 4.0, "fat": 9.0}
+
+SEX_CONSTANTS = {"male": 5.0, "female": -161.0, None: -78.0}
+
+ACTIVITY_FACTORS = {
+    "sedentary": 1.2,
+    "light": 1.375,
+    "moderate": 1.55,
+    "active": 1.725,
+    "very_active": 1.9,
+}
+DEFAULT_ACTIVITY = "moderate"
+
+# Goal codes index the per-goal arrays below
+MAINTAIN, LOSE, GAIN = 0, 1, 2
+GOAL_NAMES = ("maintain", "lose", "gain")
+GOAL_CALORIE_FACTORS = np.array([1.0, 0.8, 1.1])
+GOAL_PROTEIN_G_PER_KG = np.array([1.6, 2.0, 1.8])
+GOAL_FAT_SHARE = np.array([0.30, 0.30, 0.25])
+MIN_CALORIES = 1200.0
+
+_lose_words = ("lose", "loss", "cut", "lean", "slim", "deficit")
+_gain_words = ("gain", "bulk", "muscle", "mass", "surplus")
+
+
+def goal_code(goal: Optional[str]) -> int:
+    # Goals are free text from the registration form
+    text = (goal or "").lower()
+    if any(word in text for word in _lose_words):
+        return LOSE
+    if any(word in text for word in _gain_words):
+        return GAIN
+    return MAINTAIN
+
+
+def compute_targets(age, height_in, weight_lb, goals, sex_constants=None, activity_factors=None):
+    # All inputs are array-likes of the same length; goals are goal codes.
+    # Returns a dict of float arrays.
+    age = np.asarray(age, dtype=np.float64)
+    weight_kg = np.asarray(weight_lb, dtype=np.float64) * LB_TO_KG
+    height_cm = np.asarray(height_in, dtype=np.float64) * IN_TO_CM
+    goals = np.asarray(goals, dtype=np.intp)
+    if sex_constants is None:
+        sex_constants = SEX_CONSTANTS[None]
+    if activity_factors is None:
+        activity_factors = ACTIVITY_FACTORS[DEFAULT_ACTIVITY]
+
+    bmr = 10.0 * weight_kg + 6.25 * height_cm - 5.0 * age + np.asarray(sex_constants, dtype=np.float64)
+    tdee = bmr * np.asarray(activity_factors, dtype=np.float64)
+    calories = np.maximum(tdee * GOAL_CALORIE_FACTORS[goals], MIN_CALORIES)
+
+    protein = weight_kg * GOAL_PROTEIN_G_PER_KG[goals]
+    fat = calories * GOAL_FAT_SHARE[goals] / KCAL_PER_G["fat"]
+    carb_calories = calories - protein * KCAL_PER_G["protein"] - fat * KCAL_PER_G["fat"]
+    # Very high protein for a small calorie budget would leave carbs negative;
+    # cap protein so carbs never drop below zero
+    overflow = np.minimum(carb_calories, 0.0)
+    protein = protein + overflow / KCAL_PER_G["protein"]
+    carbs = np.maximum(carb_calories, 0.0) / KCAL_PER_G["carbs"]
+
+    return {
+        "bmr": bmr,
+        "tdee": tdee,
+        "calories": calories,
+        "protein_g": protein,
+        "carbs_g": carbs,
+        "fat_g": fat,
+    }
+
+
+def nutrition_targets(age, height, weight, goal, sex=None, activity=DEFAULT_ACTIVITY) -> dict:
+    # Single-user targets, rounded for display. Height in inches, weight in lbs.
+    code = goal_code(goal)
+    result = compute_targets(
+        [age], [height], [weight], [code],
+        SEX_CONSTANTS.get(sex, SEX_CONSTANTS[None]),
+        ACTIVITY_FACTORS.get(activity, ACTIVITY_FACTORS[DEFAULT_ACTIVITY]),
+    )
+    targets = {key: round(float(values[0])) for key, values in result.items()}
+    targets["goal"] = GOAL_NAMES[code]
+    targets["activity"] = activity if activity in ACTIVITY_FACTORS else DEFAULT_ACTIVITY
+    return targets
+
+
+def targets_for_users(users) -> dict:
+    # Targets for many users in one vectorized pass, keyed by user id. users
+    # are rows with id, age, height, weight and goal, all measurements set.
+    if not users:
+        return {}
+    ids = [user.id for user in users]
+    ages = [user.age for user in users]
+    heights = [user.height for user in users]
+    weights = [user.weight for user in users]
+    goals = [user.goal for user in users]
+    result = compute_targets(ages, heights, weights, [goal_code(g) for g in goals])
+    calories = np.rint(result["calories"]).astype(int)
+    protein = np.rint(result["protein_g"]).astype(int)
+    carbs = np.rint(result["carbs_g"]).astype(int)
+    fat = np.rint(result["fat_g"]).astype(int)
+    return {
+        user_id: {
+            "calories": int(calories[i]),
+            "protein_g": int(protein[i]),
+            "carbs_g": int(carbs[i]),
+            "fat_g": int(fat[i]),
+        }
+        for i, user_id in enumerate(ids)
+    }
+
+
+def targets_prompt(targets: dict) -> str:
+    return (
+        f"Daily targets (precomputed, use these exact numbers): "
+        f"{targets['calories']} kcal, {targets['protein_g']}g protein, "
+        f"{targets['carbs_g']}g carbs, {targets['fat_g']}g fat"
+    )
@@ -0,0 +1,77 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from backend import metrics, models
+from backend.config import PASSWORD_POOL_KIND, PASSWORD_POOL_SIZE, PASSWORD_QUEUE_LIMIT
+from backend.tracing import span
+
+# bcrypt is deliberately slow; running it on the event loop thread stalls
+# every other request. Hashing and verification run on a bounded pool and
+# callers fail fast once too much work is already queued.
+
+
+class PasswordPoolSaturated(Exception):
+    pass
+
+
+class PasswordHasher:
+    def __init__(self, kind=PASSWORD_POOL_KIND, size=PASSWORD_POOL_SIZE, queue_limit=PASSWORD_QUEUE_LIMIT):
+        self.kind = kind
+        self.size = size
+        self.queue_limit = queue_limit
+        self.pending = 0
+        self._executor = None
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.size)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.size, thread_name_prefix="password"
+                )
+        return self._executor
+
+    async def _run(self, fn, *args):
+        if self.pending >= self.queue_limit:
+            metrics.inc("password_pool_rejections_total")
+            raise PasswordPoolSaturated("Password hashing pool is saturated")
+        self.pending += 1
+        metrics.set_gauge("password_pool_pending", self.pending)
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, fn, *args)
+        finally:
+            self.pending -= 1
+            metrics.set_gauge("password_pool_pending", self.pending)
+
+    async def hash(self, password):
+        with span("password.hash"):
+            return await self._run(models.User.get_password_hash, password)
+
+    async def verify(self, plain_password, hashed_password):
+        with span("password.verify"):
+            return await self._run(models.verify_password_hash, plain_password, hashed_password)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+_hasher = None
+
+
+def get_password_hasher():
+    global _hasher
+    if _hasher is None:
+        _hasher = PasswordHasher()
+    return _hasher
+
+
+def shutdown_password_hasher():
+    global _hasher
+    if _hasher is not None:
+        _hasher.shutdown()
+        _hasher = None
@@ -0,0 +1,237 @@
+import os
+import zlib
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import Text, bindparam, func, insert, select, update
+from sqlalchemy.exc import NoResultFound
+from sqlalchemy.orm import Session
+
+from backend import metrics, models
+from backend.config import (
+    PLAN_HISTORY_COMPRESSION_LEVEL,
+    PLAN_HISTORY_MAX_AGE_DAYS,
+    PLAN_HISTORY_MAX_VERSIONS,
+)
+from backend.meal_plans import meal_plan_etag
+
+# Append-only history of each user's meal plan. Every write of
+# users.current_meal_plan also appends a zlib-compressed snapshot to
+# meal_plan_versions and moves users.current_plan_version to it, so the
+# latest plan is still read straight from users and any older version is
+# one primary-key lookup. Snapshots rather than deltas keep every
+# point-in-time read and rollback O(1) and let old versions be pruned
+# without rewriting anything. Rollback appends a copy of the chosen
+# version's compressed bytes; nothing is regenerated.
+#
+# Retention: at most PLAN_HISTORY_MAX_VERSIONS per user and, when set,
+# nothing older than PLAN_HISTORY_MAX_AGE_DAYS apart from the current version.
+
+
+class PlanVersionNotFound(Exception):
+    pass
+
+
+def compress_plan(text: str) -> bytes:
+    return zlib.compress(text.encode("utf-8"), PLAN_HISTORY_COMPRESSION_LEVEL)
+
+
+def decompress_plan(data: bytes) -> str:
+    return zlib.decompress(data).decode("utf-8")
+
+
+def _version_row(user_id, version, text, source, now, content=None, restored_from=None):
+    content = content if content is not None else compress_plan(text)
+    size = len(text.encode("utf-8"))
+    metrics.inc("plan_history_bytes_total", size, stage="raw")
+    metrics.inc("plan_history_bytes_total", len(content), stage="stored")
+    return {
+        "user_id": user_id,
+        "version": version,
+        "source": source,
+        "etag": meal_plan_etag(text),
+        "size": size,
+        "content": content,
+        "restored_from": restored_from,
+        "created_at": now,
+    }
+
+
+def prune_history(db: Session, user_id: int, latest_version: int):
+    prune_histories(db, {user_id: latest_version})
+
+
+def prune_histories(db: Session, latest_versions):
+    # latest_versions maps user_id to the version just written. One
+    # statement per user and rule, sent as a single executemany.
+    versions_table = models.MealPlanVersion.__table__
+    connection = db.connection()
+    if PLAN_HISTORY_MAX_VERSIONS:
+        connection.execute(
+            versions_table.delete().where(
+                versions_table.c.user_id == bindparam("uid"),
+                versions_table.c.version <= bindparam("cutoff"),
+            ),
+            [{"uid": user_id, "cutoff": version - PLAN_HISTORY_MAX_VERSIONS} for user_id, version in latest_versions.items()],
+        )
+    if PLAN_HISTORY_MAX_AGE_DAYS:
+        oldest = datetime.utcnow() - timedelta(days=PLAN_HISTORY_MAX_AGE_DAYS)
+        connection.execute(
+            versions_table.delete().where(
+                versions_table.c.user_id == bindparam("uid"),
+                versions_table.c.version < bindparam("latest"),
+                versions_table.c.created_at < bindparam("oldest"),
+            ),
+            [{"uid": user_id, "latest": version, "oldest": oldest} for user_id, version in latest_versions.items()],
+        )
+
+
+def text_edit(old: str, new: str):
+    # (start, removed, inserted) such that
+    # new == old[:start] + inserted + old[start + removed:]
+    start = len(os.path.commonprefix([old, new]))
+    limit = min(len(old), len(new)) - start
+    end = min(limit, len(os.path.commonprefix([old[::-1], new[::-1]])))
+    return start, len(old) - start - end, new[start:len(new) - end]
+
+
+def _bump_version(db: Session, user_id: int, text: str, previous: str = None):
+    # Sets the current plan and returns the new version, or None if the user
+    # is gone or no longer holds `previous`. The increment on the users row
+    # also serializes concurrent writers.
+    statement = update(models.User).where(models.User.id == user_id)
+    plan = text
+    previous_etag = meal_plan_etag(previous) if previous is not None else None
+    if previous_etag is not None:
+        # Only the changed span is sent; the rest is kept in place
+        start, removed, inserted = text_edit(previous, text)
+        column = models.User.current_meal_plan
+        plan = (
+            func.substr(column, 1, start, type_=Text)
+            .concat(inserted)
+            .concat(func.substr(column, start + removed + 1, type_=Text))
+        )
+        statement = statement.where(models.User.meal_plan_etag == previous_etag)
+    return db.execute(
+        statement
+        .values(
+            current_meal_plan=plan,
+            meal_plan_etag=meal_plan_etag(text),
+            current_plan_version=func.coalesce(models.User.current_plan_version, 0) + 1,
+        )
+        .returning(models.User.current_plan_version)
+    ).scalar_one_or_none()
+
+
+def write_current_plan(
+    db: Session,
+    user_id: int,
+    text: str,
+    source: str,
+    content: bytes = None,
+    restored_from: int = None,
+    previous: str = None,
+) -> int:
+    # Makes `text` the user's current plan and appends it to the history.
+    # With `previous` (the plan being edited) only the changed span of the
+    # column is rewritten, falling back to the full text if the stored plan
+    # has moved on. Does not commit.
+    version = _bump_version(db, user_id, text, previous) if previous is not None else None
+    if version is None:
+        version = _bump_version(db, user_id, text)
+    if version is None:
+        raise NoResultFound(f"user {user_id} not found")
+    db.execute(insert(models.MealPlanVersion), [
+        _version_row(user_id, version, text, source, datetime.utcnow(), content, restored_from)
+    ])
+    prune_history(db, user_id, version)
+    return version
+
+
+def write_current_plans(db: Session, results, source: str):
+    # Bulk form of write_current_plan for batch runs; results is a list of
+    # (user_id, text). The same in-place increment runs as one executemany
+    # UPDATE, and the versions it assigned are read back in one SELECT: the
+    # rows stay locked by that UPDATE until commit, so no other writer can
+    # move them in between. Rows are updated in user id order so concurrent
+    # batches cannot deadlock. Returns {user_id: version}; users deleted
+    # since the chunk was read are left out. Does not commit.
+    if not results:
+        return {}
+    users = models.User.__table__
+    texts = dict(sorted(results))
+    db.execute(
+        update(users)
+        .where(users.c.id == bindparam("user_id"))
+        .values(
+            current_meal_plan=bindparam("plan"),
+            meal_plan_etag=bindparam("etag"),
+            current_plan_version=func.coalesce(users.c.current_plan_version, 0) + 1,
+        ),
+        [{"user_id": user_id, "plan": text, "etag": meal_plan_etag(text)} for user_id, text in texts.items()],
+    )
+    versions = dict(db.execute(
+        select(users.c.id, users.c.current_plan_version).where(users.c.id.in_(list(texts)))
+    ).all())
+    if versions:
+        now = datetime.utcnow()
+        db.execute(insert(models.MealPlanVersion.__table__), [
+            _version_row(user_id, version, texts[user_id], source, now) for user_id, version in versions.items()
+        ])
+        prune_histories(db, versions)
+    return versions
+
+
+def list_versions(db: Session, user_id: int, limit: int = 20, before: Optional[int] = None) -> dict:
+    # Newest first; pass next_before back as `before` for the next page
+    query = db.query(
+        models.MealPlanVersion.version,
+        models.MealPlanVersion.created_at,
+        models.MealPlanVersion.source,
+        models.MealPlanVersion.size,
+        models.MealPlanVersion.restored_from,
+    ).filter(models.MealPlanVersion.user_id == user_id)
+    if before is not None:
+        query = query.filter(models.MealPlanVersion.version < before)
+    rows = query.order_by(models.MealPlanVersion.version.desc()).limit(limit + 1).all()
+    current = (
+        db.query(models.User.current_plan_version).filter(models.User.id == user_id).scalar()
+    )
+    versions = [
+        {
+            "version": version,
+            "created_at": created_at,
+            "source": source,
+            "size": size,
+            "restored_from": restored_from,
+            "current": version == current,
+        }
+        for version, created_at, source, size, restored_from in rows[:limit]
+    ]
+    return {
+        "versions": versions,
+        "next_before": versions[-1]["version"] if len(rows) > limit else None,
+    }
+
+
+def load_version_row(db: Session, user_id: int, version: int) -> models.MealPlanVersion:
+    row = (
+        db.query(models.MealPlanVersion)
+        .filter(models.MealPlanVersion.user_id == user_id, models.MealPlanVersion.version == version)
+        .first()
+    )
+    if row is None:
+        raise PlanVersionNotFound(version)
+    return row
+
+
+def load_version(db: Session, user_id: int, version: int) -> dict:
+    row = load_version_row(db, user_id, version)
+    return {
+        "version": row.version,
+        "created_at": row.created_at,
+        "source": row.source,
+        "etag": row.etag,
+        "restored_from": row.restored_from,
+        "meal_plan": decompress_plan(row.content),
+    }
@@ -0,0 +1,41 @@
+from typing import Optional
+
+from backend.nutrition import nutrition_targets, targets_prompt
+
+# Prompts shared by the API and the batch generator
+
+MEAL_PLAN_SYSTEM_PROMPT = "You are a professional dietitian. Provide evidence-based nutrition advice and detailed meal plans that are practical and sustainable."
+FOLLOW_UP_SYSTEM_PROMPT = "You are a professional dietitian providing follow-up support. Reference previous discussions and meal plans when appropriate."
+TWEAK_SYSTEM_PROMPT = "You are a professional dietitian. Modify the existing meal plan based on user feedback while ensuring it remains nutritionally sound."
+
+
+def create_meal_plan_prompt(
+    age, height, weight, goal, current_diet: Optional[str] = None, targets: Optional[dict] = None
+) -> str:
+    # Calories and macros are computed locally; the model only plans meals.
+    # Callers working on many users pass targets from targets_for_users.
+    if targets is None:
+        targets = nutrition_targets(age, height, weight, goal)
+    return f"""
+    Generate a personalized meal plan based on the following details:
+    Age: {age}
+    Height: {height} in
+    Weight: {weight} lbs
+    Goal: {goal}
+    {targets_prompt(targets)}
+    {f"Current Diet: {current_diet}" if current_diet else ""}
+    
+    Please provide a detailed meal plan that includes:
+    1. The daily calorie and macro targets above
+    2. Meals that add up to those targets
+    3. Meal timing recommendations
+    4. Specific meal suggestions for each day
+    5. Portion sizes and alternatives
+    """
+
+
+def meal_plan_messages_for(age, height, weight, goal, current_diet: Optional[str] = None, targets: Optional[dict] = None):
+    return [
+        {"role": "system", "content": MEAL_PLAN_SYSTEM_PROMPT},
+        {"role": "user", "content": create_meal_plan_prompt(age, height, weight, goal, current_diet, targets)},
+    ]
@@ -0,0 +1,341 @@
+import asyncio
+import logging
+import os
+import random
+import time
+
+from openai import APIError
+
+from backend import metrics
+from backend.config import (
+    LLM_BACKEND,
+    LLM_BACKENDS,
+    LLM_FOLLOW_UP_MAX_PROMPT_TOKENS,
+    LLM_FOLLOW_UP_MODEL,
+    LLM_HEDGE_BUDGET,
+    LLM_HEDGE_ENABLED,
+    LLM_HEDGE_LATENCY_FACTOR,
+    LLM_HEDGE_MIN_SECONDS,
+    LLM_MAX_INFLIGHT,
+    LLM_MAX_RETRIES,
+    LLM_PLAN_MODEL,
+    LLM_ROUTER_COOLDOWN_SECONDS,
+    LLM_ROUTER_EXPLORE_RATE,
+    LLM_ROUTER_FAILURE_THRESHOLD,
+    LLM_TIMEOUT_SECONDS,
+)
+from backend.llm import LLMError, LLMGateway, prompt_tokens
+
+logger = logging.getLogger(__name__)
+
+# Routing of completions across several LLM backends (OpenAI, other
+# providers, local OpenAI-compatible servers such as Ollama or vLLM). Each
+# backend has its own gateway, so retries, timeouts and the in-flight limit
+# apply per backend. Requests belong to a tier: full plan generation, or
+# short follow-up questions that can go to a cheaper, faster model. Every
+# (backend, tier) pair is a route that keeps a rolling latency and error
+# rate, and requests go to the route with the lowest expected latency.
+#
+# A request still unanswered after a deadline (a multiple of its route's
+# usual latency) is hedged: the next route gets the same request and the
+# first answer wins, the other is cancelled. Hedges are capped by a budget
+# so a slow provider cannot double the traffic. Failures fall through to
+# the next route, and a route that keeps failing is skipped for a cooldown.
+
+PLAN = "plan"
+FOLLOW_UP = "follow_up"
+TIERS = (PLAN, FOLLOW_UP)
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120)
+# Weight of the newest sample in the rolling latency and error rate
+ALPHA = 0.2
+MAX_HEDGE_TOKENS = 10.0
+FAKE_OPTIONS = ("latency_ms", "tokens_per_second", "error_rate")
+# Errors that count against a backend and move the request to the next one
+FAILURES = (LLMError, APIError)
+
+
+def tier_for(task, messages):
+    # Follow-ups carrying a long context go to the plan models
+    if task == FOLLOW_UP and prompt_tokens(messages) <= LLM_FOLLOW_UP_MAX_PROMPT_TOKENS:
+        return FOLLOW_UP
+    return PLAN
+
+
+class Backend:
+    def __init__(self, name, gateway, models):
+        self.name = name
+        self.gateway = gateway
+        # tier -> model name; a tier without a model is not served here
+        self.models = models
+
+    @classmethod
+    def from_spec(cls, spec, max_retries=LLM_MAX_RETRIES):
+        kind = spec.get("kind", "openai")
+        timeout = spec.get("timeout", LLM_TIMEOUT_SECONDS)
+        client_options = {"kind": kind, "timeout": timeout}
+        if kind == "fake":
+            client_options.update({key: spec[key] for key in FAKE_OPTIONS if key in spec})
+        else:
+            client_options["base_url"] = spec.get("base_url")
+            if spec.get("api_key_env"):
+                client_options["api_key"] = os.getenv(spec["api_key_env"])
+        gateway = LLMGateway(
+            client_options=client_options,
+            max_inflight=spec.get("max_inflight", LLM_MAX_INFLIGHT),
+            timeout=timeout,
+            max_retries=spec.get("max_retries", max_retries),
+        )
+        plan_model = spec.get("plan_model", LLM_PLAN_MODEL)
+        follow_up_model = spec.get("follow_up_model", plan_model if "plan_model" in spec else LLM_FOLLOW_UP_MODEL)
+        models = {tier: model for tier, model in ((PLAN, plan_model), (FOLLOW_UP, follow_up_model)) if model}
+        if not models:
+            raise ValueError(f"LLM backend {spec['name']} has no models")
+        return cls(spec["name"], gateway, models)
+
+
+class Route:
+    # One model on one backend, with the rolling stats used for ranking.
+    # Latency is tracked per kind: "complete", "first_token" and "stream".
+    def __init__(self, backend, tier):
+        self.backend = backend
+        self.tier = tier
+        self.model = backend.models[tier]
+        self.latency = {}
+        self.error_rate = 0.0
+        self.failures = 0
+        self.open_until = 0.0
+
+    @property
+    def name(self):
+        return self.backend.name
+
+    def available(self, now):
+        return now >= self.open_until
+
+    def expected_latency(self, kind):
+        # Mean time to an answer if failures were retried on this route.
+        # Unmeasured routes score 0 so they get tried.
+        latency = self.latency.get(kind, self.latency.get("complete"))
+        if latency is None:
+            return 0.0
+        return latency / max(1.0 - self.error_rate, 0.05)
+
+    def _update(self, kind, seconds):
+        previous = self.latency.get(kind)
+        self.latency[kind] = seconds if previous is None else (1 - ALPHA) * previous + ALPHA * seconds
+
+    def _observe(self, kind, seconds, status):
+        metrics.observe(
+            "llm_backend_latency_seconds", seconds, buckets=LATENCY_BUCKETS,
+            backend=self.name, tier=self.tier, kind=kind, status=status,
+        )
+        metrics.set_gauge("llm_backend_error_rate", round(self.error_rate, 4), backend=self.name, tier=self.tier)
+
+    def record_success(self, kind, seconds):
+        self._update(kind, seconds)
+        self.error_rate *= 1 - ALPHA
+        self.failures = 0
+        self._observe(kind, seconds, "ok")
+
+    def record_failure(self, kind, seconds):
+        self.error_rate = (1 - ALPHA) * self.error_rate + ALPHA
+        self.failures += 1
+        if self.failures >= LLM_ROUTER_FAILURE_THRESHOLD:
+            # Stays tripped while failures continue after the cooldown
+            self.open_until = time.monotonic() + LLM_ROUTER_COOLDOWN_SECONDS
+            if self.failures == LLM_ROUTER_FAILURE_THRESHOLD:
+                logger.warning("LLM backend %s (%s) tripped after %d failures", self.name, self.tier, self.failures)
+                metrics.inc("llm_backend_trips_total", backend=self.name, tier=self.tier)
+        self._observe(kind, seconds, "error")
+
+    def record_cancelled(self, kind, seconds):
+        # A hedge loser took at least this long, so only raise the estimate
+        if seconds > self.latency.get(kind, 0.0):
+            self._update(kind, seconds)
+        metrics.inc("llm_backend_cancelled_total", backend=self.name, tier=self.tier)
+
+
+def _close_stream(opened):
+    _, chunks = opened
+    asyncio.ensure_future(chunks.aclose())
+
+
+class ModelRouter:
+    # Offers the gateway's complete/stream interface with a `task` (PLAN or
+    # FOLLOW_UP) in place of a model name
+    def __init__(self, backends, hedge=LLM_HEDGE_ENABLED):
+        self.backends = backends
+        self.hedge = hedge
+        routes = {tier: [Route(backend, tier) for backend in backends if tier in backend.models] for tier in TIERS}
+        if not any(routes.values()):
+            raise ValueError("No LLM backends configured")
+        # A tier no backend serves falls back to the other tier's models
+        self.routes = {
+            tier: routes[tier] or routes[FOLLOW_UP if tier == PLAN else PLAN] for tier in TIERS
+        }
+        self.hedge_tokens = 1.0
+
+    @classmethod
+    def from_config(cls, specs=None):
+        specs = specs or LLM_BACKENDS or [{
+            "name": LLM_BACKEND,
+            "kind": LLM_BACKEND,
+            "plan_model": LLM_PLAN_MODEL,
+            "follow_up_model": LLM_FOLLOW_UP_MODEL,
+        }]
+        # With somewhere else to go, fail over rather than keep retrying
+        retries = LLM_MAX_RETRIES if len(specs) == 1 else min(LLM_MAX_RETRIES, 1)
+        return cls([Backend.from_spec(spec, retries) for spec in specs])
+
+    def ranked(self, tier, kind, explore=True):
+        now = time.monotonic()
+        routes = self.routes[tier]
+        # Sorting is stable, so unmeasured routes keep their configured order
+        available = sorted((r for r in routes if r.available(now)), key=lambda r: r.expected_latency(kind))
+        tripped = sorted((r for r in routes if not r.available(now)), key=lambda r: r.open_until)
+        if explore and len(available) > 1 and random.random() < LLM_ROUTER_EXPLORE_RATE:
+            # Occasionally lead with another route so stale estimates get refreshed
+            available.insert(0, available.pop(random.randrange(1, len(available))))
+        # Tripped routes are only a last resort
+        return available + tripped
+
+    def model_for(self, task):
+        # The model a request for `task` would most likely be sent to
+        return self.ranked(task if task in TIERS else PLAN, "complete", explore=False)[0].model
+
+    def cache_scope(self, task, messages):
+        # The backends and models that may answer this request, in configured
+        # order rather than by current latency, so ranking changes keep cache
+        # keys stable while a config change does not
+        return [f"{route.name}/{route.model}" for route in self.routes[tier_for(task, messages)]]
+
+    def hedge_delay(self, route, kind):
+        latency = route.latency.get(kind)
+        if latency is None:
+            return LLM_HEDGE_MIN_SECONDS
+        return max(LLM_HEDGE_MIN_SECONDS, LLM_HEDGE_LATENCY_FACTOR * latency)
+
+    def _take_hedge(self):
+        if self.hedge_tokens < 1:
+            return False
+        self.hedge_tokens -= 1
+        return True
+
+    async def _attempt(self, route, kind, attempt):
+        start = time.perf_counter()
+        try:
+            result = await attempt(route)
+        except FAILURES:
+            route.record_failure(kind, time.perf_counter() - start)
+            raise
+        except asyncio.CancelledError:
+            route.record_cancelled(kind, time.perf_counter() - start)
+            raise
+        route.record_success(kind, time.perf_counter() - start)
+        return result
+
+    async def _race(self, tier, kind, attempt, discard=None):
+        # Runs attempt(route) on the best route, hedging and failing over as
+        # needed. Returns (route, result) for the first success; discard is
+        # called with any other result that arrives too late to be used.
+        self.hedge_tokens = min(MAX_HEDGE_TOKENS, self.hedge_tokens + LLM_HEDGE_BUDGET)
+        remaining = self.ranked(tier, kind)
+        primary = remaining[0]
+        leader = hedge = None
+        pending = {}
+        errors = []
+
+        def launch():
+            route = remaining.pop(0)
+            pending[asyncio.ensure_future(self._attempt(route, kind, attempt))] = route
+            return route
+
+        leader = launch()
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        hedged = not self.hedge
+        winner = None
+        try:
+            while pending:
+                timeout = None
+                if not hedged and remaining:
+                    timeout = max(0.0, started + self.hedge_delay(leader, kind) - loop.time())
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # One hedge at most, whether or not the budget allowed it
+                    hedged = True
+                    if self._take_hedge():
+                        hedge = launch()
+                        metrics.inc("llm_hedges_total", backend=hedge.name, tier=tier)
+                    continue
+                for future in done:
+                    route = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except FAILURES as e:
+                        errors.append(f"{route.name}: {e}")
+                        continue
+                    if winner is not None:
+                        if discard is not None:
+                            discard(result)
+                        continue
+                    winner = route, result
+                if winner is not None:
+                    route = winner[0]
+                    outcome = "primary" if route is primary else ("hedge" if route is hedge else "fallback")
+                    metrics.inc("llm_route_requests_total", backend=route.name, tier=tier, outcome=outcome)
+                    return winner
+                if not pending and remaining:
+                    # The hedge deadline restarts for the fallback route
+                    leader = launch()
+                    started = loop.time()
+                    logger.info("Falling back to LLM backend %s (%s)", leader.name, tier)
+            metrics.inc("llm_route_requests_total", backend="none", tier=tier, outcome="failed")
+            raise LLMError("All LLM backends failed: " + "; ".join(errors))
+        finally:
+            for future in pending:
+                # cancel() is False once the future is done; a done future may
+                # still be cancelled, and exception() raises for those
+                if not future.cancel() and not future.cancelled() and discard is not None and future.exception() is None:
+                    discard(future.result())
+
+    async def complete(self, messages, task=PLAN, timeout=None, **kwargs):
+        tier = tier_for(task, messages)
+
+        async def attempt(route):
+            return await route.backend.gateway.complete(messages, model=route.model, timeout=timeout, **kwargs)
+
+        _, result = await self._race(tier, "complete", attempt)
+        return result
+
+    async def stream(self, messages, task=PLAN, timeout=None, **kwargs):
+        # Hedging and failover cover the wait for the first token; after that
+        # the chosen backend streams the rest, and a failure is surfaced as-is
+        tier = tier_for(task, messages)
+        start = time.perf_counter()
+
+        async def attempt(route):
+            chunks = route.backend.gateway.stream(messages, model=route.model, timeout=timeout, **kwargs)
+            try:
+                first = await chunks.__anext__()
+            except StopAsyncIteration:
+                first = None
+            return first, chunks
+
+        route, (first, chunks) = await self._race(tier, "first_token", attempt, discard=_close_stream)
+        try:
+            if first is not None:
+                yield first
+                async for delta in chunks:
+                    yield delta
+        except FAILURES:
+            route.record_failure("stream", time.perf_counter() - start)
+            raise
+        finally:
+            await chunks.aclose()
+        route.record_success("stream", time.perf_counter() - start)
+
+    async def close(self):
+        for backend in self.backends:
+            await backend.gateway.close()
@@ -0,0 +1,234 @@
+import hashlib
+import json
+import re
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from backend import metrics
+from backend.config import (
+    SEMANTIC_CACHE_DIM,
+    SEMANTIC_CACHE_ENABLED,
+    SEMANTIC_CACHE_MAX_ENTRIES,
+    SEMANTIC_CACHE_THRESHOLD,
+    SEMANTIC_CACHE_TTL_SECONDS,
+)
+from backend.llm import get_gateway, prompt_tokens
+from backend.routing import FOLLOW_UP
+from backend.usage import record_call
+
+# Answer cache for follow-up questions that are worded differently but mean
+# the same thing ("can I swap chicken for tofu?" / "could I swap the chicken
+# for tofu"). Questions are embedded with a hashed n-gram vectorizer (no
+# model to download) into rows of one float32 matrix, which starts small and
+# doubles as entries arrive, up to the configured maximum. Random-hyperplane
+# LSH tables narrow a lookup to a few candidate rows, which are then scored
+# exactly by cosine similarity.
+#
+# An answer is only reused within the same context: the same user, their goal
+# and every message before the question (system prompt, the seeded meal plan,
+# earlier turns) must be identical. Answers are never shared between users.
+# Entries live in a ring buffer, so the oldest is overwritten when the cache
+# is full, and expire after a TTL.
+
+# Rows allocated up front; the matrix doubles from here when full
+INITIAL_CAPACITY = 64
+SIMILARITY_BUCKETS = (0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.95, 0.98, 1.0)
+WORD_PATTERN = re.compile(r"[a-z0-9']+")
+STOP_WORDS = frozenset(
+    "a an the i me my we our you can could would should will do does did is are am be "
+    "to of for and or with in on at it this that what how much many some any please".split()
+)
+
+
+class HashedNgramVectorizer:
+    # Content words contribute character 3-5 grams (robust to plurals and
+    # typos), the word itself and ordered bigrams of consecutive content
+    # words, which keep "chicken for tofu" apart from "tofu for chicken".
+    # Stop words only count lightly, so "can I" vs "could I" barely matters.
+    # Features are hashed into `dim` signed buckets and L2-normalised.
+    def __init__(self, dim=SEMANTIC_CACHE_DIM, char_ngrams=(3, 5), word_weight=2.0, bigram_weight=3.0, stop_weight=0.5):
+        self.dim = dim
+        self.char_ngrams = char_ngrams
+        self.word_weight = word_weight
+        self.bigram_weight = bigram_weight
+        self.stop_weight = stop_weight
+
+    def features(self, text):
+        words = WORD_PATTERN.findall(text.lower())
+        content = [word for word in words if word not in STOP_WORDS]
+        for word in content:
+            padded = f" {word} "
+            for n in range(self.char_ngrams[0], self.char_ngrams[1] + 1):
+                for i in range(len(padded) - n + 1):
+                    yield padded[i:i + n], 1.0
+            yield f"w:{word}", self.word_weight
+        for first, second in zip(content, content[1:]):
+            yield f"b:{first} {second}", self.bigram_weight
+        for word in words:
+            if word in STOP_WORDS:
+                yield f"s:{word}", self.stop_weight
+
+    def transform(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, weight in self.features(text):
+            h = zlib.crc32(feature.encode("utf-8"))
+            vector[h % self.dim] += weight if h & 0x80000000 else -weight
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+def context_key(user_id, goal, messages):
+    # Everything the answer depends on besides the question itself
+    payload = json.dumps([user_id, goal, messages[:-1]], sort_keys=True, separators=(",", ":"))
+    return int.from_bytes(hashlib.blake2b(payload.encode("utf-8"), digest_size=8).digest(), "little", signed=True)
+
+
+class SemanticCache:
+    def __init__(
+        self,
+        max_entries=SEMANTIC_CACHE_MAX_ENTRIES,
+        ttl=SEMANTIC_CACHE_TTL_SECONDS,
+        threshold=SEMANTIC_CACHE_THRESHOLD,
+        vectorizer=None,
+        tables=4,
+        bits=8,
+        seed=0,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.vectorizer = vectorizer or HashedNgramVectorizer()
+        dim = self.vectorizer.dim
+        self.capacity = min(INITIAL_CAPACITY, max_entries)
+        self.vectors = np.zeros((self.capacity, dim), dtype=np.float32)
+        self.expires = np.zeros(self.capacity, dtype=np.float64)
+        self.answers = [None] * self.capacity
+        self.latencies = np.zeros(self.capacity, dtype=np.float32)
+        # One set of hyperplanes per table; a row's signature in a table is
+        # the sign pattern of its projections
+        self.planes = np.random.default_rng(seed).standard_normal((tables, bits, dim)).astype(np.float32)
+        self.powers = 1 << np.arange(bits)
+        self.buckets = [{} for _ in range(tables)]
+        self.slot_keys = [None] * self.capacity
+        self.next_slot = 0
+        self.size = 0
+        self._lock = threading.Lock()
+
+    def _signatures(self, vector):
+        projections = self.planes @ vector
+        return ((projections > 0) @ self.powers).tolist()
+
+    def _grow(self):
+        # Called with the lock held once every row is in use
+        capacity = min(self.capacity * 2, self.max_entries)
+        extra = capacity - self.capacity
+        self.vectors = np.concatenate([self.vectors, np.zeros((extra, self.vectors.shape[1]), dtype=np.float32)])
+        self.expires = np.concatenate([self.expires, np.zeros(extra, dtype=np.float64)])
+        self.latencies = np.concatenate([self.latencies, np.zeros(extra, dtype=np.float32)])
+        self.answers.extend([None] * extra)
+        self.slot_keys.extend([None] * extra)
+        self.capacity = capacity
+
+    def _evict(self, slot):
+        keys = self.slot_keys[slot]
+        if keys is None:
+            return
+        for table, key in zip(self.buckets, keys):
+            members = table.get(key)
+            if members is not None:
+                members.discard(slot)
+                if not members:
+                    del table[key]
+        self.slot_keys[slot] = None
+        self.answers[slot] = None
+        self.size -= 1
+
+    def lookup(self, question, context):
+        # Returns (answer, similarity, saved latency) or None
+        vector = self.vectorizer.transform(question)
+        signatures = self._signatures(vector)
+        now = time.time()
+        with self._lock:
+            candidates = set()
+            for table, signature in zip(self.buckets, signatures):
+                candidates.update(table.get((context, signature), ()))
+            if not candidates:
+                metrics.inc("semantic_cache_lookups_total", result="miss")
+                return None
+            slots = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+            similarities = self.vectors[slots] @ vector
+            similarities[self.expires[slots] < now] = -1.0
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            slot = int(slots[best])
+            answer = self.answers[slot]
+            latency = float(self.latencies[slot])
+        metrics.observe("semantic_cache_similarity", similarity, buckets=SIMILARITY_BUCKETS)
+        if similarity < self.threshold or answer is None:
+            metrics.inc("semantic_cache_lookups_total", result="miss")
+            return None
+        metrics.inc("semantic_cache_lookups_total", result="hit")
+        metrics.inc("semantic_cache_latency_saved_seconds_total", latency)
+        return answer, similarity, latency
+
+    def store(self, question, context, answer, latency=0.0):
+        vector = self.vectorizer.transform(question)
+        signatures = self._signatures(vector)
+        with self._lock:
+            slot = self.next_slot
+            if slot >= self.capacity:
+                self._grow()
+            self.next_slot = (slot + 1) % self.max_entries
+            if self.slot_keys[slot] is not None:
+                self._evict(slot)
+                metrics.inc("cache_evictions_total", tier="semantic")
+            self.vectors[slot] = vector
+            self.expires[slot] = time.time() + self.ttl
+            self.answers[slot] = answer
+            self.latencies[slot] = latency
+            keys = [(context, signature) for signature in signatures]
+            for table, key in zip(self.buckets, keys):
+                table.setdefault(key, set()).add(slot)
+            self.slot_keys[slot] = keys
+            self.size += 1
+            metrics.set_gauge("semantic_cache_entries", self.size)
+
+    def for_messages(self, user_id, goal, messages):
+        return SemanticLookup(self, messages, context_key(user_id, goal, messages))
+
+
+class SemanticLookup:
+    # Binds the cache to one follow-up turn. get/set match the response
+    # cache interface so stream_completion can use it; the key is ignored.
+    def __init__(self, cache, messages, context):
+        self.cache = cache
+        self.messages = messages
+        self.question = messages[-1]["content"]
+        self.context = context
+        self.started = time.perf_counter()
+
+    def get(self, key=None):
+        hit = self.cache.lookup(self.question, self.context)
+        if hit is None:
+            return None
+        record_call(get_gateway().model_for(FOLLOW_UP), prompt_tokens(self.messages), 0, cached=True)
+        return hit[0]
+
+    def set(self, key, value, model=None, latency=None):
+        if latency is None:
+            latency = time.perf_counter() - self.started
+        self.cache.store(self.question, self.context, value, latency)
+
+
+_cache = None
+
+
+def get_semantic_cache():
+    # None when disabled
+    global _cache
+    if _cache is None and SEMANTIC_CACHE_ENABLED:
+        _cache = SemanticCache()
+    return _cache
@@ -0,0 +1,52 @@
+import asyncio
+
+from backend import metrics
+from backend.config import LLM_COALESCE_WINDOW_SECONDS
+
+# Single-flight coalescing: concurrent calls with the same key await one
+# execution and share its result (or exception). A finished result stays
+# shareable for `window` seconds so a double-click just after completion is
+# served without another upstream call.
+
+
+class SingleFlight:
+    def __init__(self, window=LLM_COALESCE_WINDOW_SECONDS):
+        self.window = window
+        self._calls = {}
+
+    async def do(self, key, fn, name="default"):
+        future = self._calls.get(key)
+        if future is not None:
+            metrics.inc("singleflight_shared_total", operation=name)
+            return await asyncio.shield(future)
+
+        metrics.inc("singleflight_executions_total", operation=name)
+        future = asyncio.ensure_future(fn())
+        self._calls[key] = future
+        future.add_done_callback(lambda f: self._forget(key, f))
+        # Shielded so a cancelled caller doesn't cancel the shared call
+        return await asyncio.shield(future)
+
+    def _forget(self, key, future):
+        def remove():
+            if self._calls.get(key) is future:
+                del self._calls[key]
+
+        # Failures are never reused; successes linger for the window
+        if self.window > 0 and not future.cancelled() and future.exception() is None:
+            asyncio.get_running_loop().call_later(self.window, remove)
+        else:
+            remove()
+
+    def __len__(self):
+        return len(self._calls)
+
+
+_single_flight = None
+
+
+def get_single_flight():
+    global _single_flight
+    if _single_flight is None:
+        _single_flight = SingleFlight()
+    return _single_flight
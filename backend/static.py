@@ -0,0 +1,30 @@
+import os
+
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.staticfiles import StaticFiles
+
+from backend.config import FRONTEND_DIR, STATIC_MAX_AGE_SECONDS
+
+# Serves the frontend from the API process in production so there is no
+# separate single-threaded static server. Files go out through FileResponse
+# with ETag/Last-Modified (conditional requests get 304), text assets are
+# gzipped, and non-HTML assets are cacheable by browsers and proxies. HTML
+# pages are revalidated on every load so deploys show up immediately.
+
+
+class CachedStaticFiles(StaticFiles):
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if os.fspath(full_path).endswith(".html"):
+            response.headers["Cache-Control"] = "no-cache"
+        else:
+            response.headers["Cache-Control"] = f"public, max-age={STATIC_MAX_AGE_SECONDS}"
+        return response
+
+
+def frontend_app(directory=FRONTEND_DIR):
+    return GZipMiddleware(
+        CachedStaticFiles(directory=directory, html=True),
+        minimum_size=500,
+        compresslevel=6,
+    )
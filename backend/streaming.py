@@ -0,0 +1,81 @@
+import json
+import logging
+import time
+
+from fastapi.responses import StreamingResponse
+
+from backend import metrics
+from backend.cache import response_cache_key
+from backend.llm import get_gateway, prompt_tokens
+from backend.routing import PLAN
+from backend.usage import quotas, record_call
+
+
+logger = logging.getLogger(__name__)
+
+
+def sse_event(data, event=None):
+    message = f"data: {json.dumps(data)}\n\n"
+    if event:
+        message = f"event: {event}\n" + message
+    return message
+
+
+async def _cached_or_upstream(messages, cache, key, task):
+    if cache is not None:
+        content = cache.get(key)
+        if content is not None:
+            record_call(get_gateway().model_for(task), prompt_tokens(messages), 0, cached=True)
+            yield content, True
+            return
+
+    parts = []
+    async for delta in get_gateway().stream(messages, task=task):
+        parts.append(delta)
+        yield delta, False
+
+    if cache is not None:
+        cache.set(key, "".join(parts), model=get_gateway().model_for(task))
+
+
+def stream_completion(messages, endpoint, on_complete=None, cache=None, task=PLAN):
+    # Forwards completion deltas as server-sent events. on_complete is awaited
+    # with the full text once the upstream stream finishes, before the final
+    # "done" event is sent. A cache hit is sent as a single delta.
+    key = response_cache_key(task, messages) if cache is not None else None
+    # Checked up front so an exhausted quota is a 429, not an error event
+    quotas.check()
+
+    async def events():
+        start = time.perf_counter()
+        ttfb = None
+        cached = False
+        parts = []
+        try:
+            async for delta, cached in _cached_or_upstream(messages, cache, key, task):
+                if ttfb is None:
+                    ttfb = time.perf_counter() - start
+                    metrics.observe("llm_stream_ttfb_seconds", ttfb, endpoint=endpoint)
+                parts.append(delta)
+                yield sse_event({"delta": delta})
+
+            if on_complete is not None:
+                await on_complete("".join(parts))
+        except Exception as e:
+            logger.warning("Error streaming %s: %s", endpoint, e)
+            metrics.inc("llm_stream_errors_total", endpoint=endpoint)
+            yield sse_event({"detail": "Failed to stream response"}, event="error")
+            return
+
+        duration = time.perf_counter() - start
+        metrics.observe("llm_stream_duration_seconds", duration, endpoint=endpoint)
+        yield sse_event(
+            {"status": "success", "cached": cached, "ttfb": ttfb, "duration": duration},
+            event="done",
+        )
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
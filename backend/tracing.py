@@ -0,0 +1,60 @@
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from backend import metrics
+from backend.config import TRACE_SAMPLE_RATE
+
+# Request correlation and per-stage timing. Every request gets an id that is
+# attached to its log records. A sampled fraction of requests also carries a
+# Trace: span() blocks inside it record their duration, and the request log
+# line lists them. Outside a sampled request span() costs one ContextVar read.
+
+request_id_var: ContextVar = ContextVar("request_id", default=None)
+_trace_var: ContextVar = ContextVar("trace", default=None)
+
+
+class Trace:
+    def __init__(self, request_id):
+        self.request_id = request_id
+        # (stage, milliseconds); appended from threadpool workers too, which
+        # see the same object through the copied context
+        self.spans = []
+
+    def as_list(self):
+        return [{"stage": stage, "ms": round(ms, 3)} for stage, ms in self.spans]
+
+
+def should_sample(rate=TRACE_SAMPLE_RATE):
+    return rate >= 1 or (rate > 0 and random.random() < rate)
+
+
+def start_request(request_id, sampled):
+    request_id_var.set(request_id)
+    trace = Trace(request_id) if sampled else None
+    _trace_var.set(trace)
+    return trace
+
+
+@contextmanager
+def span(stage):
+    trace = _trace_var.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        trace.spans.append((stage, elapsed * 1000))
+        metrics.observe("span_duration_seconds", elapsed, stage=stage)
+
+
+def add_span(stage, seconds):
+    # For stages timed elsewhere, e.g. by SQLAlchemy session events
+    trace = _trace_var.get()
+    if trace is not None:
+        trace.spans.append((stage, seconds * 1000))
+        metrics.observe("span_duration_seconds", seconds, stage=stage)
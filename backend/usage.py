@@ -0,0 +1,205 @@
+import asyncio
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from backend import metrics, models
+from backend.database import run_db, session_scope
+from backend.config import (
+    LLM_ENDPOINT_REQUESTS_PER_MINUTE,
+    LLM_ENDPOINT_TOKENS_PER_MINUTE,
+    LLM_USER_REQUESTS_PER_MINUTE,
+    LLM_USER_TOKENS_PER_DAY,
+    USAGE_FLUSH_INTERVAL_SECONDS,
+)
+
+# Per-call accounting for the LLM gateway. Every completion (and every cache
+# hit) is recorded with its token counts, latency, retries and the user and
+# endpoint it was made for. Counters go to the metrics registry right away;
+# rows are buffered and written to llm_usage in batches so the request path
+# never waits on an INSERT. The same records feed the quotas.
+
+# (user_id, endpoint) of the request an LLM call is made for. Set by the
+# authentication dependency, the job worker and the batch runner.
+call_context = ContextVar("llm_call_context", default=(None, None))
+
+
+def set_call_context(user_id, endpoint):
+    call_context.set((user_id, endpoint))
+
+
+class QuotaExceeded(Exception):
+    def __init__(self, scope, retry_after):
+        super().__init__(f"{scope} quota exceeded")
+        self.scope = scope
+        self.retry_after = retry_after
+
+
+class _Window:
+    # Fixed window counter; good enough for quotas at minute and day scale
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.counts = {}
+
+    def _bucket(self, key, now):
+        start = now - now % self.seconds
+        entry = self.counts.get(key)
+        if entry is None or entry[0] != start:
+            entry = self.counts[key] = [start, 0]
+        return entry
+
+    def add(self, key, value, now):
+        self._bucket(key, now)[1] += value
+
+    def value(self, key, now):
+        return self._bucket(key, now)[1]
+
+    def retry_after(self, now):
+        return int(self.seconds - now % self.seconds) + 1
+
+
+class QuotaTracker:
+    # Per-process limits; a limit of 0 disables that check
+    def __init__(
+        self,
+        user_rpm=LLM_USER_REQUESTS_PER_MINUTE,
+        user_tokens_per_day=LLM_USER_TOKENS_PER_DAY,
+        endpoint_rpm=LLM_ENDPOINT_REQUESTS_PER_MINUTE,
+        endpoint_tokens_per_minute=LLM_ENDPOINT_TOKENS_PER_MINUTE,
+    ):
+        self.limits = [
+            # (scope, key index in the context, window, limit, counts tokens)
+            ("user requests", 0, _Window(60), user_rpm, False),
+            ("user tokens", 0, _Window(86400), user_tokens_per_day, True),
+            ("endpoint requests", 1, _Window(60), endpoint_rpm, False),
+            ("endpoint tokens", 1, _Window(60), endpoint_tokens_per_minute, True),
+        ]
+        self._lock = threading.Lock()
+
+    def check(self, context=None):
+        context = context or call_context.get()
+        now = time.time()
+        with self._lock:
+            for scope, index, window, limit, _ in self.limits:
+                key = context[index]
+                if limit and key is not None and window.value(key, now) >= limit:
+                    metrics.inc("llm_quota_rejections_total", scope=scope)
+                    raise QuotaExceeded(scope, window.retry_after(now))
+
+    def add(self, context, tokens):
+        now = time.time()
+        with self._lock:
+            for _, index, window, limit, counts_tokens in self.limits:
+                key = context[index]
+                if limit and key is not None:
+                    window.add(key, tokens if counts_tokens else 1, now)
+
+
+quotas = QuotaTracker()
+logger = logging.getLogger(__name__)
+
+_pending = []
+_pending_lock = threading.Lock()
+
+
+def record_call(
+    model,
+    prompt_tokens,
+    completion_tokens,
+    latency=0.0,
+    retries=0,
+    cached=False,
+    status="ok",
+):
+    user_id, endpoint = call_context.get()
+    endpoint = endpoint or "unknown"
+    metrics.inc("llm_calls_total", endpoint=endpoint, model=model, status=status, cached=str(cached).lower())
+    metrics.inc("llm_prompt_tokens_total", prompt_tokens, endpoint=endpoint, model=model)
+    metrics.inc("llm_completion_tokens_total", completion_tokens, endpoint=endpoint, model=model)
+    if not cached:
+        metrics.observe("llm_call_latency_seconds", latency, endpoint=endpoint, model=model)
+        metrics.inc("llm_retries_total", retries, endpoint=endpoint)
+        quotas.add((user_id, endpoint), prompt_tokens + completion_tokens)
+    with _pending_lock:
+        _pending.append({
+            "created_at": datetime.utcnow(),
+            "user_id": user_id,
+            "endpoint": endpoint,
+            "model": model,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "latency": latency,
+            "retries": retries,
+            "cached": cached,
+            "status": status,
+        })
+
+
+def flush_usage(db: Session):
+    global _pending
+    with _pending_lock:
+        rows, _pending = _pending, []
+    if rows:
+        db.bulk_insert_mappings(models.LLMUsage, rows)
+        db.commit()
+    return len(rows)
+
+
+def usage_summary(db: Session, user_id: int, days: int = 1):
+    since = datetime.utcnow() - timedelta(days=days)
+    rows = (
+        db.query(
+            models.LLMUsage.endpoint,
+            func.count(models.LLMUsage.id),
+            func.sum(models.LLMUsage.prompt_tokens),
+            func.sum(models.LLMUsage.completion_tokens),
+            func.avg(models.LLMUsage.latency),
+        )
+        .filter(models.LLMUsage.user_id == user_id, models.LLMUsage.created_at >= since)
+        .group_by(models.LLMUsage.endpoint)
+        .all()
+    )
+    return {
+        endpoint: {
+            "calls": calls,
+            "prompt_tokens": int(prompt or 0),
+            "completion_tokens": int(completion or 0),
+            "avg_latency": float(latency or 0.0),
+        }
+        for endpoint, calls, prompt, completion, latency in rows
+    }
+
+
+async def write_usage():
+    try:
+        async with session_scope() as db:
+            await run_db(db, flush_usage)
+    except Exception as e:
+        logger.exception("Error writing LLM usage")
+
+
+class UsageRecorder:
+    # Periodically writes buffered usage rows; stop() flushes what is left
+    def __init__(self, interval=USAGE_FLUSH_INTERVAL_SECONDS):
+        self.interval = interval
+        self._task = None
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await write_usage()
+
+    def start(self):
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await write_usage()
@@ -0,0 +1,206 @@
+import asyncio
+import csv
+import json
+import time
+from datetime import datetime
+
+from sqlalchemy import insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from backend import metrics, models
+from backend.config import USER_IMPORT_CHUNK_SIZE
+from backend.database import run_db, session_scope
+
+# User creation. Uniqueness of usernames and emails is left to the unique
+# indexes on users: registration is a single INSERT and a violation is mapped
+# back to the field that clashed, username first. Bulk imports read CSV or JSONL files in
+# chunks, hash passwords in parallel and insert each chunk with one
+# statement, skipping rows that clash with existing users.
+
+UNIQUE_FIELDS = ("username", "email")
+PROFILE_FIELDS = ("first_name", "last_name", "goal")
+# Invalid rows reported back in full; the rest are only counted
+MAX_REPORTED_ERRORS = 20
+
+
+class DuplicateUser(Exception):
+    def __init__(self, field):
+        super().__init__(f"{field} already registered")
+        self.field = field
+
+
+def unique_violation_field(error: IntegrityError):
+    # SQLite: "UNIQUE constraint failed: users.email"
+    # Postgres: 'duplicate key value violates unique constraint "ix_users_email"'
+    message = str(error.orig).lower()
+    for field in UNIQUE_FIELDS:
+        if f"users.{field}" in message or f"ix_users_{field}" in message or f"({field})" in message:
+            return field
+    return None
+
+
+def create_user(db: Session, user: models.User):
+    db.add(user)
+    try:
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        field = unique_violation_field(e)
+        if field != "username":
+            # The database names whichever index it checked first; a clash on
+            # both is reported as the username
+            taken = db.query(models.User.id).filter(models.User.username == user.username).first()
+            if taken is not None:
+                field = "username"
+        if field is None:
+            raise
+        raise DuplicateUser(field) from e
+    return user
+
+
+def read_rows(f, fmt):
+    # Yields (line number, raw dict) pairs
+    if fmt == "csv":
+        for number, row in enumerate(csv.DictReader(f), start=2):
+            yield number, row
+        return
+    for number, line in enumerate(f, start=1):
+        line = line.strip()
+        if line:
+            try:
+                yield number, json.loads(line)
+            except json.JSONDecodeError as e:
+                yield number, ValueError(f"invalid JSON: {e.msg}")
+
+
+def detect_format(filename):
+    return "csv" if (filename or "").lower().endswith(".csv") else "jsonl"
+
+
+def _optional(raw, field, cast):
+    value = raw.get(field)
+    if value is None or value == "":
+        return None
+    return cast(value)
+
+
+def normalize_row(raw):
+    # Raises ValueError for rows that cannot be imported
+    if isinstance(raw, Exception):
+        raise raw
+    if not isinstance(raw, dict):
+        raise ValueError("expected an object")
+    row = {}
+    for field in UNIQUE_FIELDS:
+        value = str(raw.get(field) or "").strip()
+        if not value:
+            raise ValueError(f"missing {field}")
+        row[field] = value
+    if raw.get("hashed_password"):
+        row["hashed_password"] = raw["hashed_password"]
+    elif raw.get("password"):
+        row["password"] = str(raw["password"])
+    else:
+        raise ValueError("missing password")
+    for field in PROFILE_FIELDS:
+        row[field] = _optional(raw, field, str)
+    row["birthday"] = _optional(raw, "birthday", lambda v: datetime.strptime(v, "%Y-%m-%d").date())
+    row["age"] = _optional(raw, "age", int)
+    row["height"] = _optional(raw, "height", float)
+    row["weight"] = _optional(raw, "weight", float)
+    row["current_meal_plan"] = models.NO_MEAL_PLAN
+    return row
+
+
+def insert_users(db: Session, rows):
+    # One multi-row INSERT; rows clashing with existing users (or with each
+    # other) are skipped. Returns the number inserted.
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        statement = postgresql.insert(models.User).on_conflict_do_nothing()
+    elif dialect == "sqlite":
+        statement = sqlite.insert(models.User).on_conflict_do_nothing()
+    else:
+        statement = insert(models.User)
+    inserted = db.execute(statement.returning(models.User.id), rows).all()
+    db.commit()
+    return len(inserted)
+
+
+class ImportReport:
+    def __init__(self):
+        self.read = 0
+        self.inserted = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.errors = []
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.read / max(self.elapsed, 1e-9)
+
+    def to_dict(self):
+        return {
+            "read": self.read,
+            "inserted": self.inserted,
+            "duplicates": self.duplicates,
+            "invalid": self.invalid,
+            "errors": self.errors,
+            "elapsed": round(self.elapsed, 3),
+            "rows_per_second": round(self.rows_per_second, 1),
+        }
+
+
+async def _hash_chunk(rows, hasher, semaphore):
+    async def hash_row(row):
+        password = row.pop("password", None)
+        if password is not None:
+            async with semaphore:
+                row["hashed_password"] = await hasher.hash(password)
+        return row
+
+    return await asyncio.gather(*(hash_row(row) for row in rows))
+
+
+async def import_users(rows, hasher, chunk_size=USER_IMPORT_CHUNK_SIZE, concurrency=None, progress=None):
+    # rows: iterable of (line number, raw dict) from read_rows
+    report = ImportReport()
+    # Keep hashing below the pool's queue limit so logins still get through
+    semaphore = asyncio.Semaphore(concurrency or max(1, min(hasher.size * 2, hasher.queue_limit // 2)))
+    start = time.perf_counter()
+
+    async with session_scope() as db:
+        async def flush(chunk):
+            hashed = await _hash_chunk(chunk, hasher, semaphore)
+            inserted = await run_db(db, insert_users, hashed)
+            report.inserted += inserted
+            report.duplicates += len(chunk) - inserted
+            report.elapsed = time.perf_counter() - start
+            metrics.inc("users_imported_total", inserted)
+            if progress:
+                progress(
+                    f"{report.read} rows: {report.inserted} inserted, {report.duplicates} duplicates, "
+                    f"{report.invalid} invalid, {report.rows_per_second:.1f} rows/s"
+                )
+
+        chunk = []
+        for number, raw in rows:
+            report.read += 1
+            try:
+                chunk.append(normalize_row(raw))
+            except (ValueError, TypeError) as e:
+                report.invalid += 1
+                if len(report.errors) < MAX_REPORTED_ERRORS:
+                    report.errors.append({"line": number, "error": str(e)})
+                continue
+            if len(chunk) >= chunk_size:
+                await flush(chunk)
+                chunk = []
+        if chunk:
+            await flush(chunk)
+
+    report.elapsed = time.perf_counter() - start
+    return report
@@ -0,0 +1,82 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.fake_llm import FakeAsyncOpenAI
+from backend.llm import LLMGateway
+
+# Load-tests the LLM gateway against the local fake completion backend.
+# Example: python benchmarks/llm_gateway.py --requests 500 --inflight 32
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run(args):
+    client = FakeAsyncOpenAI(
+        latency_ms=args.latency_ms,
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate,
+    )
+    gateway = LLMGateway(
+        client=client,
+        max_inflight=args.inflight,
+        timeout=args.timeout,
+        backoff_base=0.01,
+        backoff_max=0.1,
+    )
+    messages = [
+        {"role": "system", "content": "You are a professional dietitian."},
+        {"role": "user", "content": "Generate a personalized meal plan."},
+    ]
+    latencies = []
+    failures = 0
+    peak_inflight = 0
+
+    async def one():
+        nonlocal failures, peak_inflight
+        start = time.perf_counter()
+        try:
+            await gateway.complete(messages)
+        except Exception:
+            failures += 1
+        else:
+            latencies.append(time.perf_counter() - start)
+        peak_inflight = max(peak_inflight, gateway.inflight)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(args.requests)))
+    elapsed = time.perf_counter() - start
+
+    print(f"requests:      {args.requests}")
+    print(f"in-flight cap: {args.inflight}")
+    print(f"upstream calls:{client.chat.completions.calls:>6}")
+    print(f"failures:      {failures}")
+    print(f"elapsed:       {elapsed:.2f}s")
+    print(f"throughput:    {args.requests / elapsed:.1f} req/s")
+    if latencies:
+        print(f"p50 latency:   {percentile(latencies, 50) * 1000:.1f} ms")
+        print(f"p95 latency:   {percentile(latencies, 95) * 1000:.1f} ms")
+        print(f"p99 latency:   {percentile(latencies, 99) * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the LLM gateway with a fake backend.")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--inflight", type=int, default=16)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--latency-ms", type=float, default=100)
+    parser.add_argument("--tokens-per-second", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,414 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+# End-to-end load test. Starts the fake OpenAI-compatible server
+# (backend/fake_llm.py) and the app under gunicorn, pointed at SQLite or the
+# given database, then runs scripted user journeys against it over HTTP.
+# Reports per-step p50/p95/p99 latency, throughput and event loop lag (the
+# load generator's and the server's, from /debug/metrics), and writes the
+# results as JSON so runs can be compared across commits.
+# Examples:
+#   python benchmarks/load_test.py --users 200 --concurrency 50
+#   python benchmarks/load_test.py --database-url postgresql://localhost/nutrition --workers 4
+#   python benchmarks/load_test.py --compare benchmarks/results/<earlier run>.json
+
+
+async def step_register(client, state):
+    return await client.post("/register", json={
+        "username": state["username"],
+        "email": f"{state['username']}@load.test",
+        "password": state["password"],
+        "first_name": "Load",
+        "last_name": "Test",
+        "birthday": "1990-01-01",
+        "age": state["age"],
+        "height": 68,
+        "weight": state["weight"],
+        "goal": "lose weight",
+    })
+
+
+async def step_token(client, state):
+    response = await client.post("/token", data={"username": state["username"], "password": state["password"]})
+    if response.status_code == 200:
+        state["headers"] = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    return response
+
+
+async def step_me(client, state):
+    return await client.get("/user/me", headers=state["headers"])
+
+
+async def step_generate(client, state):
+    return await client.post("/generate-meal-plan", headers=state["headers"], json={
+        "username": state["username"],
+        "age": state["age"],
+        "height": 68,
+        "weight": state["weight"],
+        "goal": "lose weight",
+        "planType": "new",
+    })
+
+
+async def step_follow_up(client, state):
+    response = await client.post("/follow-up", headers=state["headers"], json={
+        "conversation_id": state.get("conversation_id"),
+        "message": "Can I swap the salmon for something vegetarian?",
+    })
+    if response.status_code == 200:
+        state["conversation_id"] = response.json()["conversation_id"]
+    return response
+
+
+async def step_tweak(client, state):
+    return await client.post("/tweak-meal-plan", headers=state["headers"], json={
+        "username": state["username"],
+        "currentDiet": "No fish on Monday",
+        "day": "Monday",
+    })
+
+
+async def step_plan(client, state):
+    return await client.get("/user/meal-plan", headers=state["headers"])
+
+
+STEPS = {
+    "register": step_register,
+    "token": step_token,
+    "me": step_me,
+    "generate": step_generate,
+    "follow_up": step_follow_up,
+    "tweak": step_tweak,
+    "plan": step_plan,
+}
+
+JOURNEYS = {
+    "full": ["register", "token", "generate", "follow_up", "follow_up", "tweak", "plan"],
+    "auth": ["register", "token", "me"],
+    "generate": ["register", "token", "generate", "plan"],
+    "chat": ["register", "token", "follow_up", "follow_up", "follow_up"],
+}
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(values):
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean_ms": round(sum(values) / len(values) * 1000, 3),
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p95_ms": round(percentile(values, 95) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3),
+        "max_ms": round(max(values) * 1000, 3),
+    }
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(url, process, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"{url} exited with code {process.returncode} before becoming ready")
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Timed out waiting for {url}")
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = bool(subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT, capture_output=True, text=True
+        ).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def start_servers(args, processes):
+    fake_port = free_port()
+    command = [sys.executable, "-m", "backend.fake_llm", "--port", str(fake_port), "--latency-ms", str(args.llm_latency_ms)]
+    if args.llm_tokens_per_second:
+        command += ["--tokens-per-second", str(args.llm_tokens_per_second)]
+    if args.llm_error_rate:
+        command += ["--error-rate", str(args.llm_error_rate)]
+    processes.append(subprocess.Popen(command, cwd=ROOT))
+    wait_for(f"http://127.0.0.1:{fake_port}/docs", processes[-1])
+
+    app_port = free_port()
+    env = dict(
+        os.environ,
+        DATABASE_URL=args.database_url,
+        SECRET_KEY=os.getenv("SECRET_KEY", "load-test"),
+        LLM_BACKEND="openai",
+        OPENAI_BASE_URL=f"http://127.0.0.1:{fake_port}/v1",
+        OPENAI_API_KEY="load-test",
+        LLM_CACHE_ENABLED="true" if args.cache else "false",
+        LOG_LEVEL=os.getenv("LOG_LEVEL", "WARNING"),
+        TRACE_SAMPLE_RATE="0",
+        WEB_CONCURRENCY=str(args.workers),
+        # Worker recycling would show up as latency spikes
+        GUNICORN_MAX_REQUESTS="0",
+    )
+    subprocess.run([sys.executable, "-m", "backend.migrations", "upgrade"], cwd=ROOT, env=env, check=True)
+    processes.append(subprocess.Popen([
+        sys.executable, "-m", "gunicorn", "backend.main:app",
+        "-c", os.path.join(ROOT, "backend", "gunicorn_conf.py"),
+        "--bind", f"127.0.0.1:{app_port}",
+    ], cwd=ROOT, env=env))
+    url = f"http://127.0.0.1:{app_port}"
+    wait_for(f"{url}/health", processes[-1])
+    return url
+
+
+async def server_lag_buckets(client):
+    # Cumulative event_loop_lag_seconds buckets of whichever worker answers
+    try:
+        response = await client.get("/debug/metrics")
+        histogram = response.json()["histograms"].get("event_loop_lag_seconds")
+    except (httpx.HTTPError, ValueError, KeyError):
+        return None
+    return histogram["buckets"] if histogram else {}
+
+
+def bucket_summary(before, after):
+    # Percentiles from histogram buckets are upper bounds of the bucket they fall in
+    counts = {bound: after.get(bound, 0) - (before or {}).get(bound, 0) for bound in after}
+    total = sum(counts.values())
+    if not total:
+        return {"samples": 0}
+    summary = {"samples": total}
+    for pct in (50, 95, 99):
+        seen = 0
+        for bound, count in counts.items():
+            seen += count
+            if seen >= pct / 100 * total:
+                summary[f"p{pct}_ms_upper"] = bound if bound == "+Inf" else float(bound) * 1000
+                break
+    return summary
+
+
+async def sample_loop_lag(stop, samples, interval=0.01):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, loop.time() - start - interval))
+
+
+async def run_journey(client, steps, index, run_id, latencies, errors):
+    state = {
+        "username": f"load_{run_id}_{index}",
+        "password": "load-test-password",
+        # Vary the profile so completions are not all one cache entry
+        "age": 20 + index % 50,
+        "weight": 130 + index % 90,
+    }
+    for name in steps:
+        start = time.perf_counter()
+        try:
+            response = await STEPS[name](client, state)
+            status = response.status_code
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        latencies.setdefault(name, []).append(time.perf_counter() - start)
+        if status != 200:
+            errors.setdefault(name, {}).setdefault(str(status), 0)
+            errors[name][str(status)] += 1
+            return False
+    return True
+
+
+async def run_load(args, url):
+    steps = JOURNEYS[args.journey]
+    run_id = uuid.uuid4().hex[:8]
+    latencies, errors = {}, {}
+    semaphore = asyncio.Semaphore(args.concurrency)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    async with httpx.AsyncClient(base_url=url, timeout=args.timeout, limits=limits) as client:
+        lag_before = await server_lag_buckets(client)
+
+        async def one(index):
+            async with semaphore:
+                return await run_journey(client, steps, index, run_id, latencies, errors)
+
+        stop = asyncio.Event()
+        client_lag = []
+        sampler = asyncio.create_task(sample_loop_lag(stop, client_lag))
+        start = time.perf_counter()
+        outcomes = await asyncio.gather(*(one(i) for i in range(args.users)))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await sampler
+        lag_after = await server_lag_buckets(client)
+
+    requests = sum(len(v) for v in latencies.values())
+    error_count = sum(sum(v.values()) for v in errors.values())
+    return {
+        "duration_seconds": round(elapsed, 3),
+        "journeys": {
+            "completed": sum(outcomes),
+            "failed": len(outcomes) - sum(outcomes),
+            "per_second": round(sum(outcomes) / elapsed, 3),
+        },
+        "requests": {
+            "total": requests,
+            "errors": error_count,
+            "per_second": round(requests / elapsed, 3),
+        },
+        "steps": {
+            name: dict(summarize(latencies.get(name, [])), errors=errors.get(name, {}))
+            for name in dict.fromkeys(steps)
+        },
+        "loop_lag": {
+            "client": summarize(client_lag),
+            # Only one worker's histogram when running several workers
+            "server": bucket_summary(lag_before, lag_after) if lag_after is not None else None,
+        },
+    }
+
+
+def print_report(result):
+    meta = result["meta"]
+    print(
+        f"{meta['journey']} journey, {meta['users']} users, concurrency {meta['concurrency']}, "
+        f"{meta['workers']} worker(s), {meta['database']}"
+    )
+    print(f"{'step':<12} {'count':>7} {'errors':>7} {'p50':>10} {'p95':>10} {'p99':>10}")
+    for name, stats in result["steps"].items():
+        if not stats["count"]:
+            continue
+        print(
+            f"{name:<12} {stats['count']:>7} {sum(stats['errors'].values()):>7} "
+            f"{stats['p50_ms']:>7.1f} ms {stats['p95_ms']:>7.1f} ms {stats['p99_ms']:>7.1f} ms"
+        )
+    print(
+        f"journeys: {result['journeys']['completed']} ok, {result['journeys']['failed']} failed, "
+        f"{result['journeys']['per_second']:.2f}/s; requests: {result['requests']['per_second']:.1f}/s "
+        f"in {result['duration_seconds']:.1f} s"
+    )
+    client = result["loop_lag"]["client"]
+    print(f"load generator loop lag: p99 {client.get('p99_ms', 0):.1f} ms, max {client.get('max_ms', 0):.1f} ms")
+    server = result["loop_lag"]["server"]
+    if server and server.get("samples"):
+        print(f"server loop lag: p50 <= {server['p50_ms_upper']} ms, p99 <= {server['p99_ms_upper']} ms")
+
+
+def print_comparison(previous, result):
+    print(f"\ncompared with {previous['meta'].get('commit') or 'previous run'}:")
+    for name, stats in result["steps"].items():
+        old = previous["steps"].get(name)
+        if not old or not old.get("count") or not stats["count"]:
+            continue
+        changes = []
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            delta = (stats[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+            changes.append(f"{key[:3]} {delta:+.1f}%")
+        print(f"{name:<12} " + "  ".join(changes))
+    old_rate = previous["requests"]["per_second"]
+    if old_rate:
+        print(f"{'throughput':<12} {(result['requests']['per_second'] - old_rate) / old_rate * 100:+.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the app with scripted user journeys.")
+    parser.add_argument("--journey", choices=sorted(JOURNEYS), default="full")
+    parser.add_argument("--users", type=int, default=100, help="Journeys to run")
+    parser.add_argument("--concurrency", type=int, default=20, help="Journeys in flight at once")
+    parser.add_argument("--workers", type=int, default=1, help="gunicorn workers")
+    parser.add_argument("--database-url", default=None, help="Default: a fresh SQLite file")
+    parser.add_argument("--app-url", default=None, help="Test an already running app instead of starting one")
+    parser.add_argument("--llm-latency-ms", type=float, default=200)
+    parser.add_argument("--llm-tokens-per-second", type=float, default=0)
+    parser.add_argument("--llm-error-rate", type=float, default=0)
+    parser.add_argument("--cache", action="store_true", help="Leave the completion cache enabled")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--output", default=None, help="Results file (default: benchmarks/results/)")
+    parser.add_argument("--compare", default=None, help="Earlier results file to compare against")
+    args = parser.parse_args()
+
+    processes = []
+    tmpdir = None
+    try:
+        if args.app_url:
+            url = args.app_url.rstrip("/")
+        else:
+            if args.database_url is None:
+                tmpdir = tempfile.TemporaryDirectory()
+                args.database_url = f"sqlite:///{os.path.join(tmpdir.name, 'load_test.db')}"
+            url = start_servers(args, processes)
+        result = asyncio.run(run_load(args, url))
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+        if tmpdir is not None:
+            tmpdir.cleanup()
+
+    commit, dirty = git_revision()
+    result["meta"] = {
+        "commit": commit,
+        "dirty": dirty,
+        "timestamp": datetime.utcnow().isoformat(),
+        "journey": args.journey,
+        "users": args.users,
+        "concurrency": args.concurrency,
+        "workers": args.workers if not args.app_url else None,
+        "database": args.app_url or args.database_url.split(":", 1)[0],
+        "llm_latency_ms": args.llm_latency_ms,
+        "llm_tokens_per_second": args.llm_tokens_per_second,
+        "llm_error_rate": args.llm_error_rate,
+        "cache": args.cache,
+        "python": platform.python_version(),
+    }
+    print_report(result)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"{args.journey}_{(commit or 'nocommit')[:10]}_{stamp}.json")
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(json.load(f), result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.routing import Backend, ModelRouter
+
+# Compares request latency through the model router with and without
+# hedging while the preferred backend has a latency spike. Both backends are
+# in-process fakes; the primary turns slow after --spike-after requests.
+# Example: python benchmarks/model_routing.py --requests 300 --spike-ms 3000
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run(args, hedge):
+    router = ModelRouter([
+        Backend.from_spec({"name": "primary", "kind": "fake", "latency_ms": args.primary_ms, "plan_model": "primary"}),
+        Backend.from_spec({"name": "secondary", "kind": "fake", "latency_ms": args.secondary_ms, "plan_model": "secondary"}),
+    ], hedge=hedge)
+    primary = router.backends[0].gateway.client.chat.completions
+    messages = [{"role": "user", "content": "Generate a personalized meal plan."}]
+    latencies = []
+    served = {}
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one(i):
+        async with semaphore:
+            if i == args.spike_after:
+                primary.latency_ms = args.spike_ms
+            start = time.perf_counter()
+            result = await router.complete(messages)
+            latencies.append(time.perf_counter() - start)
+            served[result.model] = served.get(result.model, 0) + 1
+
+    await asyncio.gather(*(one(i) for i in range(args.requests)))
+    print(f"hedging {'on ' if hedge else 'off'}: "
+          f"p50 {percentile(latencies, 50) * 1000:.0f} ms, "
+          f"p95 {percentile(latencies, 95) * 1000:.0f} ms, "
+          f"p99 {percentile(latencies, 99) * 1000:.0f} ms, "
+          f"max {max(latencies) * 1000:.0f} ms, served {served}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark model routing and hedging with fake backends.")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--primary-ms", type=float, default=100)
+    parser.add_argument("--secondary-ms", type=float, default=300)
+    parser.add_argument("--spike-after", type=int, default=100)
+    parser.add_argument("--spike-ms", type=float, default=3000)
+    args = parser.parse_args()
+    for hedge in (False, True):
+        asyncio.run(run(args, hedge))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.nutrition import compute_targets, nutrition_targets
+
+# Measures nutrition target throughput: one user at a time through the scalar
+# helper, and whole batches through the vectorized path.
+# Example: python benchmarks/nutrition.py --users 1000 --batch-sizes 1000 100000 1000000
+
+
+def random_users(count, seed=0):
+    rng = np.random.default_rng(seed)
+    return (
+        rng.integers(18, 80, count),
+        rng.uniform(58, 78, count),
+        rng.uniform(100, 300, count),
+        rng.integers(0, 3, count),
+    )
+
+
+def bench_per_user(count):
+    ages, heights, weights, goals = random_users(count)
+    goal_names = ("maintain", "lose weight", "gain muscle")
+    start = time.perf_counter()
+    for i in range(count):
+        nutrition_targets(int(ages[i]), float(heights[i]), float(weights[i]), goal_names[goals[i]])
+    return count / (time.perf_counter() - start)
+
+
+def bench_bulk(count, repeats=5):
+    ages, heights, weights, goals = random_users(count)
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        compute_targets(ages, heights, weights, goals)
+        best = min(best, time.perf_counter() - start)
+    return count / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the nutrition target engine.")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1000, 100000, 1000000])
+    args = parser.parse_args()
+
+    print(f"per-user: {bench_per_user(args.users):>14,.0f} users/s")
+    for size in args.batch_sizes:
+        print(f"bulk {size:>9,}: {bench_bulk(size):>12,.0f} users/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend import models
+from backend.passwords import PasswordHasher
+
+# Measures login (bcrypt verify) throughput across password pool sizes, and
+# how responsive the event loop stays while the pool is busy.
+# Example: BCRYPT_ROUNDS=10 python benchmarks/password_pool.py --sizes 1 2 4 8
+
+
+async def measure_loop_lag(stop, samples, interval=0.01):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(loop.time() - start - interval)
+
+
+async def run_size(kind, size, logins, hashed):
+    hasher = PasswordHasher(kind=kind, size=size, queue_limit=logins)
+    # Warm the pool so worker start-up is not part of the measurement
+    await asyncio.gather(*(hasher.verify("password", hashed) for _ in range(size)))
+
+    stop = asyncio.Event()
+    lag = []
+    lag_task = asyncio.create_task(measure_loop_lag(stop, lag))
+    start = time.perf_counter()
+    await asyncio.gather(*(hasher.verify("password", hashed) for _ in range(logins)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await lag_task
+    hasher.shutdown()
+    return logins / elapsed, max(lag) if lag else 0.0
+
+
+async def run(args):
+    hashed = models.User.get_password_hash("password")
+    print(f"bcrypt rounds: {models.pwd_context.to_dict()['bcrypt__rounds']}, pool kind: {args.kind}")
+    print(f"{'pool size':>10} {'logins/s':>10} {'max loop lag':>14}")
+    for size in args.sizes:
+        throughput, lag = await run_size(args.kind, size, args.logins, hashed)
+        print(f"{size:>10} {throughput:>10.1f} {lag * 1000:>11.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark password verification pool sizes.")
+    parser.add_argument("--kind", choices=["thread", "process"], default="thread")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--logins", type=int, default=64)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.semantic_cache import SemanticCache
+
+# Measures semantic cache lookup and insert cost at a given size, and which
+# paraphrases hit (and which different questions wrongly would) at the
+# configured threshold.
+# Example: python benchmarks/semantic_cache.py --entries 10000 --contexts 200
+
+FOODS = ["chicken", "tofu", "salmon", "beef", "rice", "quinoa", "oats", "eggs", "lentils", "yogurt"]
+TEMPLATES = [
+    "can I swap {a} for {b}?",
+    "how much {a} should I eat?",
+    "is {a} better than {b} for my goal?",
+    "what can I eat instead of {a}?",
+]
+PAIRS = [
+    ("Can I swap chicken for tofu?", "could I swap the chicken for tofu", True),
+    ("How much protein should I eat?", "how much protein should i eat", True),
+    ("What can I eat instead of salmon?", "what could i eat instead of the salmon", True),
+    ("Can I swap chicken for tofu?", "Can I swap tofu for chicken?", False),
+    ("Can I swap chicken for tofu?", "Can I swap chicken for beef?", False),
+    ("How much protein should I eat?", "How much fat should I eat?", False),
+]
+
+
+def question(rng):
+    a, b = rng.sample(FOODS, 2)
+    return rng.choice(TEMPLATES).format(a=a, b=b) + f" ({rng.randint(0, 10 ** 6)})"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the semantic follow-up cache.")
+    parser.add_argument("--entries", type=int, default=10000)
+    parser.add_argument("--contexts", type=int, default=200)
+    parser.add_argument("--lookups", type=int, default=5000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    cache = SemanticCache(max_entries=args.entries)
+    start = time.perf_counter()
+    for i in range(args.entries):
+        cache.store(question(rng), i % args.contexts, "answer", 1.0)
+    store_us = (time.perf_counter() - start) / args.entries * 1e6
+
+    start = time.perf_counter()
+    for i in range(args.lookups):
+        cache.lookup(question(rng), i % args.contexts)
+    lookup_us = (time.perf_counter() - start) / args.lookups * 1e6
+    print(f"{args.entries} entries, {args.contexts} contexts: store {store_us:.0f} us, lookup {lookup_us:.0f} us")
+
+    print(f"threshold {cache.threshold}")
+    for context, (cached, asked, should_hit) in enumerate(PAIRS, start=-len(PAIRS)):
+        cache.store(cached, context, "answer")
+        hit = cache.lookup(asked, context) is not None
+        similarity = float(cache.vectorizer.transform(cached) @ cache.vectorizer.transform(asked))
+        verdict = "ok" if hit == should_hit else "WRONG"
+        print(f"{similarity:5.3f} {'hit ' if hit else 'miss'} {verdict:<5} {cached!r} / {asked!r}")
+
+
+if __name__ == "__main__":
+    main()
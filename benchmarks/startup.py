@@ -0,0 +1,55 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Measures worker cold start: importing the app in a fresh interpreter, and
+# the schema work each worker used to do (create_all reflecting every table)
+# against what it does now (nothing; migrations ran once before the workers).
+# Example: DATABASE_URL=postgresql://... python benchmarks/startup.py --runs 5
+
+
+def time_subprocess(code, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True, env=dict(os.environ, LOG_LEVEL="WARNING"))
+        samples.append(time.perf_counter() - start)
+    return min(samples), sum(samples) / len(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark app cold start.")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    # Make sure the schema exists so create_all measures reflection only
+    from backend.migrations import migrate
+    migrate()
+
+    cases = [
+        ("python interpreter", "pass"),
+        ("import backend.main", "import backend.main"),
+        (
+            "import + create_all (old)",
+            "import backend.main; from backend import models; from backend.database import get_engine; "
+            "models.Base.metadata.create_all(bind=get_engine())",
+        ),
+        (
+            "import + migration check",
+            "import backend.main; from backend.migrations import pending_migrations; pending_migrations()",
+        ),
+    ]
+    print(f"{'case':<28} {'best':>9} {'mean':>9}")
+    for label, code in cases:
+        best, mean = time_subprocess(code, args.runs)
+        print(f"{label:<28} {best * 1000:>6.0f} ms {mean * 1000:>6.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
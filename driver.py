@@ -4,10 +4,13 @@ import time
 import os
 import platform
 import argparse
-from sqlalchemy import create_engine
+import signal
+import urllib.request
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
 from sqlalchemy_utils import database_exists, create_database
 from backend.config import DATABASE_URL
-from backend.models import Base
+from backend.migrations import drop_schema, migrate
 
 # Add the project root to Python path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -49,10 +52,8 @@ def start_frontend():
 
 def cleanup_database():
     print("Cleaning up database...")
-    engine = create_engine(DATABASE_URL)
-    
-    # Drop all tables
-    Base.metadata.drop_all(bind=engine)
+    # Drop all tables, including the migration history
+    drop_schema()
     print("Database cleaned successfully")
 
 def initialize_database():
@@ -64,9 +65,9 @@ def initialize_database():
         create_database(engine.url)
         print("Database created successfully")
     
-    # Create all tables
-    Base.metadata.create_all(bind=engine)
-    print("Database tables created successfully")
+    # Apply pending schema migrations once, before any worker starts
+    applied = migrate()
+    print(f"Applied migrations: {applied}" if applied else "Database schema is up to date")
 
 def start_postgres():
     pass
@@ -105,6 +106,84 @@ def start_postgres():
     #             print("sudo brew servieces start postgresql")
     #     time.sleep(3)  # Wait for service to start 
 
+def server_url(url):
+    # The app's database may not exist yet (initialize_database creates it),
+    # so readiness is probed on the server's maintenance database
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend == "postgresql":
+        return url.set(database="postgres")
+    if backend == "mysql":
+        return url.set(database=None)
+    return url
+
+def wait_for_database(timeout=60):
+    # Startup is gated on the database server accepting connections
+    print("Waiting for the database...")
+    engine = create_engine(server_url(DATABASE_URL))
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            try:
+                with engine.connect() as conn:
+                    conn.execute(text("SELECT 1"))
+                print("Database is ready")
+                return True
+            except Exception as e:
+                if time.monotonic() >= deadline:
+                    print(f"Database not ready after {timeout}s: {str(e)}")
+                    return False
+                time.sleep(1)
+    finally:
+        engine.dispose()
+
+def wait_for_health(url, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            return False
+        try:
+            with urllib.request.urlopen(url, timeout=2) as response:
+                if response.status == 200:
+                    return True
+        except Exception:
+            pass
+        time.sleep(0.5)
+    return False
+
+def start_production_server(workers=None):
+    # gunicorn supervising uvicorn workers; the API also serves the frontend
+    command = [
+        sys.executable, "-m", "gunicorn", "backend.main:app",
+        "-c", os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend", "gunicorn_conf.py"),
+        "--bind", f"0.0.0.0:{BACKEND_PORT}",
+    ]
+    if workers:
+        command += ["--workers", str(workers)]
+    env = dict(os.environ, SERVE_FRONTEND="true")
+    print(f"Starting production server on port {BACKEND_PORT}")
+    return subprocess.Popen(command, env=env)
+
+def run_production(args):
+    server = start_production_server(args.workers)
+
+    # SIGHUP: graceful reload (new workers start, old ones finish their
+    # requests). SIGTERM/SIGINT: graceful shutdown.
+    def forward(signum, frame):
+        if server.poll() is None:
+            server.send_signal(signal.SIGTERM if signum == signal.SIGINT else signum)
+
+    for signum in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, forward)
+
+    if wait_for_health(f"http://127.0.0.1:{BACKEND_PORT}/health/ready", server):
+        print(f"\nApplication running at: http://localhost:{BACKEND_PORT}/login.html")
+        print(f"Send SIGHUP to {os.getpid()} (or gunicorn {server.pid}) to reload gracefully")
+    else:
+        print("Server did not become healthy")
+        forward(signal.SIGTERM, None)
+    return server.wait()
+
 def start_fastapi(debug=False):
     print(f"Starting FastAPI application on port {BACKEND_PORT}")
     command = ["uvicorn", "backend.main:app", "--reload", f"--port={BACKEND_PORT}"]
@@ -115,6 +194,67 @@ def start_fastapi(debug=False):
 
     return subprocess.Popen(command)
 
+def start_job_worker():
+    print("Starting background job worker")
+    return subprocess.Popen([sys.executable, "-m", "backend.jobs"])
+
+def run_batch_generation(args):
+    import asyncio
+    from backend.batch import run_batch
+    from backend.llm import close_gateway
+
+    async def run():
+        try:
+            return await run_batch(
+                chunk_size=args.batch_chunk_size,
+                concurrency=args.batch_concurrency,
+                checkpoint_path=args.checkpoint,
+                resume=args.resume,
+                only_missing=args.only_missing,
+                use_cache=args.use_cache,
+                limit=args.batch_limit,
+            )
+        finally:
+            await close_gateway()
+
+    report = asyncio.run(run())
+    print(
+        f"Batch finished: {report.succeeded} succeeded, {report.failed} failed, "
+        f"{report.skipped} skipped in {report.elapsed:.1f}s "
+        f"({report.processed / max(report.elapsed, 1e-9):.1f} users/s)"
+    )
+    if report.failed_ids:
+        print(f"Failed user ids: {report.failed_ids}")
+    return report
+
+def run_user_import(args):
+    import asyncio
+    from backend.passwords import PasswordHasher
+    from backend.users import detect_format, import_users, read_rows
+
+    # Processes so bcrypt runs on every core; the queue only has to hold one
+    # chunk's hashes
+    hasher = PasswordHasher(kind="process", size=args.import_workers or os.cpu_count() or 1, queue_limit=args.import_chunk_size)
+    try:
+        with open(args.import_users, newline="", encoding="utf-8") as f:
+            rows = read_rows(f, args.import_format or detect_format(args.import_users))
+            report = asyncio.run(import_users(
+                rows, hasher,
+                chunk_size=args.import_chunk_size,
+                concurrency=hasher.size * 2,
+                progress=print,
+            ))
+    finally:
+        hasher.shutdown()
+    print(
+        f"Import finished: {report.read} rows, {report.inserted} inserted, "
+        f"{report.duplicates} duplicates, {report.invalid} invalid in {report.elapsed:.1f}s "
+        f"({report.rows_per_second:.1f} rows/s)"
+    )
+    for error in report.errors:
+        print(f"Line {error['line']}: {error['error']}")
+    return report
+
 def check_env_file():
     env_path = os.path.join(os.path.dirname(__file__), 'backend', '.env')
     if not os.path.exists(env_path):
@@ -127,8 +267,34 @@ def main():
     parser = argparse.ArgumentParser(description="Start the Nutrition.io app.")
     parser.add_argument("-d", "--debug", action="store_true", help="Run FastAPI backend in debug mode")
     parser.add_argument("--clear-db", action="store_true", help="Clear the database on startup")
+    parser.add_argument("--job-worker", action="store_true", help="Run meal plan jobs in a separate worker process")
+    parser.add_argument("--production", action="store_true", help="Run multiple gunicorn/uvicorn workers and serve the frontend from the API")
+    parser.add_argument("--workers", type=int, default=None, help="Production worker count (default: CPU count)")
+    parser.add_argument("--db-timeout", type=int, default=60, help="Seconds to wait for the database at startup")
+    batch = parser.add_argument_group("batch generation", "Regenerate meal plans for all users instead of starting the servers")
+    batch.add_argument("--batch-generate", action="store_true", help="Regenerate meal plans for users in the database")
+    batch.add_argument("--batch-chunk-size", type=int, default=100, help="Users read and written per transaction")
+    batch.add_argument("--batch-concurrency", type=int, default=8, help="Concurrent completions")
+    batch.add_argument("--batch-limit", type=int, default=None, help="Stop after this many users")
+    batch.add_argument("--checkpoint", default="batch_checkpoint.json", help="Progress file used to resume")
+    batch.add_argument("--resume", action="store_true", help="Continue after the last user in the checkpoint")
+    batch.add_argument("--only-missing", action="store_true", help="Only users without a meal plan")
+    batch.add_argument("--use-cache", action="store_true", help="Reuse cached completions for identical profiles")
+    user_import = parser.add_argument_group("user import", "Bulk-import users instead of starting the servers")
+    user_import.add_argument("--import-users", metavar="PATH", help="CSV or JSONL file of users")
+    user_import.add_argument("--import-format", choices=["csv", "jsonl"], default=None, help="Default: from the file extension")
+    user_import.add_argument("--import-chunk-size", type=int, default=500, help="Users inserted per statement")
+    user_import.add_argument("--import-workers", type=int, default=None, help="Password hashing processes (default: CPU count)")
     args = parser.parse_args()
 
+    if args.batch_generate:
+        run_batch_generation(args)
+        return
+
+    if args.import_users:
+        run_user_import(args)
+        return
+
     try:
         # Check environment setup
         if not check_env_file():
@@ -136,6 +302,8 @@ def main():
 
         # Start PostgreSQL
         start_postgres()
+        if not wait_for_database(args.db_timeout):
+            return
         
         # Database cleanup
         if args.clear_db:
@@ -144,10 +312,25 @@ def main():
         # Initialize database
         initialize_database()
         
+        if args.production:
+            if args.job_worker:
+                os.environ["JOB_WORKER_MODE"] = "external"
+                worker_process = start_job_worker()
+            run_production(args)
+            if args.job_worker:
+                worker_process.terminate()
+            return
+        
         # Start Frontend
         frontend_process = start_frontend()
         print(f"\nApplication running at: http://localhost:{FRONTEND_PORT}/login.html")
         
+        # Start the job worker; the API then only enqueues jobs
+        worker_process = None
+        if args.job_worker:
+            os.environ["JOB_WORKER_MODE"] = "external"
+            worker_process = start_job_worker()
+        
         # Start FastAPI
         backend_process = start_fastapi(debug=args.debug)
         print(f"Backend running at: http://localhost:{BACKEND_PORT}")
@@ -156,6 +339,8 @@ def main():
         # Wait for processes
         frontend_process.wait()
         backend_process.wait()
+        if worker_process:
+            worker_process.wait()
     except: 
         pass
 if __name__ == "__main__":
@@ -9,21 +9,47 @@ function createMessageElement(text, className = '') {
     return div;
 }
 
+// Swaps the refresh token for a new token pair; returns false if it was rejected
+async function refreshTokens() {
+    const refreshToken = localStorage.getItem('refresh_token');
+    if (!refreshToken) {
+        return false;
+    }
+    const response = await fetch(`${API_BASE_URL}/token/refresh`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ refresh_token: refreshToken }),
+    });
+    if (!response.ok) {
+        return false;
+    }
+    const data = await response.json();
+    localStorage.setItem('token', data.access_token);
+    localStorage.setItem('refresh_token', data.refresh_token);
+    return true;
+}
+
 // Update the makeApiRequest function
 async function makeApiRequest(endpoint, data) {
-    const headers = { 'Content-Type': 'application/json' };
-    const token = localStorage.getItem('token');
-    
-    if (token) {
-        headers['Authorization'] = `Bearer ${token}`;
-    }
-
-    try {
-        const response = await fetch(`${API_BASE_URL}${endpoint}`, {
+    const send = () => {
+        const headers = { 'Content-Type': 'application/json' };
+        const token = localStorage.getItem('token');
+        if (token) {
+            headers['Authorization'] = `Bearer ${token}`;
+        }
+        return fetch(`${API_BASE_URL}${endpoint}`, {
             method: 'POST',
             headers: headers,
             body: JSON.stringify(data),
         });
+    };
+
+    try {
+        let response = await send();
+        // Access tokens are short-lived; retry once with a refreshed one
+        if (response.status === 401 && await refreshTokens()) {
+            response = await send();
+        }
 
         if (!response.ok) {
             const errorData = await response.json();
@@ -136,13 +162,8 @@ class ChatInterface {
             this.displayMessage(mealPlan, 'assistant-message');
         }
 
-        this.conversation = [
-            { role: 'system', content: 'You are a dietician that should be polite and helpful.' }
-        ];
-
-        if (mealPlan) {
-            this.conversation.push({ role: 'assistant', content: mealPlan });
-        }
+        // History lives on the server; we only keep the conversation id
+        this.conversationId = null;
 
         this.setupEventListeners();
     }
@@ -168,14 +189,16 @@ class ChatInterface {
         try {
             // Display user message
             this.displayMessage(`You: ${userMessage}`, 'user-message');
-            this.conversation.push({ role: 'user', content: userMessage });
 
             // Add loading indicator
             const loadingElement = createMessageElement('Assistant is typing...', 'loading-message');
             this.chatBox.appendChild(loadingElement);
 
             // Get assistant response
-            const response = await makeApiRequest('/follow-up', { conversation: this.conversation });
+            const response = await makeApiRequest('/follow-up', {
+                conversation_id: this.conversationId,
+                message: userMessage
+            });
             
             // Remove loading indicator
             loadingElement.remove();
@@ -183,7 +206,7 @@ class ChatInterface {
             // Display assistant response
             if (response && response.response) {
                 this.displayMessage(`Assistant: ${response.response}`, 'assistant-message');
-                this.conversation.push({ role: 'assistant', content: response.response });
+                this.conversationId = response.conversation_id;
             } else {
                 throw new Error('Invalid response format');
             }
@@ -281,6 +304,7 @@ class AuthManager {
 
             const data = await response.json();
             localStorage.setItem('token', data.access_token);
+            localStorage.setItem('refresh_token', data.refresh_token);
             localStorage.setItem('username', username);
             
             // Redirect to dashboard instead of index
@@ -297,7 +321,21 @@ class AuthManager {
     }
 
     static logout() {
+        const token = localStorage.getItem('token');
+        if (token) {
+            // Revoke both tokens server-side; nothing to do if this fails
+            fetch(`${API_BASE_URL}/logout`, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'Authorization': `Bearer ${token}`
+                },
+                body: JSON.stringify({ refresh_token: localStorage.getItem('refresh_token') }),
+                keepalive: true,
+            }).catch(() => {});
+        }
         localStorage.removeItem('token');
+        localStorage.removeItem('refresh_token');
         localStorage.removeItem('username');
         window.location.href = 'login.html';
     }
@@ -0,0 +1,83 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Settings are read when backend.config is imported, so the test environment
+# is fixed here, before any backend module loads
+DB_PATH = os.path.join(tempfile.mkdtemp(prefix="mealplan-tests-"), "test.db")
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{DB_PATH}",
+    "DB_AUTO_MIGRATE": "true",
+    "SECRET_KEY": "test-secret",
+    "LLM_BACKEND": "fake",
+    "LLM_BACKENDS": "",
+    "LLM_FAKE_LATENCY_MS": "0",
+    "BCRYPT_ROUNDS": "4",
+    "ADMIN_USERNAMES": "admin",
+    "LOG_LEVEL": "WARNING",
+    "LOG_FORMAT": "text",
+    "TRACE_SAMPLE_RATE": "0",
+    "EVENT_LOOP_LAG_INTERVAL_SECONDS": "0",
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend import metrics, models  # noqa: E402
+from backend.database import SessionLocal, get_engine  # noqa: E402
+from backend.migrations import migrate  # noqa: E402
+
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    migrate()
+    yield
+    get_engine().dispose()
+
+
+@pytest.fixture(autouse=True)
+def clean_tables():
+    yield
+    with get_engine().begin() as conn:
+        for table in reversed(models.Base.metadata.sorted_tables):
+            conn.execute(table.delete())
+    metrics.reset()
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def client():
+    from fastapi.testclient import TestClient
+    from backend.main import app
+
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def register(client, username="alice", email=None, password="pw", goal="lose weight"):
+    return client.post("/register", json={
+        "username": username,
+        "email": email or f"{username}@example.com",
+        "password": password,
+        "first_name": "Test",
+        "last_name": "User",
+        "birthday": "1990-01-01",
+        "age": 34,
+        "height": 170,
+        "weight": 70,
+        "goal": goal,
+    })
+
+
+def login(client, username="alice", password="pw"):
+    response = client.post("/token", data={"username": username, "password": password})
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
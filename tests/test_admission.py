@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from backend import admission
+from backend.admission import AdaptiveLimiter, AdmissionMiddleware, Limiter, Shed, classify
+
+
+def test_classify():
+    assert classify("/health") is None
+    assert classify("/generate-meal-plan/stream") == "llm"
+    assert classify("/follow-up") == "llm"
+    assert classify("/token") == "auth"
+    assert classify("/jobs/abc/events") == "events"
+    assert classify("/user/me") == "read"
+
+
+def test_waiters_are_served_by_priority():
+    async def scenario():
+        limiter = Limiter("test", 1, max_queue=10, queue_timeout=1)
+        await limiter.acquire()
+        order = []
+
+        async def wait(priority, name):
+            await limiter.acquire(priority)
+            order.append(name)
+            limiter.release()
+
+        tasks = [asyncio.create_task(wait(2, "llm")), asyncio.create_task(wait(0, "read"))]
+        await asyncio.sleep(0)
+        limiter.release()
+        await asyncio.gather(*tasks)
+        return order, limiter.inflight
+
+    assert asyncio.run(scenario()) == (["read", "llm"], 0)
+
+
+def test_full_queue_and_timeout_shed():
+    async def scenario():
+        limiter = Limiter("test", 1, max_queue=1, queue_timeout=0.05)
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(Shed) as full:
+            await limiter.acquire()
+        with pytest.raises(Shed) as timeout:
+            await waiter
+        return full.value, timeout.value, limiter.inflight
+
+    full, timeout, inflight = asyncio.run(scenario())
+    assert full.reason == "queue_full" and full.retry_after >= 1
+    assert timeout.reason == "queue_timeout"
+    assert inflight == 1
+
+
+def test_adaptive_limit_shrinks_while_slow(monkeypatch):
+    monkeypatch.setattr(admission, "ADJUST_INTERVAL_SECONDS", 0)
+
+    async def scenario():
+        limiter = AdaptiveLimiter("llm", 10, max_queue=0, min_limit=2, max_limit=20, target_latency=1.0)
+        for _ in range(5):
+            await limiter.acquire()
+            limiter.release(latency=5.0)
+        return limiter.limit
+
+    assert asyncio.run(scenario()) == 2
+
+
+def test_middleware_sheds_with_retry_after():
+    class Busy:
+        async def admit(self, route_class):
+            raise Shed(route_class, "queue_full", 7)
+
+    async def app(scope, receive, send):
+        raise AssertionError("shed request reached the app")
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    middleware = AdmissionMiddleware(app, controller=Busy())
+    asyncio.run(middleware({"type": "http", "path": "/generate-meal-plan"}, None, send))
+    assert sent[0]["status"] == 503
+    assert (b"retry-after", b"7") in sent[0]["headers"]
@@ -0,0 +1,79 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from jose import jwt
+
+from backend import auth, models
+from conftest import login, register
+
+
+def test_tokens_signed_with_any_configured_key_verify(monkeypatch):
+    monkeypatch.setattr(auth, "signing_keys", {"old": "old-secret", "new": "new-secret", auth.LEGACY_KID: "test-secret"})
+    monkeypatch.setattr(auth, "active_kid", "old")
+    old_token = auth.create_access_token("alice", 1)
+    monkeypatch.setattr(auth, "active_kid", "new")
+    new_token = auth.create_access_token("alice", 1)
+
+    assert jwt.get_unverified_header(new_token)["kid"] == "new"
+    assert auth.decode_token(old_token, auth.ACCESS)["sub"] == "alice"
+    assert auth.decode_token(new_token, auth.ACCESS)["sub"] == "alice"
+
+    # Retiring a key invalidates the tokens it signed
+    monkeypatch.setattr(auth, "signing_keys", {"new": "new-secret"})
+    with pytest.raises(auth.AuthError):
+        auth.decode_token(old_token, auth.ACCESS)
+
+
+def test_legacy_tokens_without_kid_use_secret_key():
+    token = jwt.encode({"sub": "alice", "exp": datetime.utcnow() + timedelta(minutes=5)}, "test-secret", algorithm="HS256")
+    assert auth.decode_token(token, auth.ACCESS)["sub"] == "alice"
+
+
+def test_refresh_token_is_not_an_access_token(db):
+    tokens = auth.issue_tokens(db, 1, "alice")
+    with pytest.raises(auth.AuthError):
+        auth.verify_access_token(tokens["refresh_token"])
+
+
+def test_refresh_rotates_and_rejects_reuse(client):
+    register(client)
+    tokens = client.post("/token", data={"username": "alice", "password": "pw"}).json()
+    refreshed = client.post("/token/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert refreshed.status_code == 200
+    assert refreshed.json()["refresh_token"] != tokens["refresh_token"]
+
+    reused = client.post("/token/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert reused.status_code == 401
+    headers = {"Authorization": f"Bearer {refreshed.json()['access_token']}"}
+    assert client.get("/user/me", headers=headers).status_code == 200
+
+
+def test_logout_revokes_cached_access_token_and_refresh_token(client):
+    register(client)
+    tokens = client.post("/token", data={"username": "alice", "password": "pw"}).json()
+    headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+    # Verified once, so the next check is a cache hit
+    assert client.get("/user/me", headers=headers).status_code == 200
+
+    response = client.post("/logout", json={"refresh_token": tokens["refresh_token"]}, headers=headers)
+    assert response.status_code == 200
+    assert client.get("/user/me", headers=headers).status_code == 401
+    assert client.post("/token/refresh", json={"refresh_token": tokens["refresh_token"]}).status_code == 401
+    # Other sessions are unaffected
+    assert client.get("/user/me", headers=login(client)).status_code == 200
+
+
+def test_revocations_sync_from_other_workers(db):
+    jti = uuid.uuid4().hex
+    revocations = auth.RevocationList()
+    revocations.sync(db)
+    assert jti not in revocations
+
+    now = datetime.utcnow()
+    db.add(models.RevokedToken(jti=jti, expires_at=now + timedelta(minutes=5), revoked_at=now))
+    db.add(models.RevokedToken(jti=uuid.uuid4().hex, expires_at=now - timedelta(minutes=1), revoked_at=now))
+    db.commit()
+    revocations.sync(db)
+    assert jti in revocations
+    assert len(revocations) == 1
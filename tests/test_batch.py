@@ -0,0 +1,50 @@
+import asyncio
+import json
+
+from backend import models
+from backend.batch import fetch_user_chunk, run_batch
+from backend.identity import load_meal_plan, store_meal_plan
+from backend.users import import_users
+from conftest import register
+
+
+def test_registered_users_have_no_plan_sentinel(client, db):
+    register(client, "alice")
+    user = db.query(models.User).filter_by(username="alice").one()
+    assert user.current_meal_plan == models.NO_MEAL_PLAN
+
+
+def test_only_missing_selects_registered_and_imported_users(client, db):
+    register(client, "alice")
+    register(client, "bob")
+
+    class Hasher:
+        size, queue_limit = 1, 8
+
+        async def hash(self, password):
+            return "hashed"
+
+    asyncio.run(import_users([(1, {"username": "carol", "email": "carol@example.com", "password": "pw"})], Hasher()))
+    bob = db.query(models.User).filter_by(username="bob").one()
+    store_meal_plan(db, bob.id, "bob", "# Existing plan", "generate")
+
+    missing = {row.username for row in fetch_user_chunk(db, 0, 100, only_missing=True)}
+    assert missing == {"alice", "carol"}
+    assert len(fetch_user_chunk(db, 0, 100)) == 3
+
+
+def test_run_batch_only_missing_fills_in_plans(client, db, tmp_path):
+    register(client, "alice")
+    register(client, "bob")
+    bob = db.query(models.User).filter_by(username="bob").one()
+    store_meal_plan(db, bob.id, "bob", "# Existing plan", "generate")
+    checkpoint = tmp_path / "checkpoint.json"
+
+    report = asyncio.run(run_batch(chunk_size=1, only_missing=True, checkpoint_path=str(checkpoint), progress=lambda _: None))
+
+    assert report.succeeded == 1
+    alice = db.query(models.User).filter_by(username="alice").one()
+    db.expire_all()
+    assert load_meal_plan(db, alice.id).startswith("# Meal Plan")
+    assert load_meal_plan(db, bob.id) == "# Existing plan"
+    assert json.loads(checkpoint.read_text())["last_user_id"] == alice.id
@@ -0,0 +1,68 @@
+from backend.cache import MemoryTier, ResponseCache, SQLTier, cache_key
+from backend.singleflight import get_single_flight
+from conftest import login, register
+
+
+def messages(text):
+    return [{"role": "system", "content": "You are a dietitian."}, {"role": "user", "content": text}]
+
+
+def test_cache_key_ignores_whitespace_and_case():
+    assert cache_key("plan", messages("Plan  for\nME")) == cache_key("plan", messages("plan for me"))
+    assert cache_key("plan", messages("plan for me")) != cache_key("follow_up", messages("plan for me"))
+    assert cache_key("plan", messages("plan for me")) != cache_key("plan", messages("plan for you"))
+
+
+def test_memory_tier_evicts_least_recently_used():
+    tier = MemoryTier(max_entries=2, ttl=60)
+    tier.set("a", "1")
+    tier.set("b", "2")
+    assert tier.get("a") == "1"
+    tier.set("c", "3")
+    assert tier.get("b") is None
+    assert tier.get("a") == "1"
+    assert tier.get("c") == "3"
+
+
+def test_memory_tier_expires_entries():
+    tier = MemoryTier(max_entries=10, ttl=-1)
+    tier.set("a", "1")
+    assert tier.get("a") is None
+
+
+def test_sql_hit_is_promoted_to_memory():
+    memory = MemoryTier(max_entries=10, ttl=60)
+    sql = SQLTier()
+    sql.set("key", "value", model="m")
+    cache = ResponseCache([memory, sql])
+    assert memory.get("key") is None
+    assert cache.get("key") == "value"
+    assert memory.get("key") == "value"
+
+
+def test_generate_meal_plan_is_served_from_cache(client):
+    register(client)
+    headers = login(client)
+    profile = {"username": "alice", "age": 34, "height": 170, "weight": 70, "goal": "lose weight", "planType": "new"}
+    first = client.post("/generate-meal-plan", json=profile, headers=headers).json()
+    # Outside the single-flight window the second call is a cache hit
+    get_single_flight()._calls.clear()
+    second = client.post("/generate-meal-plan", json=profile, headers=headers).json()
+    assert first["mealPlan"] == second["mealPlan"]
+    assert second["cached"] is True
+
+
+def test_model_change_misses_the_cache(client, monkeypatch):
+    from backend.llm import get_gateway
+    from backend.routing import PLAN
+
+    register(client)
+    headers = login(client)
+    profile = {"username": "alice", "age": 34, "height": 170, "weight": 70, "goal": "lose weight", "planType": "new"}
+    client.post("/generate-meal-plan", json=profile, headers=headers)
+    get_single_flight()._calls.clear()
+    assert client.post("/generate-meal-plan", json=profile, headers=headers).json()["cached"] is True
+
+    monkeypatch.setattr(get_gateway().routes[PLAN][0], "model", "another-model")
+    get_single_flight()._calls.clear()
+    assert client.post("/generate-meal-plan", json=profile, headers=headers).json()["cached"] is False
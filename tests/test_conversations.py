@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+
+from backend import conversations, models
+from backend.conversations import add_message, build_context, get_or_create_conversation, summarize_conversation
+from conftest import login, register
+
+
+class Reply:
+    def __init__(self, content):
+        self.content = content
+
+
+class SummaryGateway:
+    def __init__(self):
+        self.transcripts = []
+
+    async def complete(self, messages, **kwargs):
+        self.transcripts.append(messages[-1]["content"])
+        return Reply(f"summary {len(self.transcripts)}")
+
+
+@pytest.fixture
+def conversation(db):
+    user = models.User(username="alice", email="alice@example.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+    conversation = get_or_create_conversation(db, user.id, None)
+    for i in range(10):
+        # 10 tokens each
+        add_message(db, conversation, "user" if i % 2 == 0 else "assistant", f"turn {i:02d} ".ljust(40, "x"))
+    db.commit()
+    return conversation
+
+
+def ids(db, conversation):
+    return [
+        message_id for (message_id,) in db.query(models.ConversationMessage.id)
+        .filter(models.ConversationMessage.conversation_id == conversation.id)
+        .order_by(models.ConversationMessage.id)
+    ]
+
+
+def test_window_keeps_newest_turns_within_budget(db, conversation, monkeypatch):
+    monkeypatch.setattr(conversations, "CONVERSATION_SUMMARY_TRIGGER_TOKENS", 20)
+    context = build_context(db, conversation, "sys", budget=35)
+    # System prompt (1 token) plus the three newest turns
+    assert context.tokens == 31
+    assert [m["content"][:7] for m in context.messages[1:]] == ["turn 07", "turn 08", "turn 09"]
+    # Everything older falls out of the window and is due for summarizing
+    assert context.summarize_through == ids(db, conversation)[6]
+
+
+def test_small_overflow_is_not_summarized_yet(db, conversation):
+    context = build_context(db, conversation, "sys", budget=95)
+    assert len(context.messages) == 10
+    assert context.summarize_through is None
+
+
+def test_window_is_capped_by_message_count(db, conversation, monkeypatch):
+    monkeypatch.setattr(conversations, "CONVERSATION_MAX_MESSAGES", 4)
+    context = build_context(db, conversation, "sys", budget=10_000)
+    assert len(context.messages) == 5
+    assert context.summarize_through is None
+
+
+def test_older_turns_fold_into_a_persisted_summary(db, conversation, monkeypatch):
+    gateway = SummaryGateway()
+    monkeypatch.setattr(conversations, "get_gateway", lambda: gateway)
+    monkeypatch.setattr(conversations, "CONVERSATION_SUMMARY_TRIGGER_TOKENS", 20)
+    message_ids = ids(db, conversation)
+
+    through = build_context(db, conversation, "sys", budget=35).summarize_through
+    asyncio.run(summarize_conversation(conversation.id, through))
+    assert "turn 00" in gateway.transcripts[0] and "turn 06" in gateway.transcripts[0]
+    assert "turn 07" not in gateway.transcripts[0]
+
+    db.expire_all()
+    stored = db.get(models.Conversation, conversation.id)
+    assert (stored.summary, stored.summarized_through) == ("summary 1", message_ids[6])
+
+    # Later turns see the summary in place of the folded messages
+    context = build_context(db, stored, "sys", budget=35)
+    assert context.messages[1] == {"role": "system", "content": "Summary of the earlier conversation: summary 1"}
+    assert all("turn 0" + str(i) not in m["content"] for m in context.messages for i in range(7))
+
+    # The next summary builds on the stored one rather than the raw turns
+    for i in range(10, 14):
+        add_message(db, stored, "user", f"turn {i} ".ljust(40, "x"))
+    db.commit()
+    through = build_context(db, stored, "sys", budget=35).summarize_through
+    asyncio.run(summarize_conversation(stored.id, through))
+    assert gateway.transcripts[1].startswith("Earlier summary: summary 1")
+    assert "turn 00" not in gateway.transcripts[1]
+    db.expire_all()
+    assert db.get(models.Conversation, conversation.id).summary == "summary 2"
+
+
+def test_follow_up_sends_only_the_new_message(client):
+    register(client)
+    headers = login(client)
+    first = client.post("/follow-up", json={"message": "Can I eat eggs?"}, headers=headers).json()
+    second = client.post(
+        "/follow-up", json={"conversation_id": first["conversation_id"], "message": "And cheese?"}, headers=headers
+    ).json()
+    assert second["conversation_id"] == first["conversation_id"]
+    assert second["context_tokens"] > first["context_tokens"]
+
+    register(client, "bob")
+    other = client.post(
+        "/follow-up", json={"conversation_id": first["conversation_id"], "message": "hi"}, headers=login(client, "bob")
+    )
+    assert other.status_code == 404
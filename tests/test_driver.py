@@ -0,0 +1,12 @@
+import driver
+
+
+def test_readiness_probe_uses_maintenance_database():
+    url = driver.server_url("postgresql://app:secret@db:5432/nutritiondb")
+    assert url.database == "postgres"
+    assert (url.host, url.port, url.username) == ("db", 5432, "app")
+    assert driver.server_url("sqlite:///test.db").database == "test.db"
+
+
+def test_wait_for_database_succeeds_when_server_is_up():
+    assert driver.wait_for_database(timeout=1)
@@ -0,0 +1,84 @@
+import os
+
+import numpy as np
+import pytest
+
+from backend import foods
+from backend.foods import build_cache, load_food_database
+
+CSV = """name,calories,protein,carbs,fat,fiber
+Chicken Breast,165,31,0,3.6,0
+Chickpeas,164,8.9,27,2.6,7.6
+Brown Rice,112,2.6,24,0.9,1.8
+Broccoli,34,2.8,7,0.4,2.6
+Olive Oil,884,0,0,100,0
+"""
+
+
+@pytest.fixture
+def paths(tmp_path):
+    data = tmp_path / "foods.csv"
+    data.write_text(CSV)
+    return str(data), str(tmp_path / "cache")
+
+
+def test_cache_is_built_then_memory_mapped(paths):
+    data, cache_dir = paths
+    db = load_food_database(data, cache_dir)
+    assert sorted(os.listdir(cache_dir)) == ["foods_names.npy", "foods_orders.npy", "foods_values.npy"]
+    assert isinstance(db.values, np.memmap)
+    assert len(db) == 5
+
+    # A second load maps the existing files without reparsing the CSV
+    mtime = os.path.getmtime(os.path.join(cache_dir, "foods_values.npy"))
+    again = load_food_database(data, cache_dir)
+    assert os.path.getmtime(os.path.join(cache_dir, "foods_values.npy")) == mtime
+    assert again.get("broccoli") == db.get("broccoli")
+
+
+def test_lookups(paths):
+    db = load_food_database(*paths)
+    assert db.get("  Chicken Breast ") == {
+        "name": "chicken breast", "calories": 165.0, "protein": 31.0, "carbs": 0.0, "fat": 3.6, "fiber": 0.0,
+    }
+    assert db.get("tofu") is None
+    assert db.get("chicken") is None
+    assert [f["name"] for f in db.prefix_search("chick")] == ["chicken breast", "chickpeas"]
+    assert db.prefix_search("zucchini") == []
+    assert db.fuzzy_search("brocoli")[0]["name"] == "broccoli"
+    assert [f["name"] for f in db.range_query("protein", minimum=8)] == ["chickpeas", "chicken breast"]
+    assert [f["name"] for f in db.range_query("calories", maximum=120)] == ["broccoli", "brown rice"]
+
+
+def test_item_macros(paths):
+    db = load_food_database(*paths)
+    assert db.item_macros("- 150g chicken breast with 200 g brown rice")["calories"] == 247.5
+    assert db.item_macros("- 1 oz olive oil")["fat"] == 28.3
+    assert db.item_macros("- 100g tofu") is None
+    assert db.item_macros("- chicken breast") is None
+
+
+def test_stale_cache_is_rebuilt(paths):
+    data, cache_dir = paths
+    load_food_database(data, cache_dir)
+    with open(data, "a") as f:
+        f.write("Tofu,76,8,1.9,4.8,0.3\n")
+    future = os.path.getmtime(data) + 10
+    os.utime(data, (future, future))
+    assert load_food_database(data, cache_dir).get("tofu")["protein"] == 8.0
+
+
+def test_unwritable_cache_falls_back_to_csv(paths, monkeypatch):
+    def fail(*args):
+        raise PermissionError("read-only")
+
+    monkeypatch.setattr(foods, "build_cache", fail)
+    db = load_food_database(*paths)
+    assert db.get("chickpeas")["fiber"] == 7.6
+    assert not isinstance(db.values, np.memmap)
+
+
+def test_build_cache_leaves_no_temporary_files(paths):
+    data, cache_dir = paths
+    build_cache(data, cache_dir)
+    assert not [name for name in os.listdir(cache_dir) if name.endswith(".tmp")]
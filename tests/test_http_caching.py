@@ -0,0 +1,89 @@
+import pytest
+
+from backend import compression
+from backend.compression import choose_encoding
+from backend.fake_llm import fake_meal_plan
+from conftest import login, register
+
+
+@pytest.fixture
+def headers(client):
+    register(client)
+    headers = login(client)
+    client.post("/update-meal-plan", params={"meal_plan": fake_meal_plan()}, headers=headers)
+    return headers
+
+
+def test_unchanged_meal_plan_is_a_304(client, headers):
+    first = client.get("/user/meal-plan", headers=headers)
+    etag = first.headers["etag"]
+    assert etag.startswith('W/"')
+
+    for tag in (etag, etag[2:], f'"other", {etag}', "*"):
+        response = client.get("/user/meal-plan", headers={**headers, "If-None-Match": tag})
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["etag"] == etag
+
+    assert client.get("/user/meal-plan", headers={**headers, "If-None-Match": '"stale"'}).status_code == 200
+
+
+def test_changed_meal_plan_gets_a_new_etag(client, headers):
+    etag = client.get("/user/meal-plan", headers=headers).headers["etag"]
+    client.post("/update-meal-plan", params={"meal_plan": "# New plan"}, headers=headers)
+    response = client.get("/user/meal-plan", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["meal_plan"] == "# New plan"
+    assert response.headers["etag"] != etag
+
+
+def test_structured_plan_and_versions_honour_if_none_match(client, headers):
+    for path in ("/user/meal-plan/structured", "/user/meal-plan/history/1"):
+        etag = client.get(path, headers=headers).headers["etag"]
+        assert client.get(path, headers={**headers, "If-None-Match": etag}).status_code == 304
+
+
+@pytest.mark.parametrize("accept, expected", [
+    ("br, gzip", "br"),
+    ("gzip", "gzip"),
+    ("gzip;q=0.5, br;q=0", "gzip"),
+    ("identity", None),
+    ("", None),
+])
+def test_choose_encoding(accept, expected):
+    assert choose_encoding(accept) == expected
+
+
+def test_choose_encoding_without_brotli(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    assert choose_encoding("br, gzip") == "gzip"
+
+
+@pytest.mark.parametrize("encoding", ["br", "gzip"])
+def test_large_json_is_compressed(client, headers, encoding):
+    response = client.get("/user/meal-plan", headers={**headers, "Accept-Encoding": encoding})
+    assert response.headers["content-encoding"] == encoding
+    assert "accept-encoding" in response.headers["vary"].lower()
+    assert int(response.headers["content-length"]) < len(fake_meal_plan())
+    # The client decodes it transparently
+    assert response.json()["meal_plan"] == fake_meal_plan()
+
+
+def test_small_and_uncompressible_responses_pass_through(client, headers):
+    small = client.get("/health", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+
+    plain = client.get("/user/meal-plan", headers={**headers, "Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+
+
+def test_server_sent_events_are_not_compressed(client, headers):
+    response = client.post(
+        "/follow-up/stream",
+        json={"message": "Can I swap rice for quinoa? " * 100},
+        headers={**headers, "Accept-Encoding": "gzip"},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert "content-encoding" not in response.headers
+    assert response.text.startswith("data:")
@@ -0,0 +1,69 @@
+import asyncio
+
+from backend import models
+from backend.identity import identity_cache
+from backend.passwords import get_password_hasher
+from conftest import login, register
+
+
+def user(db, username="alice"):
+    return db.query(models.User).filter(models.User.username == username).one()
+
+
+def cached_login(client):
+    register(client)
+    headers = login(client)
+    assert client.get("/user/me", headers=headers).status_code == 200
+    assert identity_cache.get("alice") is not None
+    return headers
+
+
+def test_profile_change_invalidates_cached_identity(client, db):
+    headers = cached_login(client)
+    user(db).email = "new@example.com"
+    db.commit()
+    assert identity_cache.get("alice") is None
+    assert client.get("/user/me", headers=headers).json()["email"] == "new@example.com"
+
+
+def test_password_change_invalidates_cached_identity(client, db):
+    cached_login(client)
+    user(db).hashed_password = asyncio.run(get_password_hasher().hash("new-pw"))
+    db.commit()
+    assert identity_cache.get("alice") is None
+    assert client.post("/token", data={"username": "alice", "password": "pw"}).status_code == 401
+    assert client.post("/token", data={"username": "alice", "password": "new-pw"}).status_code == 200
+
+
+def test_deleted_user_is_rejected_at_once(client, db):
+    headers = cached_login(client)
+    db.delete(user(db))
+    db.commit()
+    assert identity_cache.get("alice") is None
+    assert client.get("/user/me", headers=headers).status_code == 401
+
+
+def test_rename_invalidates_the_old_username(client, db):
+    headers = cached_login(client)
+    user(db).username = "alicia"
+    db.commit()
+    assert identity_cache.get("alice") is None
+    # Tokens name the old username, which no longer exists
+    assert client.get("/user/me", headers=headers).status_code == 401
+
+
+def test_rolled_back_change_keeps_cached_identity(client, db):
+    cached_login(client)
+    user(db).email = "new@example.com"
+    db.flush()
+    db.rollback()
+    assert identity_cache.get("alice") is not None
+
+
+def test_revoked_token_is_rejected_despite_cached_identity(client):
+    headers = cached_login(client)
+    assert client.post("/logout", json={}, headers=headers).status_code == 200
+    assert identity_cache.get("alice") is not None
+    assert client.get("/user/me", headers=headers).status_code == 401
+    # Other sessions of the same user still use the cached identity
+    assert client.get("/user/me", headers=login(client)).status_code == 200
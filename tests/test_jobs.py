@@ -0,0 +1,71 @@
+import asyncio
+
+from backend import jobs, models
+from backend.jobs import FAILED, SUCCEEDED, JobWorker, notify_workers, submit_job
+
+
+def add_user(db, username="alice"):
+    user = models.User(username=username, email=f"{username}@example.com", hashed_password="x", goal="lose weight")
+    db.add(user)
+    db.commit()
+    return user.id
+
+
+def run_through_worker(db, user_id, timeout=5):
+    async def scenario():
+        worker = JobWorker(concurrency=1, poll_interval=0.01)
+        worker.start()
+        try:
+            job_id, _, _ = submit_job(db, user_id, "alice", "generate", [{"role": "user", "content": "plan"}], use_cache=False)
+            notify_workers()
+            deadline = asyncio.get_running_loop().time() + timeout
+            while asyncio.get_running_loop().time() < deadline:
+                db.expire_all()
+                status = jobs.job_status(db, job_id, user_id)
+                if status["status"] in jobs.TERMINAL_STATES:
+                    break
+                await asyncio.sleep(0.01)
+            alive = not any(task.done() for task in worker._tasks)
+        finally:
+            await worker.stop()
+        return status, alive
+
+    return asyncio.run(scenario())
+
+
+def test_job_succeeds_and_stores_plan(db):
+    user_id = add_user(db)
+    status, alive = run_through_worker(db, user_id)
+    assert status["status"] == SUCCEEDED
+    assert alive
+    db.expire_all()
+    assert db.get(models.User, user_id).current_meal_plan == status["mealPlan"]
+
+
+def test_failed_flush_marks_job_failed_and_worker_survives(db, monkeypatch):
+    user_id = add_user(db)
+    add_user(db, "bob")
+
+    def clashing_store(session, user_id, username, meal_plan, source):
+        # Leaves the session needing a rollback
+        session.add(models.User(username="bob", email="bob2@example.com"))
+        session.flush()
+
+    monkeypatch.setattr(jobs, "store_meal_plan", clashing_store)
+    status, alive = run_through_worker(db, user_id)
+    assert status["status"] == FAILED
+    assert "UNIQUE" in status["error"]
+    assert alive
+
+
+def test_worker_survives_errors_recording_a_failure(db, monkeypatch):
+    user_id = add_user(db)
+
+    def broken(*args):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(jobs, "store_meal_plan", broken)
+    monkeypatch.setattr(jobs, "_fail", broken)
+    status, alive = run_through_worker(db, user_id, timeout=0.3)
+    assert status["status"] == jobs.RUNNING
+    assert alive
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from backend.fake_llm import FakeAsyncOpenAI
+from backend.llm import LLMError, LLMGateway
+
+
+class FlakyCompletions:
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+        self.inner = FakeAsyncOpenAI(latency_ms=0).chat.completions
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise ConnectionError("boom")
+        return await self.inner.create(**kwargs)
+
+
+class FlakyClient:
+    def __init__(self, failures):
+        self.chat = type("Chat", (), {})()
+        self.chat.completions = FlakyCompletions(failures)
+
+    async def close(self):
+        pass
+
+
+def gateway(client, **kwargs):
+    return LLMGateway(client=client, backoff_base=0, backoff_max=0, **kwargs)
+
+
+MESSAGES = [{"role": "user", "content": "hello"}]
+
+
+def test_complete_retries_transient_errors():
+    client = FlakyClient(failures=2)
+    result = asyncio.run(gateway(client, max_retries=3).complete(MESSAGES))
+    assert result.retries == 2
+    assert result.content
+    assert client.chat.completions.calls == 3
+
+
+def test_complete_gives_up_after_max_retries():
+    client = FlakyClient(failures=10)
+    with pytest.raises(LLMError):
+        asyncio.run(gateway(client, max_retries=2).complete(MESSAGES))
+    assert client.chat.completions.calls == 3
+
+
+def test_inflight_limit():
+    llm = gateway(FakeAsyncOpenAI(latency_ms=20), max_inflight=2)
+    peak = 0
+
+    async def one():
+        nonlocal peak
+        task = asyncio.ensure_future(llm.complete(MESSAGES))
+        await asyncio.sleep(0.005)
+        peak = max(peak, llm.inflight)
+        await task
+
+    async def run():
+        await asyncio.gather(*(one() for _ in range(6)))
+
+    asyncio.run(run())
+    assert peak == 2
+
+
+def test_stream_yields_deltas():
+    llm = gateway(FakeAsyncOpenAI(latency_ms=0))
+
+    async def run():
+        return [delta async for delta in llm.stream(MESSAGES)]
+
+    parts = asyncio.run(run())
+    assert len(parts) > 1
+    assert "".join(parts).startswith("Here is some guidance")
@@ -0,0 +1,204 @@
+import pytest
+
+from backend import main
+from backend.fake_llm import fake_meal_plan
+from backend.meal_plans import (
+    InvalidSectionReply, parse_day_section, parse_meal_plan, parse_meal_section, render_meal_plan
+)
+from conftest import login, register
+
+
+class Reply:
+    def __init__(self, content):
+        self.content = content
+
+
+class StubGateway:
+    def __init__(self, content):
+        self.content = content
+        self.messages = None
+
+    async def complete(self, messages, **kwargs):
+        self.messages = messages
+        return Reply(self.content)
+
+
+def test_parse_and_render_round_trip():
+    text = fake_meal_plan()
+    plan = parse_meal_plan(text)
+    assert [day["name"] for day in plan["days"]][:2] == ["Monday", "Tuesday"]
+    breakfast = plan["days"][0]["meals"][0]
+    assert breakfast["name"] == "Breakfast"
+    assert breakfast["items"][0]["calories"] == 350
+    assert breakfast["items"][0]["protein"] == 12
+    assert render_meal_plan(plan) == text
+
+
+def test_meal_section_under_a_day_heading():
+    meal = parse_meal_section("## Monday\n### Breakfast\n- tofu scramble", "### Breakfast")
+    assert meal["heading"] == "### Breakfast"
+    assert [item["text"] for item in meal["items"]] == ["- tofu scramble"]
+
+
+def test_meal_section_ignores_other_sections():
+    reply = "Sure!\n### Lunch\n- soup\n### Dinner\n- tofu stir fry: 500 kcal\n### Snack\n- apple"
+    meal = parse_meal_section(reply, "### Dinner")
+    assert [item["text"] for item in meal["items"]] == ["- tofu stir fry: 500 kcal"]
+
+
+def test_meal_section_from_whole_plan_uses_requested_day():
+    reply = fake_meal_plan().replace("## Tuesday\n### Breakfast\n- Oatmeal", "## Tuesday\n### Breakfast\n- Porridge")
+    meal = parse_meal_section(reply, "### Breakfast", "Tuesday")
+    assert meal["items"][0]["text"].startswith("- Porridge")
+
+
+@pytest.mark.parametrize("reply", [
+    "# Meal Plan\n\nDaily calories: 1700 kcal\n",
+    "### Dinner\n\n### Snack\n- apple",
+    "- tofu without a heading",
+])
+def test_meal_section_rejects_replies_without_the_section(reply):
+    with pytest.raises(InvalidSectionReply):
+        parse_meal_section(reply, "### Dinner")
+
+
+def test_day_section_stops_at_next_day():
+    day = parse_day_section(fake_meal_plan(), "## Tuesday")
+    assert day["name"] == "Tuesday"
+    assert [meal["name"] for meal in day["meals"]] == ["Breakfast", "Lunch", "Snack", "Dinner"]
+    with pytest.raises(InvalidSectionReply):
+        parse_day_section("## Monday\n### Dinner\n- soup", "## Tuesday")
+
+
+def setup_plan(client):
+    register(client)
+    headers = login(client)
+    client.post("/update-meal-plan", params={"meal_plan": fake_meal_plan(days=2)}, headers=headers)
+    return headers
+
+
+def test_meal_tweak_rewrites_only_that_meal(client, monkeypatch):
+    headers = setup_plan(client)
+    gateway = StubGateway("Here you go:\n## Monday\n### Dinner\n- Tofu stir fry: 550 kcal, 30g protein\n### Snack\n- apple")
+    monkeypatch.setattr(main, "get_gateway", lambda: gateway)
+
+    response = client.post(
+        "/tweak-meal-plan",
+        json={"username": "alice", "currentDiet": "vegetarian dinner", "day": "Monday", "meal": "Dinner"},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert body["tokens_sent"] < body["baseline_tokens"]
+    assert "## Tuesday" not in gateway.messages[-1]["content"]
+
+    expected = fake_meal_plan(days=2).replace(
+        "### Dinner\n- Salmon with quinoa and broccoli: 600 kcal, 42g protein, 50g carbs, 22g fat\n\n## Tuesday",
+        "### Dinner\n- Tofu stir fry: 550 kcal, 30g protein\n## Tuesday",
+    )
+    assert body["mealPlan"] == expected
+    assert client.get("/user/meal-plan", headers=headers).json()["meal_plan"] == expected
+
+    plan = client.get("/user/meal-plan/structured", headers=headers).json()
+    monday, tuesday = plan["days"]
+    dinner = monday["meals"][3]
+    assert [item["text"] for item in dinner["items"]] == ["- Tofu stir fry: 550 kcal, 30g protein"]
+    assert dinner["items"][0]["calories"] == 550
+    assert tuesday["meals"][3]["items"][0]["text"].startswith("- Salmon")
+
+
+def test_tweak_reply_without_the_section_is_rejected(client, monkeypatch):
+    headers = setup_plan(client)
+    monkeypatch.setattr(main, "get_gateway", lambda: StubGateway("# Meal Plan\n\nDaily calories: 1700 kcal\n"))
+
+    response = client.post(
+        "/tweak-meal-plan",
+        json={"username": "alice", "currentDiet": "vegetarian", "day": "Monday", "meal": "Dinner"},
+        headers=headers,
+    )
+    assert response.status_code == 422
+    assert client.get("/user/meal-plan", headers=headers).json()["meal_plan"] == fake_meal_plan(days=2)
+
+
+def test_tweak_of_unknown_section_is_404(client):
+    headers = setup_plan(client)
+    response = client.post(
+        "/tweak-meal-plan",
+        json={"username": "alice", "currentDiet": "x", "day": "Sunday"},
+        headers=headers,
+    )
+    assert response.status_code == 404
+
+
+@pytest.fixture
+def statements():
+    from sqlalchemy import event
+    from backend.database import get_engine
+
+    captured = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        captured.append((statement, parameters))
+
+    engine = get_engine()
+    event.listen(engine, "before_cursor_execute", record)
+    yield captured
+    event.remove(engine, "before_cursor_execute", record)
+
+
+def user_id(db):
+    from backend import models
+    return db.query(models.User.id).filter(models.User.username == "alice").scalar()
+
+
+def test_structured_plan_writes_do_not_grow_with_plan_size(client, db, statements):
+    from backend.identity import store_meal_plan
+
+    register(client)
+    uid = user_id(db)
+    counts = []
+    for days in (1, 7, 7):
+        del statements[:]
+        store_meal_plan(db, uid, "alice", fake_meal_plan(days=days))
+        counts.append(len(statements))
+    # First write inserts the plan row; later ones replace it
+    assert counts[1] == counts[2]
+    assert counts[2] <= 15
+
+    plan = client.get("/user/meal-plan/structured", headers=login(client)).json()
+    assert len(plan["days"]) == 7
+    assert [len(day["meals"]) for day in plan["days"]] == [4] * 7
+
+
+def test_section_tweak_sends_only_the_changed_span(client, db, monkeypatch, statements):
+    headers = setup_plan(client)
+    monkeypatch.setattr(main, "get_gateway", lambda: StubGateway("### Lunch\n- Lentil soup: 400 kcal"))
+    del statements[:]
+    response = client.post(
+        "/tweak-meal-plan",
+        json={"username": "alice", "currentDiet": "soup", "day": "Tuesday", "meal": "Lunch"},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    updates = [params for statement, params in statements if statement.startswith("UPDATE users")]
+    assert len(updates) == 1
+    assert not any(isinstance(value, str) and "## Monday" in value for value in updates[0])
+    stored = client.get("/user/meal-plan", headers=headers).json()["meal_plan"]
+    assert stored == response.json()["mealPlan"]
+    assert "### Lunch\n- Lentil soup: 400 kcal\n### Snack" in stored
+
+
+def test_edit_falls_back_to_full_write_when_plan_moved_on(client, db):
+    from backend import models
+    from backend.identity import store_meal_plan
+    from backend.plan_history import write_current_plan
+
+    register(client)
+    uid = user_id(db)
+    store_meal_plan(db, uid, "alice", "plan B")
+    write_current_plan(db, uid, "plan A edited", "tweak", previous="plan A")
+    db.commit()
+    db.expire_all()
+    user = db.get(models.User, uid)
+    assert user.current_meal_plan == "plan A edited"
+    assert user.current_plan_version == 2
@@ -0,0 +1,69 @@
+from sqlalchemy import create_engine, inspect, select, text
+
+from backend import migrations, models
+from backend.meal_plans import meal_plan_etag
+from backend.plan_history import decompress_plan
+
+
+def engine_at(tmp_path):
+    return create_engine(f"sqlite:///{tmp_path / 'migrate.db'}")
+
+
+def index_names(engine):
+    return {index["name"] for index in inspect(engine).get_indexes("users")}
+
+
+def insert_user(conn, username, plan):
+    conn.execute(models.User.__table__.insert().values(
+        username=username, email=f"{username}@example.com", hashed_password="x", current_meal_plan=plan,
+    ))
+
+
+def test_fresh_database_applies_every_migration_once(tmp_path):
+    engine = engine_at(tmp_path)
+    applied = migrations.migrate(engine)
+    assert applied == [version for version, _, _ in migrations.MIGRATIONS]
+    assert migrations.migrate(engine) == []
+    assert migrations.pending_migrations(engine) == []
+    assert "ix_users_without_meal_plan" in index_names(engine)
+    assert "ix_users_id" not in index_names(engine)
+
+
+def test_upgrade_backfills_etags_history_and_empty_plans(tmp_path, monkeypatch):
+    engine = engine_at(tmp_path)
+    all_migrations = migrations.MIGRATIONS
+    monkeypatch.setattr(migrations, "MIGRATIONS", all_migrations[:1])
+    migrations.migrate(engine)
+    with engine.begin() as conn:
+        insert_user(conn, "with_plan", "# Plan")
+        insert_user(conn, "empty", "")
+        insert_user(conn, "legacy", None)
+
+    monkeypatch.setattr(migrations, "MIGRATIONS", all_migrations)
+    assert migrations.migrate(engine) == [2, 3, 4, 5]
+
+    users = models.User.__table__
+    versions = models.MealPlanVersion.__table__
+    with engine.connect() as conn:
+        rows = {r.username: r for r in conn.execute(select(users))}
+        assert rows["with_plan"].meal_plan_etag == meal_plan_etag("# Plan")
+        assert rows["with_plan"].current_plan_version == 1
+        assert rows["empty"].meal_plan_etag is None
+        assert rows["legacy"].current_meal_plan == models.NO_MEAL_PLAN
+        history = conn.execute(select(versions)).all()
+        assert [(h.user_id, h.version) for h in history] == [(rows["with_plan"].id, 1)]
+        assert decompress_plan(history[0].content) == "# Plan"
+    assert "ix_users_without_meal_plan" in index_names(engine)
+
+
+def test_only_missing_query_uses_partial_index(db):
+    from backend.batch import fetch_user_chunk
+
+    query = str(
+        db.query(models.User.id).filter(models.User.id > 0)
+        .filter(models.User.current_meal_plan == text("''"))
+        .statement.compile(compile_kwargs={"literal_binds": True})
+    )
+    plan = " ".join(str(row) for row in db.execute(text("EXPLAIN QUERY PLAN " + query)))
+    assert "ix_users_without_meal_plan" in plan
+    assert fetch_user_chunk(db, 0, 10, only_missing=True) == []
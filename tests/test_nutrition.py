@@ -0,0 +1,41 @@
+from types import SimpleNamespace
+
+from backend.nutrition import GAIN, LOSE, MAINTAIN, MIN_CALORIES, goal_code, nutrition_targets, targets_for_users
+from backend.prompts import create_meal_plan_prompt
+
+
+def test_goal_code():
+    assert goal_code("Lose weight") == LOSE
+    assert goal_code("build muscle") == GAIN
+    assert goal_code("stay healthy") == MAINTAIN
+    assert goal_code(None) == MAINTAIN
+
+
+def test_targets_balance_calories():
+    targets = nutrition_targets(34, 70, 180, "maintain")
+    macro_kcal = targets["protein_g"] * 4 + targets["carbs_g"] * 4 + targets["fat_g"] * 9
+    assert abs(macro_kcal - targets["calories"]) <= 10
+    assert nutrition_targets(34, 70, 180, "lose weight")["calories"] < targets["calories"]
+
+
+def test_calories_never_drop_below_floor():
+    assert nutrition_targets(80, 55, 90, "lose weight")["calories"] >= MIN_CALORIES
+
+
+def test_bulk_targets_match_single_user_targets():
+    users = [
+        SimpleNamespace(id=1, age=34, height=70, weight=180, goal="lose weight"),
+        SimpleNamespace(id=2, age=22, height=64, weight=130, goal="gain muscle"),
+        SimpleNamespace(id=3, age=60, height=68, weight=200, goal="maintain"),
+    ]
+    bulk = targets_for_users(users)
+    for user in users:
+        single = nutrition_targets(user.age, user.height, user.weight, user.goal)
+        assert bulk[user.id] == {key: single[key] for key in ("calories", "protein_g", "carbs_g", "fat_g")}
+    assert targets_for_users([]) == {}
+
+
+def test_prompt_with_precomputed_targets_matches():
+    user = SimpleNamespace(id=1, age=34, height=70, weight=180, goal="lose weight")
+    targets = targets_for_users([user])[1]
+    assert create_meal_plan_prompt(34, 70, 180, "lose weight", targets=targets) == create_meal_plan_prompt(34, 70, 180, "lose weight")
@@ -0,0 +1,67 @@
+import asyncio
+import threading
+
+import pytest
+
+from backend.passwords import PasswordHasher, PasswordPoolSaturated
+
+
+def test_work_runs_off_the_event_loop_thread():
+    async def scenario():
+        hasher = PasswordHasher(kind="thread", size=2, queue_limit=4)
+        try:
+            return threading.get_ident(), await hasher._run(threading.get_ident)
+        finally:
+            hasher.shutdown()
+
+    loop_thread, worker_thread = asyncio.run(scenario())
+    assert loop_thread != worker_thread
+
+
+def test_saturated_pool_fails_fast():
+    release = threading.Event()
+
+    async def scenario():
+        hasher = PasswordHasher(kind="thread", size=1, queue_limit=2)
+        try:
+            blocked = [asyncio.ensure_future(hasher._run(release.wait, 5)) for _ in range(2)]
+            await asyncio.sleep(0)
+            assert hasher.pending == 2
+            with pytest.raises(PasswordPoolSaturated):
+                await hasher.hash("pw")
+            release.set()
+            await asyncio.gather(*blocked)
+            assert hasher.pending == 0
+            # Capacity is back once the queue drains
+            return await hasher.verify("pw", await hasher.hash("pw"))
+        finally:
+            release.set()
+            hasher.shutdown()
+
+    assert asyncio.run(scenario()) is True
+
+
+@pytest.mark.parametrize("kind", ["thread", "process"])
+def test_concurrent_hashes_verify(kind):
+    passwords = [f"password-{i}" for i in range(8)]
+
+    async def scenario():
+        hasher = PasswordHasher(kind=kind, size=4, queue_limit=32)
+        try:
+            hashes = await asyncio.gather(*(hasher.hash(p) for p in passwords))
+            rehashes = await asyncio.gather(*(hasher.hash(p) for p in passwords))
+            right = await asyncio.gather(*(hasher.verify(p, h) for p, h in zip(passwords, rehashes)))
+            wrong = await asyncio.gather(*(hasher.verify(p, h) for p, h in zip(passwords, reversed(hashes))))
+            malformed = await hasher.verify("pw", "not-a-hash")
+            return hashes, rehashes, right, wrong, malformed, hasher.pending
+        finally:
+            hasher.shutdown()
+
+    hashes, rehashes, right, wrong, malformed, pending = asyncio.run(scenario())
+    # Salted: hashing again gives a different hash for the same password
+    assert all(a != b for a, b in zip(hashes, rehashes))
+    assert all(h.startswith("$2b$04$") for h in hashes)
+    assert right == [True] * 8
+    assert wrong == [False] * 8
+    assert malformed is False
+    assert pending == 0
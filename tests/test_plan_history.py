@@ -0,0 +1,104 @@
+from datetime import datetime, timedelta
+
+from backend import batch, models, plan_history
+from backend.identity import store_meal_plan
+from conftest import login, register
+
+
+def user_id(db, username="alice"):
+    return db.query(models.User.id).filter(models.User.username == username).scalar()
+
+
+def versions(db, uid):
+    rows = db.query(models.MealPlanVersion.version).filter(models.MealPlanVersion.user_id == uid)
+    return sorted(version for version, in rows)
+
+
+def test_history_and_rollback(client):
+    register(client)
+    headers = login(client)
+    for plan in ("plan one", "plan two"):
+        client.post("/update-meal-plan", params={"meal_plan": plan}, headers=headers)
+
+    history = client.get("/user/meal-plan/history", headers=headers).json()
+    assert [(v["version"], v["current"]) for v in history["versions"]] == [(2, True), (1, False)]
+    assert client.get("/user/meal-plan/history/1", headers=headers).json()["meal_plan"] == "plan one"
+
+    response = client.post("/user/meal-plan/rollback", json={"version": 1}, headers=headers)
+    assert response.json()["version"] == 3
+    assert response.json()["mealPlan"] == "plan one"
+    assert client.get("/user/meal-plan/history/3", headers=headers).json()["restored_from"] == 1
+    assert client.get("/user/meal-plan/history/9", headers=headers).status_code == 404
+
+
+def test_retention_by_count_and_age(client, db, monkeypatch):
+    register(client)
+    uid = user_id(db)
+    monkeypatch.setattr(plan_history, "PLAN_HISTORY_MAX_VERSIONS", 3)
+    for i in range(5):
+        store_meal_plan(db, uid, "alice", f"plan {i}")
+    assert versions(db, uid) == [3, 4, 5]
+
+    db.query(models.MealPlanVersion).update({"created_at": datetime.utcnow() - timedelta(days=400)})
+    db.commit()
+    monkeypatch.setattr(plan_history, "PLAN_HISTORY_MAX_AGE_DAYS", 365)
+    store_meal_plan(db, uid, "alice", "plan 5")
+    # Only the new version survives; the aged-out current one went with it
+    assert versions(db, uid) == [6]
+
+
+def test_batch_writes_apply_the_same_retention(client, db, monkeypatch):
+    register(client)
+    uid = user_id(db)
+    store_meal_plan(db, uid, "alice", "old plan")
+    db.query(models.MealPlanVersion).update({"created_at": datetime.utcnow() - timedelta(days=400)})
+    db.commit()
+    monkeypatch.setattr(plan_history, "PLAN_HISTORY_MAX_AGE_DAYS", 365)
+
+    batch.store_batch_results(db, [(uid, "batch plan")])
+    assert versions(db, uid) == [2]
+
+
+def test_batch_write_after_concurrent_web_write_does_not_conflict(client, db):
+    register(client, "alice")
+    register(client, "bob")
+    alice, bob = user_id(db, "alice"), user_id(db, "bob")
+    chunk = batch.fetch_user_chunk(db, 0, 10, only_missing=True)
+    assert {user.id for user in chunk} == {alice, bob}
+
+    # A web write lands between reading the chunk and storing its results
+    store_meal_plan(db, alice, "alice", "web plan")
+    batch.store_batch_results(db, [(alice, "batch plan a"), (bob, "batch plan b")])
+
+    assert versions(db, alice) == [1, 2]
+    assert versions(db, bob) == [1]
+    current = db.query(models.User.current_plan_version).filter(models.User.id == alice).scalar()
+    assert current == 2
+
+
+def test_batch_write_statements_do_not_grow_with_chunk_size(client, db):
+    from sqlalchemy import event
+    from backend.database import get_engine
+    from backend.fake_llm import fake_meal_plan
+
+    for i in range(12):
+        register(client, f"user{i}")
+    ids = [user_id(db, f"user{i}") for i in range(12)]
+    counts = []
+
+    def record(*args):
+        counts[-1] += 1
+
+    event.listen(get_engine(), "before_cursor_execute", record)
+    try:
+        for chunk in (ids[:2], ids[2:12], ids[2:12]):
+            counts.append(0)
+            batch.store_batch_results(db, [(uid, fake_meal_plan()) for uid in chunk])
+    finally:
+        event.remove(get_engine(), "before_cursor_execute", record)
+    # Two users or ten, first write or replacement: a fixed number of statements
+    assert counts[0] == counts[1]
+    assert counts[2] <= 15
+    assert versions(db, ids[5]) == [1, 2]
+    plan = db.query(models.MealPlan).filter(models.MealPlan.user_id == ids[5]).one()
+    assert plan.version == 2
@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+
+from backend import routing
+from backend.llm import LLMError
+from backend.routing import FOLLOW_UP, PLAN, Backend, ModelRouter, tier_for
+
+
+class StubGateway:
+    def __init__(self, name, delay=0.0, fail=False):
+        self.name = name
+        self.delay = delay
+        self.fail = fail
+        self.calls = []
+        self.cancelled = 0
+
+    async def complete(self, messages, model=None, timeout=None, **kwargs):
+        self.calls.append(model)
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.fail:
+            raise LLMError(f"{self.name} down")
+        return f"{self.name}:{model}"
+
+
+def router(*gateways, hedge=False):
+    backends = [Backend(g.name, g, {PLAN: f"{g.name}-plan", FOLLOW_UP: f"{g.name}-mini"}) for g in gateways]
+    return ModelRouter(backends, hedge=hedge)
+
+
+MESSAGES = [{"role": "user", "content": "Can I swap rice for quinoa?"}]
+
+
+@pytest.fixture(autouse=True)
+def no_exploration(monkeypatch):
+    monkeypatch.setattr(routing, "LLM_ROUTER_EXPLORE_RATE", 0.0)
+
+
+def test_tier_selection(monkeypatch):
+    assert tier_for(PLAN, MESSAGES) == PLAN
+    assert tier_for(FOLLOW_UP, MESSAGES) == FOLLOW_UP
+    monkeypatch.setattr(routing, "LLM_FOLLOW_UP_MAX_PROMPT_TOKENS", 1)
+    # A long context goes to the plan models
+    assert tier_for(FOLLOW_UP, MESSAGES) == PLAN
+
+    primary = StubGateway("a")
+    result = asyncio.run(router(primary).complete(MESSAGES, task=PLAN))
+    assert result == "a:a-plan"
+
+
+def test_fails_over_to_next_backend():
+    down, up = StubGateway("a", fail=True), StubGateway("b")
+    r = router(down, up)
+    assert asyncio.run(r.complete(MESSAGES, task=FOLLOW_UP)) == "b:b-mini"
+    failed, healthy = r.routes[FOLLOW_UP]
+    assert failed.failures == 1 and failed.error_rate > 0
+    assert healthy.failures == 0
+
+
+def test_all_backends_failing_raises():
+    r = router(StubGateway("a", fail=True), StubGateway("b", fail=True))
+    with pytest.raises(LLMError):
+        asyncio.run(r.complete(MESSAGES))
+
+
+def test_slow_request_is_hedged_and_loser_cancelled(monkeypatch):
+    monkeypatch.setattr(routing, "LLM_HEDGE_MIN_SECONDS", 0.01)
+    slow, fast = StubGateway("a", delay=5), StubGateway("b")
+    r = router(slow, fast, hedge=True)
+
+    assert asyncio.run(r.complete(MESSAGES)) == "b:b-plan"
+    assert slow.cancelled == 1
+    assert r.hedge_tokens < 1
+
+
+def test_route_trips_after_repeated_failures(monkeypatch):
+    monkeypatch.setattr(routing, "LLM_ROUTER_FAILURE_THRESHOLD", 2)
+    r = router(StubGateway("a"), StubGateway("b"))
+    route = r.routes[PLAN][0]
+    route.record_failure("complete", 0.1)
+    assert route.available(routing.time.monotonic())
+    route.record_failure("complete", 0.1)
+    assert not route.available(routing.time.monotonic())
+    assert [x.name for x in r.ranked(PLAN, "complete")] == ["b", "a"]
+    assert r.model_for(PLAN) == "b-plan"
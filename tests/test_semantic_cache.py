@@ -0,0 +1,46 @@
+from backend import semantic_cache
+from backend.semantic_cache import SemanticCache, context_key
+
+MESSAGES = [
+    {"role": "system", "content": "You are a nutritionist."},
+    {"role": "assistant", "content": "Day 1: chicken and rice"},
+    {"role": "user", "content": "Can I swap chicken for tofu?"},
+]
+
+
+def test_reworded_question_hits_in_same_context():
+    cache = SemanticCache(max_entries=8, threshold=0.8)
+    context = context_key(1, "lose weight", MESSAGES)
+    cache.store("Can I swap chicken for tofu?", context, "Yes, 150g tofu")
+
+    hit = cache.lookup("could I swap the chicken for tofu", context)
+    assert hit is not None and hit[0] == "Yes, 150g tofu"
+    assert cache.lookup("Can I swap tofu for chicken?", context) is None
+
+
+def test_answers_are_not_shared_between_users():
+    cache = SemanticCache(max_entries=8)
+    cache.for_messages(1, "lose weight", MESSAGES).set(None, "Yes, 150g tofu")
+
+    assert cache.for_messages(1, "lose weight", MESSAGES).get() == "Yes, 150g tofu"
+    assert cache.for_messages(2, "lose weight", MESSAGES).get() is None
+    assert cache.for_messages(1, "gain muscle", MESSAGES).get() is None
+
+
+def test_matrix_grows_lazily_and_wraps_at_max_entries(monkeypatch):
+    monkeypatch.setattr(semantic_cache, "INITIAL_CAPACITY", 2)
+    cache = SemanticCache(max_entries=5)
+    assert cache.vectors.shape[0] == 2
+
+    for i in range(5):
+        cache.store(f"question number {i} about oats", i, f"answer {i}")
+    assert cache.vectors.shape[0] == 5
+    assert cache.size == 5
+
+    # Full: the oldest entry is overwritten
+    cache.store("question number 5 about oats", 5, "answer 5")
+    assert cache.vectors.shape[0] == 5
+    assert cache.size == 5
+    assert cache.lookup("question number 0 about oats", 0) is None
+    assert cache.lookup("question number 1 about oats", 1)[0] == "answer 1"
+    assert cache.lookup("question number 5 about oats", 5)[0] == "answer 5"
@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+from backend.singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight(window=0)
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "result"
+
+    async def run():
+        return await asyncio.gather(*(flight.do("key", work) for _ in range(5)))
+
+    assert asyncio.run(run()) == ["result"] * 5
+    assert calls == 1
+
+
+def test_failures_are_shared_but_not_reused():
+    flight = SingleFlight(window=10)
+    calls = 0
+
+    async def fail():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream")
+
+    async def run():
+        results = await asyncio.gather(*(flight.do("key", fail) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(r, ValueError) for r in results)
+        with pytest.raises(ValueError):
+            await flight.do("key", fail)
+
+    asyncio.run(run())
+    assert calls == 2
+
+
+def test_result_is_reused_within_window():
+    flight = SingleFlight(window=10)
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        return calls
+
+    async def run():
+        first = await flight.do("key", work)
+        await asyncio.sleep(0)
+        second = await flight.do("key", work)
+        return first, second
+
+    assert asyncio.run(run()) == (1, 1)
+
+
+def test_cancelled_caller_does_not_cancel_shared_call():
+    flight = SingleFlight(window=0)
+
+    async def work():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    async def run():
+        first = asyncio.ensure_future(flight.do("key", work))
+        second = asyncio.ensure_future(flight.do("key", work))
+        await asyncio.sleep(0.005)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(run()) == "done"
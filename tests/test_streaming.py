@@ -0,0 +1,44 @@
+import json
+
+from conftest import login, register
+
+PROFILE = {"username": "alice", "age": 34, "height": 170, "weight": 70, "goal": "lose weight", "planType": "new"}
+
+
+def parse_events(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        event, data = "message", None
+        for line in block.splitlines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                data = json.loads(line[len("data: "):])
+        events.append((event, data))
+    return events
+
+
+def test_generate_stream_sends_deltas_then_done_and_saves_plan(client):
+    register(client)
+    headers = login(client)
+    response = client.post("/generate-meal-plan/stream", json=PROFILE, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = parse_events(response.text)
+    assert events[-1][0] == "done"
+    assert events[-1][1]["status"] == "success"
+    text = "".join(data["delta"] for event, data in events[:-1])
+    assert text.startswith("# Meal Plan")
+
+    saved = client.get("/user/meal-plan", headers=headers).json()
+    assert saved["meal_plan"] == text
+
+
+def test_follow_up_stream_returns_conversation_id(client):
+    register(client)
+    headers = login(client)
+    response = client.post("/follow-up/stream", json={"message": "Can I eat rice?"}, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["x-conversation-id"]
+    assert parse_events(response.text)[-1][0] == "done"
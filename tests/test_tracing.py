@@ -0,0 +1,30 @@
+from backend.tracing import add_span, request_id_var, should_sample, span, start_request
+
+
+def test_sampled_request_records_spans():
+    trace = start_request("req-1", sampled=True)
+    with span("db.query"):
+        pass
+    add_span("db.commit", 0.002)
+    assert request_id_var.get() == "req-1"
+    assert [s["stage"] for s in trace.as_list()] == ["db.query", "db.commit"]
+    assert trace.as_list()[1]["ms"] == 2.0
+
+
+def test_unsampled_request_records_nothing():
+    assert start_request("req-2", sampled=False) is None
+    with span("db.query"):
+        pass
+    add_span("db.commit", 0.002)
+    assert request_id_var.get() == "req-2"
+
+
+def test_sample_rate_bounds():
+    assert should_sample(1.0)
+    assert not should_sample(0.0)
+
+
+def test_responses_carry_request_id(client):
+    response = client.get("/health")
+    assert response.status_code == 200
+    assert response.headers.get("x-request-id")
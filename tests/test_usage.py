@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+
+from backend import models, usage
+from backend.fake_llm import FakeAsyncOpenAI
+from backend.llm import LLMError, LLMGateway
+from backend.usage import QuotaExceeded, QuotaTracker, flush_usage, set_call_context
+
+MESSAGES = [{"role": "user", "content": "How much protein should I eat?"}]
+
+
+class BrokenCompletions:
+    def __init__(self, error):
+        self.error = error
+
+    async def create(self, **kwargs):
+        raise self.error
+
+
+def client_raising(error):
+    client = FakeAsyncOpenAI(latency_ms=0)
+    client.chat.completions = BrokenCompletions(error)
+    return client
+
+
+@pytest.fixture(autouse=True)
+def call_context():
+    usage._pending.clear()
+    set_call_context(7, "/follow-up")
+    yield
+    set_call_context(None, None)
+    usage._pending.clear()
+
+
+def statuses():
+    return [row["status"] for row in usage._pending]
+
+
+def test_successful_call_is_recorded(db):
+    gateway = LLMGateway(client=FakeAsyncOpenAI(latency_ms=0))
+    asyncio.run(gateway.complete(MESSAGES))
+    assert statuses() == ["ok"]
+    assert flush_usage(db) == 1
+    row = db.query(models.LLMUsage).one()
+    assert (row.user_id, row.endpoint) == (7, "/follow-up")
+    assert row.prompt_tokens > 0 and row.completion_tokens > 0
+
+
+def test_exhausted_retries_are_recorded():
+    gateway = LLMGateway(client=client_raising(ConnectionError("down")), max_retries=1, backoff_base=0)
+    with pytest.raises(LLMError):
+        asyncio.run(gateway.complete(MESSAGES))
+    assert statuses() == ["error"]
+    assert usage._pending[0]["retries"] == 1
+
+
+def test_unexpected_errors_are_recorded():
+    gateway = LLMGateway(client=client_raising(ValueError("bad response")))
+    with pytest.raises(ValueError):
+        asyncio.run(gateway.complete(MESSAGES))
+    assert statuses() == ["error"]
+    assert usage._pending[0]["prompt_tokens"] > 0
+
+
+def test_cancelled_calls_are_recorded():
+    gateway = LLMGateway(client=FakeAsyncOpenAI(latency_ms=1000))
+
+    async def run():
+        task = asyncio.ensure_future(gateway.complete(MESSAGES))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert statuses() == ["cancelled"]
+
+
+def test_user_request_quota():
+    tracker = QuotaTracker(user_rpm=2, user_tokens_per_day=0, endpoint_rpm=0, endpoint_tokens_per_minute=0)
+    context = (7, "/follow-up")
+    tracker.check(context)
+    tracker.add(context, 10)
+    tracker.add(context, 0)
+    with pytest.raises(QuotaExceeded) as excinfo:
+        tracker.check(context)
+    assert excinfo.value.scope == "user requests"
+    tracker.check((8, "/follow-up"))
@@ -0,0 +1,70 @@
+import io
+
+from backend import models
+from conftest import login, register
+
+
+def test_register_rejects_duplicates_username_first(client):
+    assert register(client, "alice", "alice@example.com").status_code == 200
+
+    both = register(client, "alice", "alice@example.com")
+    assert both.status_code == 400
+    assert both.json()["detail"] == "Username already registered"
+
+    email = register(client, "bob", "alice@example.com")
+    assert email.status_code == 400
+    assert email.json()["detail"] == "Email already registered"
+
+
+def test_register_is_a_single_insert(client):
+    from sqlalchemy import event
+    from backend.database import get_engine
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if "users" in statement:
+            statements.append(statement.split()[0])
+
+    event.listen(get_engine(), "before_cursor_execute", record)
+    try:
+        assert register(client, "alice", "alice@example.com").status_code == 200
+    finally:
+        event.remove(get_engine(), "before_cursor_execute", record)
+    assert statements == ["INSERT"]
+
+
+def test_import_reports_inserted_duplicates_and_invalid_rows(client, db):
+    register(client, "alice", "alice@example.com")
+    register(client, "admin", "admin@example.com")
+    data = "\n".join([
+        '{"username": "bob", "email": "bob@example.com", "password": "pw", "age": "30"}',
+        '{"username": "alice", "email": "alice2@example.com", "password": "pw"}',
+        '{"username": "bob", "email": "bob2@example.com", "password": "pw"}',
+        '{"username": "carol", "email": "carol@example.com"}',
+        "not json",
+    ])
+    response = client.post(
+        "/admin/users/import",
+        files={"file": ("users.jsonl", io.BytesIO(data.encode()))},
+        headers=login(client, "admin"),
+    )
+    assert response.status_code == 200
+    report = response.json()
+    assert (report["read"], report["inserted"], report["duplicates"], report["invalid"]) == (5, 1, 2, 2)
+    assert [error["line"] for error in report["errors"]] == [4, 5]
+
+    bob = db.query(models.User).filter(models.User.username == "bob").one()
+    assert bob.age == 30
+    assert bob.current_meal_plan == models.NO_MEAL_PLAN
+    assert client.post("/token", data={"username": "bob", "password": "pw"}).status_code == 200
+
+
+def test_import_requires_admin(client):
+    register(client)
+    response = client.post(
+        "/admin/users/import",
+        files={"file": ("users.csv", io.BytesIO(b"username,email,password\n"))},
+        headers=login(client),
+    )
+    assert response.status_code == 403